@@ -0,0 +1,181 @@
+"""
+Recall-vs-memory report for vector compression settings.
+
+    python -m backend.benchmarks.compression --workspace-dir data/vectors/<workspace> --output report.json
+    python -m backend.benchmarks.compression --vectors 50000 --dims 768,512,256 --oversampling 1,3,5
+
+For every combination of VECTOR_QUANTIZATION, VECTOR_DIMENSIONS and
+VECTOR_OVERSAMPLING it measures recall@k against exact full-precision search,
+with and without rescoring, and the bytes each vector costs in memory and on
+disk. Real embeddings (a local vector store workspace) give representative
+recall; the synthetic corpus only exercises the code paths.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.text_store import TEXT_STORE_COMPRESSION_LEVEL
+from backend.services.vector_codec import QUANTIZATIONS, candidate_count, quantizer, truncate
+
+
+def load_workspace(path: str) -> Tuple[np.ndarray, List[str]]:
+    """Live vectors and chunk texts of a local vector store workspace directory."""
+    db = sqlite3.connect(os.path.join(path, "points.db"))
+    dim = int(db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()[0])
+    rows, texts = [], []
+    for row, payload in db.execute("SELECT row, payload FROM points ORDER BY row"):
+        rows.append(row)
+        texts.append(json.loads(payload).get("text", ""))
+    db.close()
+    matrix = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r").reshape(-1, dim)
+    return np.asarray(matrix[rows]), texts
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors whose variance decays across dimensions, loosely like Matryoshka embeddings."""
+    rng = np.random.default_rng(seed)
+    decay = (1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * decay
+    assign = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dim)).astype(np.float32) * decay * 0.6
+    return truncate(centers[assign] + noise, dim)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return round(hits / truth.size, 4)
+
+
+def evaluate(
+    base: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    kind: str,
+    dim: int,
+    oversampling: float,
+    k: int,
+) -> Dict[str, Any]:
+    vectors = truncate(base, dim)
+    q = truncate(queries, dim)
+    codec = quantizer(kind, dim)
+
+    started = time.perf_counter()
+    if codec is None:
+        exact = q @ vectors.T
+        found = top_k(exact, k)
+        rescored = found
+    else:
+        codes = codec.encode(vectors)
+        approx = np.stack([codec.scores(codes, query) for query in q])
+        found = top_k(approx, k)
+        shortlist = top_k(approx, candidate_count(k, oversampling))
+        rescored = np.stack([
+            cand[np.argsort(-(vectors[cand] @ query))[:k]] for cand, query in zip(shortlist, q)
+        ])
+    elapsed = time.perf_counter() - started
+
+    float_bytes = dim * 4
+    ram_bytes = float_bytes if codec is None else codec.code_width
+    disk_bytes = float_bytes + (0 if codec is None else codec.code_width)
+    return {
+        "quantization": kind,
+        "dimensions": dim,
+        "oversampling": oversampling if codec is not None else None,
+        f"recall@{k}": recall(found, truth),
+        f"recall@{k}_rescored": recall(rescored, truth),
+        "search_bytes_per_vector": ram_bytes,
+        "disk_bytes_per_vector": disk_bytes,
+        "search_memory_mb": round(ram_bytes * len(base) / 2 ** 20, 2),
+        "compression_vs_float768": round(768 * 4 / ram_bytes, 1),
+        "seconds_per_query": round(elapsed / len(q), 6),
+    }
+
+
+def text_report(texts: List[str]) -> Optional[Dict[str, Any]]:
+    texts = [t for t in texts if t]
+    if not texts:
+        return None
+    raw = sum(len(t.encode("utf-8")) for t in texts)
+    packed = sum(len(zlib.compress(t.encode("utf-8"), TEXT_STORE_COMPRESSION_LEVEL)) for t in texts)
+    return {"chunks": len(texts), "raw_mb": round(raw / 2 ** 20, 2), "compressed_mb": round(packed / 2 ** 20, 2),
+            "ratio": round(raw / packed, 2)}
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workspace-dir", help="local vector store workspace to read vectors and texts from")
+    parser.add_argument("--vectors", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="synthetic vector size")
+    parser.add_argument("--clusters", type=int, default=256, help="synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="recall@k (RETRIEVAL_LIMIT)")
+    parser.add_argument("--quantizations", default=",".join(QUANTIZATIONS))
+    parser.add_argument("--dims", type=_ints, default=[768, 512, 256, 128])
+    parser.add_argument("--oversampling", type=_floats, default=[1.0, 3.0, 5.0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    texts: List[str] = []
+    if args.workspace_dir:
+        base, texts = load_workspace(args.workspace_dir)
+    else:
+        base = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+    # Queries are perturbed corpus vectors, so each has close but not identical neighbours.
+    picks = rng.choice(len(base), min(args.queries, len(base)), replace=False)
+    queries = truncate(base[picks] + rng.standard_normal((len(picks), base.shape[1])).astype(np.float32) * 0.02,
+                       base.shape[1])
+    truth = top_k(queries @ base.T, args.k)
+
+    results = []
+    for kind in args.quantizations.split(","):
+        for dim in args.dims:
+            if dim > base.shape[1]:
+                continue
+            for oversampling in (args.oversampling if kind != "none" else [1.0]):
+                results.append(evaluate(base, queries, truth, kind, dim, oversampling, args.k))
+                print(f"compression: {kind} {dim}d x{oversampling}", file=sys.stderr)
+
+    report = {
+        "benchmark": "autorag-vector-compression",
+        "source": args.workspace_dir or "synthetic",
+        "vectors": len(base),
+        "dimensions": int(base.shape[1]),
+        "queries": len(queries),
+        "k": args.k,
+        "results": results,
+        "text_store": text_report(texts),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
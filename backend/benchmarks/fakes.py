@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from backend.services.qdrant_client import VECTOR_SIZE
+
+
+def fake_vector(text: str, dim: int = VECTOR_SIZE) -> List[float]:
+    """Deterministic unit vector for `text`."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeGenAI:
+    """
+    Offline stand-in for `genai.Client` covering the calls GeminiClient makes:
+    models.embed_content / generate_content / generate_content_stream and
+    their `aio` variants. Latencies are drawn from a seeded distribution
+    (mean +- jitter), and every call is counted in `calls`.
+    """
+
+    def __init__(
+        self,
+        embed_latency: float = 0.02,
+        generate_latency: float = 0.2,
+        jitter: float = 0.25,
+        confidence: float = 0.8,
+        seed: int = 0,
+    ):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.jitter = jitter
+        self.confidence = confidence
+        self.calls: Dict[str, int] = {"embed_content": 0, "embedded_texts": 0, "generate_content": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _Models(self)
+        self.aio = SimpleNamespace(models=_AsyncModels(self))
+
+    def _delay(self, mean: float) -> float:
+        with self._lock:
+            return max(0.0, mean * (1.0 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.calls[name] += amount
+
+    def _embed(self, contents: Any) -> Any:
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        self._count("embed_content")
+        self._count("embedded_texts", len(texts))
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_vector(t)) for t in texts])
+
+    def _generate(self, contents: Any, config: Any) -> Any:
+        self._count("generate_content")
+        prompt = json.dumps(contents, default=str) if not isinstance(contents, str) else contents
+        body = {
+            "answer": "According to the context, the requested detail is described in the cited passage.",
+            "confidence": self.confidence,
+            "citations": [0],
+        }
+        text = json.dumps(body) if config else f"```json\n{json.dumps(body)}\n```"
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            cached_content_token_count=0,
+            thoughts_token_count=0,
+        )
+        return SimpleNamespace(text=text, parsed=body if config else None, usage_metadata=usage)
+
+    def _stream_pieces(self, contents: Any) -> List[Any]:
+        response = self._generate(contents, None)
+        text = response.text
+        pieces = [SimpleNamespace(text=text[i:i + 40], usage_metadata=None) for i in range(0, len(text), 40)]
+        pieces[-1].usage_metadata = response.usage_metadata
+        return pieces
+
+
+class _Models:
+    def __init__(self, fake: FakeGenAI):
+        self.fake = fake
+
+    def embed_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        time.sleep(self.fake._delay(self.fake.embed_latency))
+        return self.fake._embed(contents)
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        time.sleep(self.fake._delay(self.fake.generate_latency))
+        return self.fake._generate(contents, config)
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        time.sleep(self.fake._delay(self.fake.generate_latency))
+        return iter(self.fake._stream_pieces(contents))
+
+
+class _AsyncModels:
+    def __init__(self, fake: FakeGenAI):
+        self.fake = fake
+
+    async def embed_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        await asyncio.sleep(self.fake._delay(self.fake.embed_latency))
+        return self.fake._embed(contents)
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        await asyncio.sleep(self.fake._delay(self.fake.generate_latency))
+        return self.fake._generate(contents, config)
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Any:
+        await asyncio.sleep(self.fake._delay(self.fake.generate_latency))
+        pieces = self.fake._stream_pieces(contents)
+
+        async def _iterate():
+            for piece in pieces:
+                await asyncio.sleep(0)
+                yield piece
+
+        return _iterate()
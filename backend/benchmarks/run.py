@@ -0,0 +1,318 @@
+"""
+Offline ingest/ask benchmark.
+
+    python -m backend.benchmarks.run --docs 10,100,1000 --questions 200 --output bench.json
+
+Drives the FastAPI app in-process (upload, job polling, /ask, /ask/batch) against fake
+Gemini providers with seeded latency and a fresh data directory, and writes
+one JSON report so runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Any, Dict, List
+
+_DATA_DIR = tempfile.mkdtemp(prefix="autorag-bench-")
+
+# Settings are read at import time, so they are fixed before backend.main is imported.
+# Values already set in the environment win, so a run can be tuned without code changes.
+for _name, _value in {
+    "GEMINI_API_KEY": "offline-benchmark",
+    "VECTOR_STORE": "local",
+    "REVIEW_ENABLED": "false",
+    "ANSWER_CACHE_ENABLED": "false",
+    "PROVIDER_RATE_LIMITS": "",
+    "ASK_BATCH_MAX_QUESTIONS": "100000",
+    "JOBS_DB_PATH": os.path.join(_DATA_DIR, "jobs.db"),
+    "JOBS_DIR": os.path.join(_DATA_DIR, "jobs"),
+    "MANIFEST_DB_PATH": os.path.join(_DATA_DIR, "manifest.db"),
+    "EMBED_CACHE_DB_PATH": os.path.join(_DATA_DIR, "embeddings.db"),
+    "KEYWORD_DB_PATH": os.path.join(_DATA_DIR, "keywords.db"),
+    "LOCAL_VECTOR_DIR": os.path.join(_DATA_DIR, "vectors"),
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import httpx  # noqa: E402
+
+from backend.benchmarks.fakes import FakeGenAI  # noqa: E402
+
+_WORDS = (
+    "account invoice policy contract supplier warehouse shipment schedule customer ledger audit "
+    "payment region manager quarter budget forecast inventory product service incident review "
+    "approval request record system network server backup storage access security training "
+    "compliance vendor support ticket release version report revenue margin target team project"
+).split()
+
+POLL_INTERVAL = 0.05
+
+
+def make_document(rng: random.Random, doc_index: int, sections: int, paragraphs: int) -> Dict[str, Any]:
+    """A markdown document with headings, prose and one retrievable fact per section."""
+    lines = [f"# Document {doc_index}"]
+    facts = []
+    for s in range(sections):
+        lines.append(f"## Section {doc_index}.{s}")
+        for _ in range(paragraphs):
+            lines.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 90))) + ".")
+        code = f"{rng.choice(_WORDS).upper()}-{rng.randint(1000, 9999)}"
+        lines.append(f"The reference code for section {doc_index}.{s} is {code}.")
+        facts.append(f"What is the reference code for section {doc_index}.{s}?")
+    return {"filename": f"doc_{doc_index}.md", "text": "\n\n".join(lines) + "\n", "questions": facts}
+
+
+def make_corpus(seed: int, docs: int, sections: int, paragraphs: int) -> List[Dict[str, Any]]:
+    # Each corpus size gets its own seed so no text is shared (and cached) between sizes.
+    rng = random.Random(f"{seed}:{docs}")
+    return [make_document(rng, i, sections, paragraphs) for i in range(docs)]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def _at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 6),
+        "p50": round(_at(50), 6),
+        "p95": round(_at(95), 6),
+        "p99": round(_at(99), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _calls_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {name: after[name] - before.get(name, 0) for name in after}
+
+
+def _per(calls: Dict[str, int], count: int) -> Dict[str, float]:
+    return {name: round(value / count, 4) for name, value in calls.items()} if count else {}
+
+
+async def bench_ingest(client: httpx.AsyncClient, fake: FakeGenAI, workspace_id: str, corpus: List[Dict[str, Any]]):
+    files = [("files", (doc["filename"], doc["text"].encode("utf-8"), "text/markdown")) for doc in corpus]
+    before = dict(fake.calls)
+    started = time.perf_counter()
+    response = await client.post(f"/api/workspaces/{workspace_id}/upload", files=files)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/api/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            break
+        await asyncio.sleep(POLL_INTERVAL)
+    wall = time.perf_counter() - started
+    calls = _calls_delta(before, fake.calls)
+    chunks = job["chunks_indexed"]
+    return {
+        "status": job["status"],
+        "error": job["error"],
+        "documents": len(corpus),
+        "bytes": sum(len(doc["text"]) for doc in corpus),
+        "chunks": chunks,
+        "wall_seconds": round(wall, 4),
+        "job_seconds": job["elapsed_seconds"],
+        "chunks_per_second": round(chunks / wall, 2) if wall > 0 else 0.0,
+        "provider_calls": calls,
+        "provider_calls_per_chunk": _per(calls, chunks),
+    }
+
+
+async def bench_ask(
+    client: httpx.AsyncClient,
+    fake: FakeGenAI,
+    workspace_id: str,
+    questions: List[str],
+    concurrency: int,
+) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def _one(question: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(f"/api/workspaces/{workspace_id}/ask", json={"question": question})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    before = dict(fake.calls)
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(q) for q in questions))
+    wall = time.perf_counter() - started
+    calls = _calls_delta(before, fake.calls)
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "requests_per_second": round(len(questions) / wall, 2) if wall > 0 else 0.0,
+        "latency_seconds": percentiles(latencies),
+        "provider_calls": calls,
+        "provider_calls_per_ask": _per(calls, len(questions)),
+    }
+
+
+async def bench_ask_batch(
+    client: httpx.AsyncClient,
+    fake: FakeGenAI,
+    workspace_id: str,
+    questions: List[str],
+) -> Dict[str, Any]:
+    """The same questions as one /ask/batch request, read as a server-sent-event stream."""
+    counts = {"result": 0, "error": 0}
+    before = dict(fake.calls)
+    started = time.perf_counter()
+    async with client.stream(
+        "POST", f"/api/workspaces/{workspace_id}/ask/batch", json={"questions": questions},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = line[len("event: "):] if line.startswith("event: ") else None
+            if event in counts:
+                counts[event] += 1
+    wall = time.perf_counter() - started
+    calls = _calls_delta(before, fake.calls)
+    return {
+        "questions": len(questions),
+        "results": counts["result"],
+        "errors": counts["error"],
+        "wall_seconds": round(wall, 4),
+        "answers_per_second": round(counts["result"] / wall, 2) if wall > 0 else 0.0,
+        "provider_calls": calls,
+        "provider_calls_per_question": _per(calls, len(questions)),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # GeminiClient prints its configuration on import; keep stdout for the report.
+    with redirect_stdout(sys.stderr):
+        from backend import main
+
+    fake = FakeGenAI(
+        embed_latency=args.embed_latency,
+        generate_latency=args.generate_latency,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    main.gemini_client.client = fake
+    if os.environ["VECTOR_STORE"] == "qdrant":
+        from qdrant_client import AsyncQdrantClient, QdrantClient
+
+        from backend.services import qdrant_client
+
+        qdrant_client._client = QdrantClient(":memory:")
+        qdrant_client._async_client = AsyncQdrantClient(":memory:")
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for docs in args.docs:
+                workspace_id = f"bench-{docs}"
+                corpus = make_corpus(args.seed, docs, args.sections, args.paragraphs)
+                ingest = await bench_ingest(client, fake, workspace_id, corpus)
+
+                pool = [q for doc in corpus for q in doc["questions"]]
+                rng = random.Random(f"{args.seed}:{docs}:questions")
+                questions = [rng.choice(pool) for _ in range(args.questions)]
+                asks = []
+                for concurrency in args.concurrency:
+                    # Every measured run embeds its questions from scratch, so levels are comparable.
+                    _clear_embedding_cache(main)
+                    asks.append(await bench_ask(client, fake, workspace_id, questions, concurrency))
+                _clear_embedding_cache(main)
+                batch = await bench_ask_batch(client, fake, workspace_id, questions)
+
+                results.append({
+                    "corpus_documents": docs,
+                    "ingest": ingest,
+                    "ask": asks,
+                    "ask_batch": batch,
+                    "peak_rss_mb": peak_rss_mb(),
+                })
+                print(f"benchmark: {docs} documents done", file=sys.stderr)
+    return {
+        "benchmark": "autorag-offline",
+        "git_revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            **{k: v for k, v in vars(args).items() if k != "output"},
+            "vector_store": os.environ["VECTOR_STORE"],
+            "provider_mode": main.PROVIDER_MODE,
+            "answer_mode": main.gemini_client.answer_mode,
+            "chunker": os.environ.get("CHUNKER", "structured"),
+        },
+        "results": results,
+    }
+
+
+def _clear_embedding_cache(main: Any) -> None:
+    if main.gemini_client.embedding_cache is not None:
+        main.gemini_client.embedding_cache.clear()
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=_int_list, default=[10, 100], help="corpus sizes in documents")
+    parser.add_argument("--sections", type=int, default=4, help="sections per document")
+    parser.add_argument("--paragraphs", type=int, default=5, help="paragraphs per section")
+    parser.add_argument("--questions", type=int, default=100, help="asks per concurrency level")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="concurrent asks")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="mean fake embed latency (s)")
+    parser.add_argument("--generate-latency", type=float, default=0.2, help="mean fake generate latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency jitter as a fraction of the mean")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_DATA_DIR, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
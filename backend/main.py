@@ -1,9 +1,16 @@
+import asyncio
+import json
 import logging
-from typing import List, Dict, Any
-
-from fastapi import FastAPI, UploadFile, File, HTTPException, Path
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, AsyncIterator, Callable, Awaitable, Optional, Tuple, Union
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Path, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from starlette import status
 from dotenv import load_dotenv
@@ -11,12 +18,55 @@ from dotenv import load_dotenv
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+from backend.services.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+from backend.services.chunking import chunk_all, chunker_factory
+from backend.services.context_builder import build_context
+from backend.services.aiml_client import AimlClient
+from backend.services.extractors import DocumentExtractor
 from backend.services.gemini_client import GeminiClient
-from backend.services.qdrant_client import upsert_chunk, search_chunks
-from backend.services.opus_client import run_review_workflow
-
-
-app = FastAPI(title="AutoRAG OS Backend", version="1.0.0")
+from backend.services.http_pool import close_async_http_client, close_http_session
+from backend.services.ingestion import IngestionScheduler
+from backend.services.jobs import JobManager
+from backend.services.keyword_index import KeywordIndex
+from backend.services.manifest import WorkspaceManifest
+from backend.services import metrics
+from backend.services.metrics import CallbackMetric, span
+from backend.services.retrieval import (
+    HYBRID_CANDIDATES,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_KEYWORD_WEIGHT,
+    HYBRID_SEARCH_ENABLED,
+    RETRIEVAL_LIMIT,
+    reciprocal_rank_fusion,
+)
+from backend.services.reranker import RERANK_CANDIDATES, get_reranker
+from backend.services.resilience import ProviderUnavailableError, circuit_states, is_retryable
+from backend.services.vector_store import get_vector_store
+from backend.services.opus_client import run_review_workflow, run_review_workflow_async
+from backend.services.review import REVIEW_ENABLED, REVIEW_STREAM_WAIT_SECONDS, ReviewManager
+
+# "async" awaits the async provider clients; "sync" runs the blocking clients in the threadpool.
+PROVIDER_MODE = os.getenv("PROVIDER_MODE", "async").lower()
+# Questions accepted by one /ask/batch request
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+# Answers a batch request generates at once; provider rate limits still apply on top
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    job_manager.resume_pending()
+    yield
+    await job_manager.shutdown()
+    if review_manager is not None:
+        await review_manager.shutdown()
+    await close_async_http_client()
+    close_http_session()
+    await vector_store.close()
+
+
+app = FastAPI(title="AutoRAG OS Backend", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,29 +81,82 @@ class AskRequest(BaseModel):
     question: str
 
 
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+
+
 gemini_client = GeminiClient()
+document_extractor = DocumentExtractor(gemini_client, AimlClient())
+vector_store = get_vector_store()
+keyword_index = KeywordIndex() if HYBRID_SEARCH_ENABLED else None
+reranker = get_reranker()
+
+
+async def _call_provider(
+    sync_fn: Callable[..., Any],
+    async_fn: Callable[..., Awaitable[Any]],
+    *args: Any,
+    **kwargs: Any,
+) -> Any:
+    if PROVIDER_MODE == "sync":
+        return await run_in_threadpool(sync_fn, *args, **kwargs)
+    return await async_fn(*args, **kwargs)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = metrics.start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started, method=request.method, route=route, status=response.status_code,
+    )
+    # Streaming responses send headers before their later stages run, so only earlier stages appear.
+    if metrics.METRICS_TIMING_HEADERS and timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/health")
 async def health_check() -> JSONResponse:
-    return JSONResponse(content={"status": "ok"}, status_code=status.HTTP_200_OK)
-
-
-async def _read_files(files: List[UploadFile]) -> List[Dict[str, Any]]:
-    file_objs: List[Dict[str, Any]] = []
-    for f in files:
-        data = await f.read()
-        file_objs.append(
+    return JSONResponse(content={"status": "ok", "providers": circuit_states()}, status_code=status.HTTP_200_OK)
+
+
+@app.get("/api/cache/stats")
+async def cache_stats() -> Dict[str, Any]:
+    cache = gemini_client.embedding_cache
+    return {
+        "embeddings": cache.stats() if cache is not None else None,
+        "answers": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+
+def _spool_files(job_dir: str, files: List[UploadFile]) -> List[Dict[str, Any]]:
+    """Copy uploads to disk in blocks so the job can run (and resume) after the request returns."""
+    os.makedirs(job_dir, exist_ok=True)
+    spooled: List[Dict[str, Any]] = []
+    for i, f in enumerate(files):
+        path = os.path.join(job_dir, str(i))
+        with open(path, "wb") as out:
+            shutil.copyfileobj(f.file, out, SPOOL_BLOCK_SIZE)
+        spooled.append(
             {
                 "filename": f.filename,
                 "content_type": f.content_type,
-                "data": data,
+                "path": path,
+                "size": os.path.getsize(path),
             }
         )
-    return file_objs
+    return spooled
 
 
-@app.post("/api/workspaces/{workspace_id}/upload")
+@app.post("/api/workspaces/{workspace_id}/upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_workspace_data(
     workspace_id: str = Path(...),
     files: List[UploadFile] = File(...),
@@ -65,35 +168,11 @@ async def upload_workspace_data(
         )
 
     try:
-        file_objs = await _read_files(files)
-        total_chunks = 0
-
-        for file_obj in file_objs:
-            text = await _extract_text_for_rag(file_obj)
-            if not text:
-                continue
-
-            chunks = gemini_client.chunk_text_for_rag(text)
-            for idx, chunk in enumerate(chunks):
-                chunk_text = (chunk.get("text") or "").strip()
-                if not chunk_text:
-                    continue
-
-                vector = gemini_client.embed_text(chunk_text)
-                if not vector:
-                    continue
+        job_id = job_manager.new_job_id()
+        spooled = await run_in_threadpool(_spool_files, job_manager.job_dir(job_id), files)
+        job_manager.create(job_id, workspace_id, spooled)
 
-                payload = {
-                    "workspace_id": workspace_id,
-                    "filename": file_obj["filename"],
-                    "chunk_index": idx,
-                    "text": chunk_text,
-                }
-
-                upsert_chunk(workspace_id, vector, payload)
-                total_chunks += 1
-
-        return {"workspace_id": workspace_id, "chunks_indexed": total_chunks}
+        return {"workspace_id": workspace_id, "job_id": job_id, "status": "queued"}
 
     except Exception as exc:
         logger.exception("Failed to process workspace upload")
@@ -103,48 +182,72 @@ async def upload_workspace_data(
         ) from exc
 
 
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str = Path(...)) -> Dict[str, Any]:
+    snapshot = job_manager.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    return snapshot
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str = Path(...)) -> StreamingResponse:
+    if job_manager.snapshot(job_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+
+    async def _events():
+        async for snapshot in job_manager.watch(job_id):
+            yield _sse("progress", snapshot)
+        yield _sse("end", {})
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
 @app.post("/api/workspaces/{workspace_id}/ask")
 async def ask_workspace(
     workspace_id: str = Path(...),
     body: AskRequest = None,
 ) -> Dict[str, Any]:
-    if body is None or not body.question.strip():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Question is required.",
-        )
-
-    question = body.question.strip()
+    question = _require_question(body)
 
     try:
-        q_vector = gemini_client.embed_text(question)
-        if not q_vector:
-            raise RuntimeError("Failed to embed question")
-
-        retrieved = search_chunks(workspace_id, q_vector, limit=5)
-
-        context_chunks: List[Dict[str, Any]] = []
-        for hit in retrieved:
-            context_chunks.append(
-                {
-                    "text": hit.get("text", ""),
-                    "source": hit.get("filename", ""),
-                    "chunk_index": hit.get("chunk_index", -1),
-                }
+        version = _cache_version(workspace_id)
+        q_vector = await _embed_question(question)
+
+        if answer_cache is not None:
+            cached = answer_cache.lookup(workspace_id, q_vector)
+            if cached is not None:
+                response = {**cached["response"], "question": question, "cached": True}
+                return {**response, "review": _submit_review(question, response["rag_result"])}
+
+        retrieved, context_chunks = await _retrieve_context(workspace_id, question, q_vector)
+
+        with span("answer"):
+            rag_result = await _call_provider(
+                gemini_client.answer_with_context,
+                gemini_client.answer_with_context_async,
+                question=question,
+                context_chunks=context_chunks,
             )
 
-        rag_result = gemini_client.answer_with_context(
-            question=question, context_chunks=context_chunks,
-        )
-
-        return {
+        response = {
             "workspace_id": workspace_id,
             "question": question,
             "context_chunks": context_chunks,
             "rag_result": rag_result,
         }
+        _cache_answer(workspace_id, question, q_vector, retrieved, response, version)
+
+        return {**response, "review": _submit_review(question, rag_result)}
 
     except Exception as exc:
+        if _provider_unavailable(exc):
+            logger.warning("Provider unavailable for ask request: %s", exc)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(exc),
+                headers={"Retry-After": str(_retry_after(exc))},
+            ) from exc
         logger.exception("Failed to process ask request")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -152,6 +255,448 @@ async def ask_workspace(
         ) from exc
 
 
-async def _extract_text_for_rag(file_obj: Dict[str, Any]) -> str:
-    text = gemini_client.extract_text_from_file(file_obj)
-    return text or ""
+@app.post("/api/workspaces/{workspace_id}/ask/stream")
+async def ask_workspace_stream(
+    workspace_id: str = Path(...),
+    body: AskRequest = None,
+) -> StreamingResponse:
+    """
+    Server-sent-events variant of /ask. Emits `context` with the retrieved
+    chunks, `token` events with answer text as Gemini generates it, then one
+    `done` event carrying the same body /ask returns. Failures after the
+    stream has started are reported as an `error` event.
+    """
+    question = _require_question(body)
+
+    async def _events():
+        try:
+            version = _cache_version(workspace_id)
+            q_vector = await _embed_question(question)
+
+            if answer_cache is not None:
+                cached = answer_cache.lookup(workspace_id, q_vector)
+                if cached is not None:
+                    response = {**cached["response"], "question": question, "cached": True}
+                    yield _sse("context", _context_event(workspace_id, question, response["context_chunks"]))
+                    yield _sse("token", {"text": response["rag_result"].get("answer", "")})
+                    review = _submit_review(question, response["rag_result"])
+                    yield _sse("done", {**response, "review": review})
+                    async for event in _review_events(review):
+                        yield event
+                    return
+
+            retrieved, context_chunks = await _retrieve_context(workspace_id, question, q_vector)
+            yield _sse("context", _context_event(workspace_id, question, context_chunks))
+
+            if PROVIDER_MODE == "sync":
+                events = iterate_in_threadpool(
+                    gemini_client.stream_answer_with_context(question, context_chunks)
+                )
+            else:
+                events = gemini_client.stream_answer_with_context_async(question, context_chunks)
+
+            rag_result = None
+            with span("answer"):
+                async for event in events:
+                    if event["type"] == "token":
+                        yield _sse("token", {"text": event["text"]})
+                    else:
+                        rag_result = event["rag_result"]
+
+            if rag_result is not None:
+                response = {
+                    "workspace_id": workspace_id,
+                    "question": question,
+                    "context_chunks": context_chunks,
+                    "rag_result": rag_result,
+                }
+                _cache_answer(workspace_id, question, q_vector, retrieved, response, version)
+                review = _submit_review(question, rag_result)
+                yield _sse("done", {**response, "review": review})
+                async for review_event in _review_events(review):
+                    yield review_event
+
+        except Exception as exc:
+            if _provider_unavailable(exc):
+                logger.warning("Provider unavailable for streaming ask request: %s", exc)
+                yield _sse("error", {"detail": str(exc), "retry_after": _retry_after(exc)})
+                return
+            logger.exception("Failed to process streaming ask request")
+            yield _sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
+@app.post("/api/workspaces/{workspace_id}/ask/batch")
+async def ask_workspace_batch(
+    workspace_id: str = Path(...),
+    body: AskBatchRequest = None,
+) -> StreamingResponse:
+    """
+    Answer many questions in one request, for evaluation runs and bulk jobs.
+    All questions are embedded together and searched in one vector store
+    request; answers are then generated ASK_BATCH_CONCURRENCY at a time.
+
+    Server-sent events, in completion order: `result` per answered question
+    (`index` into `questions` plus the body /ask returns), `error` per failed
+    question (`index`, `detail`), then `done` with the counts. An `error`
+    without `index` means the whole batch failed. Reviews are returned
+    pending; poll /api/reviews/{review_id} for them.
+    """
+    questions = _require_questions(body)
+
+    async def _events():
+        version = _cache_version(workspace_id)
+        try:
+            with span("embed"):
+                q_vectors = await _embed_texts(questions)
+        except Exception as exc:
+            yield _sse("error", _batch_error(None, exc))
+            return
+
+        answered = failed = 0
+        todo: List[int] = []
+        for index, (question, q_vector) in enumerate(zip(questions, q_vectors)):
+            if not q_vector:
+                failed += 1
+                yield _sse("error", {"index": index, "detail": "Failed to embed question"})
+                continue
+            cached = answer_cache.lookup(workspace_id, q_vector) if answer_cache is not None else None
+            if cached is not None:
+                answered += 1
+                response = {**cached["response"], "question": question, "cached": True}
+                review = _submit_review(question, response["rag_result"])
+                yield _sse("result", {"index": index, **response, "review": review})
+                continue
+            todo.append(index)
+
+        try:
+            candidates = await _search_candidates(
+                workspace_id, [questions[i] for i in todo], [q_vectors[i] for i in todo],
+            ) if todo else []
+        except Exception as exc:
+            yield _sse("error", _batch_error(None, exc))
+            return
+
+        semaphore = asyncio.Semaphore(max(1, ASK_BATCH_CONCURRENCY))
+
+        async def _answer(index: int, hits: List[Dict[str, Any]]) -> Tuple[bool, str]:
+            question = questions[index]
+            try:
+                retrieved, context_chunks = await _select_context(question, hits)
+                async with semaphore:
+                    with span("answer"):
+                        rag_result = await _call_provider(
+                            gemini_client.answer_with_context,
+                            gemini_client.answer_with_context_async,
+                            question=question,
+                            context_chunks=context_chunks,
+                        )
+            except Exception as exc:
+                return False, _sse("error", _batch_error(index, exc))
+
+            response = {
+                "workspace_id": workspace_id,
+                "question": question,
+                "context_chunks": context_chunks,
+                "rag_result": rag_result,
+            }
+            _cache_answer(workspace_id, question, q_vectors[index], retrieved, response, version)
+            review = _submit_review(question, rag_result)
+            return True, _sse("result", {"index": index, **response, "review": review})
+
+        tasks = [asyncio.ensure_future(_answer(index, hits)) for index, hits in zip(todo, candidates)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                ok, event = await next_done
+                answered += ok
+                failed += not ok
+                yield event
+        finally:
+            # Client went away: stop generating answers nobody will read.
+            for task in tasks:
+                task.cancel()
+
+        yield _sse("done", {"workspace_id": workspace_id, "answered": answered, "failed": failed})
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
+@app.get("/api/reviews/{review_id}")
+async def get_review(review_id: str = Path(...)) -> Dict[str, Any]:
+    """Background Opus review of an answer; `status` is pending, done or failed."""
+    review = review_manager.get(review_id) if review_manager is not None else None
+    if review is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found.")
+    return review
+
+
+def _submit_review(question: str, rag_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Queue the answer for review without waiting; None when reviews are off or the answer is skipped."""
+    if review_manager is None:
+        return None
+    return review_manager.submit(question, rag_result)
+
+
+async def _review_events(review: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """After `done`, keep the stream open for the review result (up to REVIEW_STREAM_WAIT_SECONDS)."""
+    if review is None:
+        return
+    if review["status"] == "pending":
+        review = await review_manager.wait(review["review_id"], REVIEW_STREAM_WAIT_SECONDS)
+    yield _sse("review", review)
+
+
+async def _review_answer(question: str, rag_result: Dict[str, Any]) -> Dict[str, Any]:
+    return await _call_provider(run_review_workflow, run_review_workflow_async, question, rag_result)
+
+
+def _provider_unavailable(exc: Exception) -> bool:
+    """Open circuit, or rate limit / outage still failing after retries: a 503, not a 500."""
+    return isinstance(exc, ProviderUnavailableError) or is_retryable(exc)
+
+
+def _retry_after(exc: Exception) -> int:
+    return max(1, round(getattr(exc, "retry_after", None) or 5))
+
+
+def _require_question(body: AskRequest) -> str:
+    if body is None or not body.question.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Question is required.",
+        )
+    return body.question.strip()
+
+
+def _require_questions(body: AskBatchRequest) -> List[str]:
+    questions = [question.strip() for question in body.questions] if body is not None else []
+    if not questions or not all(questions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Questions are required and must not be empty.",
+        )
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch.",
+        )
+    return questions
+
+
+def _batch_error(index: Optional[int], exc: Exception) -> Dict[str, Any]:
+    """`error` event body for one batch question, or the whole batch when index is None."""
+    error: Dict[str, Any] = {"detail": str(exc)} if index is None else {"index": index, "detail": str(exc)}
+    if _provider_unavailable(exc):
+        logger.warning("Provider unavailable for batch ask request: %s", exc)
+        error["retry_after"] = _retry_after(exc)
+    else:
+        logger.error("Failed to process batch ask request", exc_info=exc)
+    return error
+
+
+async def _embed_question(question: str) -> List[float]:
+    with span("embed"):
+        q_vector = await _call_provider(
+            gemini_client.embed_text, gemini_client.embed_text_async, question,
+        )
+    if not q_vector:
+        raise RuntimeError("Failed to embed question")
+    return q_vector
+
+
+async def _retrieve_context(
+    workspace_id: str, question: str, q_vector: List[float],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    candidates = await _search_candidates(workspace_id, [question], [q_vector])
+    return await _select_context(question, candidates[0])
+
+
+async def _search_candidates(
+    workspace_id: str, questions: List[str], q_vectors: List[List[float]],
+) -> List[List[Dict[str, Any]]]:
+    """Candidate hits per question; the dense searches go to the vector store as one batch."""
+    # With a reranker, a wider candidate set is searched and it picks the best RETRIEVAL_LIMIT.
+    limit = max(RERANK_CANDIDATES, RETRIEVAL_LIMIT) if reranker is not None else RETRIEVAL_LIMIT
+    with span("search"):
+        if keyword_index is None:
+            results = await _call_provider(
+                vector_store.search_batch, vector_store.search_batch_async, workspace_id, q_vectors, limit=limit,
+            )
+            return [[{**hit, "dense_score": hit["score"]} for hit in hits] for hits in results]
+        return await _hybrid_search(workspace_id, questions, q_vectors, limit)
+
+
+async def _select_context(
+    question: str, candidates: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    retrieved = candidates
+    if reranker is not None:
+        with span("rerank"):
+            retrieved = await run_in_threadpool(reranker.rerank, question, candidates, RETRIEVAL_LIMIT)
+
+    context_chunks = build_context(retrieved)
+    return retrieved, context_chunks
+
+
+async def _hybrid_search(
+    workspace_id: str, questions: List[str], q_vectors: List[List[float]], limit: int = RETRIEVAL_LIMIT,
+) -> List[List[Dict[str, Any]]]:
+    """Dense and BM25 candidates for each question, fused with reciprocal-rank fusion."""
+    candidates = max(HYBRID_CANDIDATES, limit)
+    dense_results, keyword_results = await asyncio.gather(
+        _call_provider(
+            vector_store.search_batch, vector_store.search_batch_async, workspace_id, q_vectors, limit=candidates,
+        ),
+        run_in_threadpool(
+            lambda: [keyword_index.search(workspace_id, question, candidates) for question in questions]
+        ),
+    )
+    fused_results = [
+        reciprocal_rank_fusion(
+            [[hit["point_id"] for hit in dense], [point_id for point_id, _ in keyword]],
+            [HYBRID_DENSE_WEIGHT, HYBRID_KEYWORD_WEIGHT],
+        )[:limit]
+        for dense, keyword in zip(dense_results, keyword_results)
+    ]
+
+    dense_hits = [{hit["point_id"]: {**hit, "dense_score": hit["score"]} for hit in dense} for dense in dense_results]
+    # Keyword-only hits of every question are fetched together.
+    missing = list(dict.fromkeys(
+        point_id for fused, hits in zip(fused_results, dense_hits) for point_id, _ in fused if point_id not in hits
+    ))
+    fetched: Dict[str, Dict[str, Any]] = {}
+    if missing:
+        hits = await _call_provider(vector_store.get, vector_store.get_async, workspace_id, missing)
+        fetched = {hit["point_id"]: hit for hit in hits}
+
+    return [
+        [{**(hits.get(point_id) or fetched[point_id]), "score": score}
+         for point_id, score in fused if point_id in hits or point_id in fetched]
+        for fused, hits in zip(fused_results, dense_hits)
+    ]
+
+
+def _cache_answer(
+    workspace_id: str,
+    question: str,
+    q_vector: List[float],
+    retrieved: List[Dict[str, Any]],
+    response: Dict[str, Any],
+    version: Optional[int],
+) -> None:
+    if answer_cache is None or "error" in response["rag_result"]:
+        return
+    answer_cache.store(
+        workspace_id,
+        question,
+        q_vector,
+        response,
+        chunk_ids=[hit["point_id"] for hit in retrieved if "point_id" in hit],
+        version=version,
+    )
+
+
+def _cache_version(workspace_id: str) -> Optional[int]:
+    """Workspace version to cache an answer under, read before its chunks are retrieved."""
+    return answer_cache.version_of(workspace_id) if answer_cache is not None else None
+
+
+def _context_event(workspace_id: str, question: str, context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"workspace_id": workspace_id, "question": question, "context_chunks": context_chunks}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _extract_text_for_rag(file_obj: Dict[str, Any]) -> Union[str, AsyncIterator[str]]:
+    """The file's text; in async mode an iterator, so chunks are embedded while Gemini is still extracting."""
+    if PROVIDER_MODE == "sync":
+        text = await run_in_threadpool(document_extractor.extract, file_obj)
+        return text or ""
+    return document_extractor.stream_async(file_obj)
+
+
+# Semantic boundaries (CHUNK_SEMANTIC) embed sentences with the same model as the chunks.
+make_chunker = chunker_factory(embed=gemini_client.embed_texts)
+
+
+def _chunk_text(text: str) -> List[Dict[str, Any]]:
+    return chunk_all(make_chunker(), text)
+
+
+async def _embed_texts(texts: List[str]) -> List[List[float]]:
+    return await _call_provider(
+        gemini_client.embed_texts, gemini_client.embed_texts_async, texts,
+    )
+
+
+async def _write_chunks(
+    workspace_id: str,
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    point_ids: List[str],
+) -> int:
+    written = await _call_provider(
+        vector_store.upsert, vector_store.upsert_async, workspace_id, vectors, payloads, point_ids=point_ids,
+    )
+    if keyword_index is not None:
+        texts = [payload.get("text", "") for payload in payloads]
+        await run_in_threadpool(keyword_index.add, workspace_id, point_ids, texts)
+    return written
+
+
+async def _delete_chunks(workspace_id: str, point_ids: List[str]) -> None:
+    await _call_provider(vector_store.delete, vector_store.delete_async, workspace_id, point_ids)
+    if keyword_index is not None:
+        await run_in_threadpool(keyword_index.remove, workspace_id, point_ids)
+
+
+async def _reindex_chunks(workspace_id: str, chunk_indexes: Dict[str, int]) -> None:
+    await _call_provider(
+        vector_store.set_chunk_indexes, vector_store.set_chunk_indexes_async, workspace_id, chunk_indexes,
+    )
+
+
+workspace_manifest = WorkspaceManifest()
+
+answer_cache = AnswerCache(version_of=workspace_manifest.version) if ANSWER_CACHE_ENABLED else None
+
+review_manager = ReviewManager(_review_answer) if REVIEW_ENABLED else None
+
+ingestion_scheduler = IngestionScheduler(
+    extract=_extract_text_for_rag,
+    chunk=_chunk_text,
+    embed=_embed_texts,
+    write=_write_chunks,
+    delete=_delete_chunks,
+    reindex=_reindex_chunks,
+    manifest=workspace_manifest,
+    memory_cost=document_extractor.memory_cost,
+    stream_chunker=make_chunker,
+)
+
+job_manager = JobManager(ingestion_scheduler)
+
+
+def _cache_counts() -> Dict[Tuple[str, ...], float]:
+    counts: Dict[Tuple[str, ...], float] = {}
+    for name, cache in (("embedding", gemini_client.embedding_cache), ("answer", answer_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            counts[(name, "hit")] = stats["hits"]
+            counts[(name, "miss")] = stats["misses"]
+    return counts
+
+
+CallbackMetric("autorag_cache_lookups_total", "Cache lookups by result.", ("cache", "result"), _cache_counts, kind="counter")
+CallbackMetric(
+    "autorag_circuit_open", "1 while a provider's circuit is open or half-open.", ("provider",),
+    lambda: {(name,): float(state != "closed") for name, state in circuit_states().items()},
+)
+CallbackMetric("autorag_jobs_active", "Upload jobs running or queued.", (), lambda: {(): job_manager.active_count()})
+CallbackMetric(
+    "autorag_reviews_pending", "Answer reviews waiting for Opus.", (),
+    lambda: {(): review_manager.pending_count() if review_manager is not None else 0},
+)
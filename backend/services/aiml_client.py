@@ -1,16 +1,26 @@
+import logging
 import os
-from typing import Optional
+from typing import Any, Dict, Optional
 
-import requests
+from backend.services.http_pool import get_async_http_client, get_http_session
+from backend.services.resilience import get_policy, raise_for_retryable_status
 
 AIML_API_KEY = os.getenv("AIML_API_KEY", "")
 AIML_BASE_URL = os.getenv("AIML_BASE_URL", "https://api.aimlapi.com")
 
+logger = logging.getLogger(__name__)
+
 
 class AimlClient:
+    """
+    OCR and transcription through AIML. Calls are pooled, rate limited and
+    retried; any failure returns None so callers fall back to Gemini.
+    """
+
     def __init__(self):
         self.api_key = AIML_API_KEY
         self.base_url = AIML_BASE_URL
+        self.policy = get_policy("aiml")
 
     def _headers(self):
         return {
@@ -18,29 +28,55 @@ class AimlClient:
         }
 
     def ocr_image_to_text(self, image_bytes: bytes) -> Optional[str]:
-        if not self.api_key:
-            return None
+        files = {"file": ("image.png", image_bytes, "image/png")}
+        data = self._post("/v1/ocr", files, timeout=60)
+        return (data.get("text") or data.get("result") or None) if data else None
+
+    def audio_to_text(self, audio_bytes: bytes) -> Optional[str]:
+        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
+        data = self._post("/v1/transcribe", files, timeout=120)
+        return (data.get("text") or data.get("transcript") or None) if data else None
 
-        url = f"{self.base_url}/v1/ocr"
+    async def ocr_image_to_text_async(self, image_bytes: bytes) -> Optional[str]:
         files = {"file": ("image.png", image_bytes, "image/png")}
-        resp = requests.post(url, headers=self._headers(), files=files, timeout=60)
+        data = await self._post_async("/v1/ocr", files, timeout=60)
+        return (data.get("text") or data.get("result") or None) if data else None
 
-        if resp.status_code != 200:
+    async def audio_to_text_async(self, audio_bytes: bytes) -> Optional[str]:
+        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
+        data = await self._post_async("/v1/transcribe", files, timeout=120)
+        return (data.get("text") or data.get("transcript") or None) if data else None
+
+    def _post(self, path: str, files: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        if not self.api_key:
             return None
 
-        data = resp.json()
-        return data.get("text") or data.get("result") or None
+        def _send():
+            return raise_for_retryable_status(
+                get_http_session().post(f"{self.base_url}{path}", headers=self._headers(), files=files, timeout=timeout)
+            )
 
-    def audio_to_text(self, audio_bytes: bytes) -> Optional[str]:
+        try:
+            resp = self.policy.call(_send)
+        except Exception:
+            logger.warning("AIML %s failed", path, exc_info=True)
+            return None
+        return resp.json() if resp.status_code == 200 else None
+
+    async def _post_async(self, path: str, files: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
         if not self.api_key:
             return None
 
-        url = f"{self.base_url}/v1/transcribe"
-        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
-        resp = requests.post(url, headers=self._headers(), files=files, timeout=120)
+        async def _send():
+            return raise_for_retryable_status(
+                await get_async_http_client().post(
+                    f"{self.base_url}{path}", headers=self._headers(), files=files, timeout=timeout,
+                )
+            )
 
-        if resp.status_code != 200:
+        try:
+            resp = await self.policy.call_async(_send)
+        except Exception:
+            logger.warning("AIML %s failed", path, exc_info=True)
             return None
-
-        data = resp.json()
-        return data.get("text") or data.get("transcript") or None
+        return resp.json() if resp.status_code == 200 else None
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+# Minimum cosine similarity between question embeddings to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # per workspace
+
+
+class _WorkspaceEntries:
+    def __init__(self):
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # Row-normalized question vectors, rebuilt lazily after inserts/evictions
+        self.matrix: Optional[np.ndarray] = None
+        self.matrix_ids: List[int] = []
+
+
+class AnswerCache:
+    """
+    Semantic cache of /ask responses per workspace.
+
+    A question hits when its embedding has cosine similarity >= `threshold`
+    with a cached question. Entries remember the workspace version they were
+    answered against and are dropped once the indexed content changes, after
+    `ttl` seconds, or by LRU once a workspace holds `max_entries`.
+    """
+
+    def __init__(
+        self,
+        version_of: Callable[[str], int],
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.version_of = version_of
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._workspaces: Dict[str, _WorkspaceEntries] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, workspace_id: str, question_vector: List[float]) -> Optional[Dict[str, Any]]:
+        """Best cached entry for the question, or None. Entries carry `similarity`."""
+        version = self.version_of(workspace_id)
+        query = _normalize(question_vector)
+
+        with self._lock:
+            ws = self._workspaces.get(workspace_id)
+            if ws is not None:
+                self._expire(ws, version)
+            if ws is None or not ws.entries or query is None:
+                self.misses += 1
+                return None
+
+            if ws.matrix is None:
+                ws.matrix_ids = list(ws.entries)
+                ws.matrix = np.stack([ws.entries[i]["vector"] for i in ws.matrix_ids])
+
+            scores = ws.matrix @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = ws.matrix_ids[best]
+            ws.entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = ws.entries[entry_id]
+            return {
+                "question": entry["question"],
+                "response": entry["response"],
+                "chunk_ids": entry["chunk_ids"],
+                "similarity": round(similarity, 4),
+            }
+
+    def store(
+        self,
+        workspace_id: str,
+        question: str,
+        question_vector: List[float],
+        response: Dict[str, Any],
+        chunk_ids: List[str],
+        version: Optional[int] = None,
+    ) -> None:
+        """
+        Cache an answer. `version` is the workspace version read before
+        retrieval; an answer built from chunks that have since changed is
+        not stored.
+        """
+        vector = _normalize(question_vector)
+        if vector is None:
+            return
+        current = self.version_of(workspace_id)
+        if version is None:
+            version = current
+        elif version != current:
+            return
+
+        with self._lock:
+            ws = self._workspaces.setdefault(workspace_id, _WorkspaceEntries())
+            self._next_id += 1
+            ws.entries[self._next_id] = {
+                "question": question,
+                "vector": vector,
+                "response": response,
+                "chunk_ids": list(chunk_ids),
+                "version": version,
+                "created_at": time.time(),
+            }
+            while len(ws.entries) > self.max_entries:
+                ws.entries.popitem(last=False)
+            ws.matrix = None
+
+    def invalidate(self, workspace_id: str) -> None:
+        with self._lock:
+            if self._workspaces.pop(workspace_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(ws.entries) for ws in self._workspaces.values())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "entries": entries,
+            "workspaces": len(self._workspaces),
+        }
+
+    def _expire(self, ws: _WorkspaceEntries, version: int) -> None:
+        cutoff = time.time() - self.ttl
+        stale = [
+            entry_id
+            for entry_id, entry in ws.entries.items()
+            if entry["version"] != version or entry["created_at"] < cutoff
+        ]
+        if stale:
+            for entry_id in stale:
+                del ws.entries[entry_id]
+            ws.matrix = None
+            self.invalidations += len(stale)
+
+
+def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    if not arr.size or norm == 0.0:
+        return None
+    return arr / norm
@@ -0,0 +1,341 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.context_builder import CHARS_PER_TOKEN, estimate_tokens
+
+# "structured" (token-sized, heading/page/table aware, with overlap) or "paragraph" (legacy 800-char packer)
+CHUNKER = os.getenv("CHUNKER", "structured").lower()
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+# Also split where consecutive sentences' embeddings are dissimilar (costs embedding calls)
+CHUNK_SEMANTIC = os.getenv("CHUNK_SEMANTIC", "false").lower() in ("1", "true", "yes")
+# Similarity percentile (within a section) below which a semantic boundary is placed
+CHUNK_SEMANTIC_PERCENTILE = float(os.getenv("CHUNK_SEMANTIC_PERCENTILE", "20"))
+
+# Extractors separate PDF pages, slides and sheets with a form feed.
+PAGE_BREAK = "\f"
+
+# Lines buffered before the semantic detector runs, when no heading or page break comes first
+_SEMANTIC_WINDOW = 64
+# A semantic boundary is only taken once the chunk holds this share of CHUNK_TOKENS
+_SEMANTIC_MIN_FILL = 0.5
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+_SENTENCE_RE = re.compile(r"[^.!?]+(?:[.!?]+|$)")
+_WORD_RE = re.compile(r"\S+")
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+class ParagraphChunker:
+    """
+    Packs newline-separated paragraphs into chunks of at most `max_chars`
+    (a single longer paragraph becomes its own chunk). Text can be fed in
+    arbitrary pieces as it arrives; chunks are returned as soon as they are
+    complete, and the result matches chunking the concatenated text at once.
+    """
+
+    def __init__(self, max_chars: int = 800):
+        self.max_chars = max_chars
+        self._partial_line = ""
+        self._current: List[str] = []
+        self._current_len = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        chunks: List[Dict[str, Any]] = []
+        for line in lines:
+            self._add(line, chunks)
+        return chunks
+
+    def flush(self) -> List[Dict[str, Any]]:
+        chunks: List[Dict[str, Any]] = []
+        self._add(self._partial_line, chunks)
+        self._partial_line = ""
+        if self._current:
+            chunks.append({"text": "\n".join(self._current)})
+            self._current = []
+            self._current_len = 0
+        return chunks
+
+    def _add(self, paragraph: str, chunks: List[Dict[str, Any]]) -> None:
+        p = paragraph.strip()
+        if not p:
+            return
+        if self._current_len + len(p) + 1 > self.max_chars and self._current:
+            chunks.append({"text": "\n".join(self._current)})
+            self._current = [p]
+            self._current_len = len(p)
+        else:
+            self._current.append(p)
+            self._current_len += len(p) + 1
+
+
+class _Unit:
+    """A line (or sentence / word window of a long line) with its offsets and token estimate."""
+
+    __slots__ = ("text", "start", "end", "tokens", "header", "heading")
+
+    def __init__(self, text: str, start: int, header: Optional["_Unit"] = None, heading: bool = False):
+        self.text = text
+        self.start = start
+        self.end = start + len(text)
+        self.tokens = estimate_tokens(text)
+        # For table rows: the table's header row (the header row points to itself)
+        self.header = header
+        self.heading = heading
+
+
+class StructuredChunker:
+    """
+    Streaming chunker sized in (estimated) tokens.
+
+    - Markdown headings start a new chunk and set its `section` path.
+    - Page breaks (form feeds) start a new chunk and advance `page`.
+    - Table rows (`|`-delimited or tab-separated) are never split, and a
+      table continuing into the next chunk repeats its header row.
+    - Lines longer than `max_tokens` are split at sentences, then words.
+    - Consecutive chunks in a section share about `overlap_tokens` of text.
+    - With a `boundary_detector`, chunks also end (once half full) where the
+      detector sees a topic shift between lines.
+
+    Each chunk carries `section`, `page`, `char_start` and `char_end` (offsets
+    into the fed text). Work is linear in the input, and feeding text in
+    pieces gives the same chunks as feeding it at once.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        boundary_detector: Optional["EmbeddingBoundaryDetector"] = None,
+    ):
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.boundary_detector = boundary_detector
+        self._partial_line = ""
+        self._offset = 0
+        self._page = 1
+        self._sections: List[Tuple[int, str]] = []
+        self._table_header: Optional[_Unit] = None
+        # Units of the chunk being built
+        self._units: List[_Unit] = []
+        self._tokens = 0
+        # Units waiting for the semantic boundary detector
+        self._window: List[_Unit] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        chunks: List[Dict[str, Any]] = []
+        for line in lines:
+            self._line(line, chunks)
+            self._offset += 1  # the newline
+        return chunks
+
+    def flush(self) -> List[Dict[str, Any]]:
+        chunks: List[Dict[str, Any]] = []
+        if self._partial_line:
+            self._line(self._partial_line, chunks)
+            self._partial_line = ""
+        self._hard_break(chunks)
+        return chunks
+
+    def _line(self, line: str, chunks: List[Dict[str, Any]]) -> None:
+        pieces = line.split(PAGE_BREAK)
+        for i, piece in enumerate(pieces):
+            if i:
+                self._hard_break(chunks)
+                self._page += 1
+                self._offset += 1  # the form feed
+            self._piece(piece, chunks)
+            self._offset += len(piece)
+
+    def _piece(self, piece: str, chunks: List[Dict[str, Any]]) -> None:
+        stripped = piece.strip()
+        if not stripped:
+            # A blank line ends any table.
+            self._table_header = None
+            return
+        start = self._offset + (len(piece) - len(piece.lstrip()))
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            if self.boundary_detector is not None:
+                self._drain_window(chunks)
+            # Consecutive headings stay together with the body that follows them.
+            if any(not unit.heading for unit in self._units):
+                self._hard_break(chunks)
+            level = len(heading.group(1))
+            self._sections = [s for s in self._sections if s[0] < level] + [(level, heading.group(2))]
+            self._push(_Unit(stripped, start, heading=True), chunks)
+            return
+
+        if stripped.startswith("|") or "\t" in stripped:
+            unit = _Unit(stripped, start, self._table_header)
+            if self._table_header is None:
+                unit.header = self._table_header = unit
+            # Rows are kept whole even when over max_tokens.
+            self._push(unit, chunks)
+            return
+
+        self._table_header = None
+        unit = _Unit(stripped, start)
+        if unit.tokens <= self.max_tokens:
+            self._push(unit, chunks)
+            return
+        for sub in _split_long(stripped, start, self.max_tokens):
+            self._push(sub, chunks)
+
+    def _push(self, unit: _Unit, chunks: List[Dict[str, Any]]) -> None:
+        if self.boundary_detector is None:
+            self._pack(unit, False, chunks)
+            return
+        self._window.append(unit)
+        if len(self._window) >= _SEMANTIC_WINDOW:
+            self._drain_window(chunks)
+
+    def _drain_window(self, chunks: List[Dict[str, Any]]) -> None:
+        window, self._window = self._window, []
+        if not window:
+            return
+        breaks = self.boundary_detector.boundaries([unit.text for unit in window])
+        for unit, soft_break in zip(window, breaks):
+            self._pack(unit, soft_break, chunks)
+
+    def _pack(self, unit: _Unit, soft_break: bool, chunks: List[Dict[str, Any]]) -> None:
+        if self._units:
+            full = self._tokens + unit.tokens > self.max_tokens
+            semantic = soft_break and self._tokens >= self.max_tokens * _SEMANTIC_MIN_FILL
+            if full or semantic:
+                chunks.append(self._emit())
+                self._units = self._carry_over(unit)
+                self._tokens = sum(u.tokens for u in self._units)
+        self._units.append(unit)
+        self._tokens += unit.tokens
+
+    def _carry_over(self, next_unit: _Unit) -> List[_Unit]:
+        """Units that open the next chunk: the table header if a table continues, then trailing overlap."""
+        carried: List[_Unit] = []
+        budget = self.overlap_tokens
+        for unit in reversed(self._units):
+            if unit.tokens > budget or unit.header is unit:
+                break
+            carried.insert(0, unit)
+            budget -= unit.tokens
+        header = next_unit.header
+        if header is not None and header is not next_unit and header not in carried:
+            carried.insert(0, header)
+        # Never let carried text alone fill the next chunk.
+        while carried and sum(u.tokens for u in carried) + next_unit.tokens > self.max_tokens:
+            carried.pop(0)
+        return carried
+
+    def _hard_break(self, chunks: List[Dict[str, Any]]) -> None:
+        if self.boundary_detector is not None:
+            self._drain_window(chunks)
+        if self._units:
+            chunks.append(self._emit())
+        self._units = []
+        self._tokens = 0
+        self._table_header = None
+
+    def _emit(self) -> Dict[str, Any]:
+        return {
+            "text": "\n".join(unit.text for unit in self._units),
+            "section": " > ".join(title for _, title in self._sections),
+            "page": self._page,
+            "char_start": min(unit.start for unit in self._units),
+            "char_end": max(unit.end for unit in self._units),
+        }
+
+
+class EmbeddingBoundaryDetector:
+    """
+    Marks topic shifts between consecutive lines: a line starts a new segment
+    when its cosine similarity to the previous one falls below the given
+    percentile of all neighbour similarities in the window.
+    """
+
+    def __init__(self, embed: EmbedFn, percentile: float = CHUNK_SEMANTIC_PERCENTILE):
+        self.embed = embed
+        self.percentile = percentile
+
+    def boundaries(self, texts: List[str]) -> List[bool]:
+        breaks = [False] * len(texts)
+        if len(texts) < 3:
+            return breaks
+        vectors = self.embed(texts)
+        if any(not v for v in vectors):
+            return breaks
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        similarities = np.einsum("ij,ij->i", matrix[:-1], matrix[1:])
+        threshold = np.percentile(similarities, self.percentile)
+        for i in np.flatnonzero(similarities < threshold):
+            breaks[i + 1] = True
+        return breaks
+
+
+CHUNKERS: Dict[str, Callable[..., Any]] = {
+    "paragraph": ParagraphChunker,
+    "structured": StructuredChunker,
+}
+
+
+def chunker_factory(name: str = CHUNKER, embed: Optional[EmbedFn] = None) -> Callable[[], Any]:
+    """Zero-argument constructor for the configured chunker (semantic boundaries need `embed`)."""
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown CHUNKER: {name}")
+    if name == "structured" and CHUNK_SEMANTIC and embed is not None:
+        detector = EmbeddingBoundaryDetector(embed)
+        return lambda: StructuredChunker(boundary_detector=detector)
+    return CHUNKERS[name]
+
+
+def chunk_all(chunker: Any, text: str) -> List[Dict[str, Any]]:
+    return chunker.feed(text) + chunker.flush()
+
+
+def chunk_paragraphs(text: str, max_chars: int = 800) -> List[Dict[str, Any]]:
+    return chunk_all(ParagraphChunker(max_chars), text)
+
+
+def _split_long(text: str, start: int, max_tokens: int) -> List[_Unit]:
+    """Split an over-long line into sentence units, and over-long sentences into word windows."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    units: List[_Unit] = []
+    for sentence in _SENTENCE_RE.finditer(text):
+        raw = sentence.group()
+        s_text = raw.strip()
+        if not s_text:
+            continue
+        s_start = start + sentence.start() + (len(raw) - len(raw.lstrip()))
+        if estimate_tokens(s_text) <= max_tokens:
+            units.append(_Unit(s_text, s_start))
+            continue
+
+        window_start = window_end = None
+        for word in _WORD_RE.finditer(s_text):
+            if window_start is not None and word.end() - window_start > max_chars:
+                units.append(_Unit(s_text[window_start:window_end], s_start + window_start))
+                window_start = None
+            if word.end() - word.start() > max_chars:
+                # A single "word" (e.g. an encoded blob) longer than a chunk is cut at max_chars.
+                for cut in range(word.start(), word.end(), max_chars):
+                    piece = s_text[cut:min(cut + max_chars, word.end())]
+                    units.append(_Unit(piece, s_start + cut))
+                continue
+            if window_start is None:
+                window_start = word.start()
+            window_end = word.end()
+        if window_start is not None:
+            units.append(_Unit(s_text[window_start:window_end], s_start + window_start))
+    return units
@@ -0,0 +1,137 @@
+import math
+import os
+import re
+from typing import Any, Dict, List
+
+# Upper bound on context tokens sent with each answer / follow-up call
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Rough characters-per-token for Gemini on English text; avoids a count_tokens round trip
+CHARS_PER_TOKEN = 4
+# Longest overlap removed when joining neighbouring chunks
+_MAX_OVERLAP_CHARS = 400
+_MIN_OVERLAP_CHARS = 20
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def build_context(hits: List[Dict[str, Any]], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Turn search hits (best first) into the context chunks sent to the model.
+
+    Duplicate or contained chunks are dropped, chunks that are adjacent in
+    the same file are merged into one passage, and passages are kept in
+    relevance order until `token_budget` is spent.
+    """
+    kept: List[Dict[str, Any]] = []
+    seen: List[str] = []
+    for rank, hit in enumerate(hits):
+        text = (hit.get("text") or "").strip()
+        normalized = _SPACE_RE.sub(" ", text).lower()
+        if not normalized or any(normalized in other for other in seen):
+            continue
+        seen.append(normalized)
+        kept.append(
+            {
+                "rank": rank,
+                "text": text,
+                "source": hit.get("filename", hit.get("source", "")),
+                "chunk_index": hit.get("chunk_index", -1),
+                "section": hit.get("section", ""),
+                "page": hit.get("page"),
+            }
+        )
+
+    passages = _merge_adjacent(kept)
+    passages.sort(key=lambda passage: passage["rank"])
+
+    context: List[Dict[str, Any]] = []
+    remaining = token_budget
+    for passage in passages:
+        cost = estimate_tokens(passage["text"])
+        if cost <= remaining:
+            context.append(passage)
+            remaining -= cost
+
+    if not context and passages:
+        # Even the best passage is over budget: send its leading part rather than nothing.
+        top = passages[0]
+        context.append({**top, "text": _truncate(top["text"], token_budget * CHARS_PER_TOKEN)})
+
+    return [
+        {
+            "text": passage["text"],
+            "source": passage["source"],
+            "chunk_index": passage["chunk_indexes"][0],
+            "chunk_indexes": passage["chunk_indexes"],
+            "section": passage["section"],
+            "page": passage["page"],
+        }
+        for passage in context
+    ]
+
+
+def render_context(context_chunks: List[Any]) -> str:
+    """The context block shared verbatim by the answer and follow-up prompts."""
+    lines: List[str] = []
+    for i, ch in enumerate(context_chunks):
+        # ContextChunk may be a Pydantic model; normalize to dict-like access.
+        if hasattr(ch, "dict"):
+            ch = ch.dict()
+        elif not isinstance(ch, dict):
+            ch = {
+                "source": getattr(ch, "source", ""),
+                "chunk_index": getattr(ch, "chunk_index", -1),
+                "text": getattr(ch, "text", ""),
+            }
+
+        indexes = ch.get("chunk_indexes") or [ch.get("chunk_index", -1)]
+        label = "chunk_index=" + ",".join(str(idx) for idx in indexes)
+        if ch.get("page"):
+            label += f", page={ch['page']}"
+        if ch.get("section"):
+            label += f", section={ch['section']}"
+        lines.append(f"[{i}] source={ch.get('source', '')}, {label}\n{ch.get('text', '')}\n")
+    return "\n".join(lines)
+
+
+def _merge_adjacent(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Join chunks with consecutive chunk_index from the same source; a passage ranks as its best chunk."""
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk["source"], []).append(chunk)
+
+    passages: List[Dict[str, Any]] = []
+    for source_chunks in by_source.values():
+        source_chunks.sort(key=lambda chunk: chunk["chunk_index"])
+        current = None
+        for chunk in source_chunks:
+            index = chunk["chunk_index"]
+            if current is not None and index >= 0 and index == current["chunk_indexes"][-1] + 1:
+                current["text"] = _join_overlapping(current["text"], chunk["text"])
+                current["chunk_indexes"].append(index)
+                current["rank"] = min(current["rank"], chunk["rank"])
+                continue
+            current = {**chunk, "chunk_indexes": [index]}
+            passages.append(current)
+    return passages
+
+
+def _join_overlapping(left: str, right: str) -> str:
+    """Concatenate two neighbouring chunks, dropping text the right one repeats from the left."""
+    longest = min(len(left), len(right), _MAX_OVERLAP_CHARS)
+    for size in range(longest, _MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n\n" + right
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + " …"
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# "tiered" (memory + SQLite), "memory" or "none"
+EMBED_CACHE = os.getenv("EMBED_CACHE", "tiered").lower()
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "20000"))
+EMBED_CACHE_DISK_ITEMS = int(os.getenv("EMBED_CACHE_DISK_ITEMS", "1000000"))
+EMBED_CACHE_DB_PATH = os.getenv("EMBED_CACHE_DB_PATH", "data/embeddings.db")
+
+# Keep SQLite IN (...) lists under the host-parameter limit
+_SQL_BATCH = 500
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache of embedding vectors keyed by (model name, sha256(text)).
+    Switching to a different model name drops entries of the previous one.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._model: Optional[str] = None
+
+    def get_many(self, model: str, keys: List[str]) -> List[Optional[List[float]]]:
+        self._check_model(model)
+        found = self._get(model, keys)
+        hits = sum(1 for v in found if v is not None)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, model: str, items: List[Tuple[str, List[float]]]) -> None:
+        self._check_model(model)
+        if items:
+            self._put(model, items)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": self.size(),
+        }
+
+    def size(self) -> int:
+        return 0
+
+    def clear(self) -> None:
+        """Drop every cached vector (hit/miss counters are kept)."""
+
+    def _check_model(self, model: str) -> None:
+        if self._model != model:
+            self._invalidate_other_models(model)
+            self._model = model
+
+    def _get(self, model: str, keys: List[str]) -> List[Optional[List[float]]]:
+        return [None] * len(keys)
+
+    def _put(self, model: str, items: List[Tuple[str, List[float]]]) -> None:
+        pass
+
+    def _invalidate_other_models(self, model: str) -> None:
+        pass
+
+
+class MemoryEmbeddingCache(EmbeddingCache):
+    """In-process LRU tier."""
+
+    def __init__(self, max_items: int = EMBED_CACHE_MEMORY_ITEMS):
+        super().__init__()
+        self.max_items = max(1, max_items)
+        self._items: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def size(self) -> int:
+        return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def _get(self, model: str, keys: List[str]) -> List[Optional[List[float]]]:
+        found: List[Optional[List[float]]] = []
+        with self._lock:
+            for key in keys:
+                vector = self._items.get(key)
+                if vector is not None:
+                    self._items.move_to_end(key)
+                found.append(vector)
+        return found
+
+    def _put(self, model: str, items: List[Tuple[str, List[float]]]) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._items[key] = vector
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _invalidate_other_models(self, model: str) -> None:
+        # Keys do not carry the model, so a model switch empties the tier.
+        with self._lock:
+            self._items.clear()
+
+
+class SqliteEmbeddingCache(EmbeddingCache):
+    """On-disk tier storing vectors as float32 blobs, evicting least recently used rows."""
+
+    def __init__(self, path: str = EMBED_CACHE_DB_PATH, max_items: int = EMBED_CACHE_DISK_ITEMS):
+        super().__init__()
+        self.max_items = max(1, max_items)
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, used_at REAL NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)")
+            self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def size(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+    def _get(self, model: str, keys: List[str]) -> List[Optional[List[float]]]:
+        rows: Dict[str, bytes] = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                part = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(part))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({marks})",
+                    (model, *part),
+                ):
+                    rows[key] = blob
+            if rows:
+                with self._conn:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET used_at = ? WHERE model = ? AND key = ?",
+                        [(now, model, key) for key in rows],
+                    )
+
+        found: List[Optional[List[float]]] = []
+        for key in keys:
+            blob = rows.get(key)
+            if blob is None:
+                found.append(None)
+            else:
+                vector = array("f")
+                vector.frombytes(blob)
+                found.append(vector.tolist())
+        return found
+
+    def _put(self, model: str, items: List[Tuple[str, List[float]]]) -> None:
+        now = time.time()
+        rows = [(model, key, array("f", vector).tobytes(), now) for key, vector in items]
+        with self._lock, self._conn:
+            # Insert new keys first so the change counter tells how many rows were added,
+            # keeping the row count current without a COUNT(*) scan per batch.
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, vector, used_at) VALUES (?, ?, ?, ?)", rows,
+            )
+            added = self._conn.total_changes - before
+            self._count += added
+            if added < len(rows):
+                self._conn.executemany(
+                    "UPDATE embeddings SET vector = ?, used_at = ? WHERE model = ? AND key = ?",
+                    [(blob, used_at, row_model, key) for row_model, key, blob, used_at in rows],
+                )
+            if self._count > self.max_items:
+                # Evict down to 90% so eviction is not paid on every insert.
+                evict = self._count - int(self.max_items * 0.9)
+                cursor = self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY used_at LIMIT ?)",
+                    (evict,),
+                )
+                self._count -= cursor.rowcount
+
+    def _invalidate_other_models(self, model: str) -> None:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM embeddings WHERE model != ?", (model,))
+            self._count -= cursor.rowcount
+
+
+class TieredEmbeddingCache(EmbeddingCache):
+    """Memory LRU in front of the SQLite tier; disk hits are promoted to memory."""
+
+    def __init__(self, memory: MemoryEmbeddingCache, disk: SqliteEmbeddingCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def stats(self) -> Dict[str, float]:
+        result = super().stats()
+        result["memory"] = self.memory.stats()
+        result["disk"] = self.disk.stats()
+        return result
+
+    def size(self) -> int:
+        return self.disk.size()
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    def _get(self, model: str, keys: List[str]) -> List[Optional[List[float]]]:
+        found = self.memory.get_many(model, keys)
+        missing = [i for i, v in enumerate(found) if v is None]
+        if missing:
+            from_disk = self.disk.get_many(model, [keys[i] for i in missing])
+            promote = []
+            for i, vector in zip(missing, from_disk):
+                if vector is not None:
+                    found[i] = vector
+                    promote.append((keys[i], vector))
+            self.memory.put_many(model, promote)
+        return found
+
+    def _put(self, model: str, items: List[Tuple[str, List[float]]]) -> None:
+        self.memory.put_many(model, items)
+        self.disk.put_many(model, items)
+
+
+def default_embedding_cache() -> Optional[EmbeddingCache]:
+    if EMBED_CACHE == "none":
+        return None
+    if EMBED_CACHE == "memory":
+        return MemoryEmbeddingCache()
+    return TieredEmbeddingCache(MemoryEmbeddingCache(), SqliteEmbeddingCache())
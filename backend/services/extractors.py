@@ -0,0 +1,488 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional
+from xml.etree import ElementTree
+
+from backend.services.chunking import PAGE_BREAK
+from backend.services.gemini_client import GEMINI_INLINE_MAX_BYTES
+from backend.services.media_splitter import MEDIA_EXTRACTION_CONCURRENCY, is_splittable, segment_text, split_upload
+
+try:
+    from pptx import Presentation
+except ImportError:
+    Presentation = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Parse text-native formats in-process instead of sending them to Gemini
+LOCAL_EXTRACTION_ENABLED = os.getenv("LOCAL_EXTRACTION", "true").lower() in ("1", "true", "yes")
+# PDFs averaging fewer extracted characters per page are treated as scans
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", "50"))
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Memory estimate for files streamed from disk to the Gemini Files API
+_STREAMED_COST = 1024 * 1024
+
+# Word paragraph styles rendered as markdown headings ("Title" counts as level 1)
+_DOCX_HEADING_RE = re.compile(r"(?:Heading([1-6])|Title)")
+
+logger = logging.getLogger(__name__)
+
+# Local extractor per MIME type, given a seekable binary file; returning None
+# hands the file to the remote fallback.
+LocalExtractor = Callable[[BinaryIO], Optional[str]]
+EXTRACTORS: Dict[str, LocalExtractor] = {}
+
+_MAGIC = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/flac"),
+    (b"OggS", "audio/ogg"),
+]
+
+_EXTRA_EXTENSIONS = {
+    ".md": "text/markdown",
+    ".markdown": "text/markdown",
+    ".csv": "text/csv",
+    ".json": "application/json",
+    ".docx": DOCX_MIME_TYPE,
+    ".pptx": PPTX_MIME_TYPE,
+    ".xlsx": XLSX_MIME_TYPE,
+}
+
+_OOXML_PARTS = {
+    "word/document.xml": DOCX_MIME_TYPE,
+    "ppt/presentation.xml": PPTX_MIME_TYPE,
+    "xl/workbook.xml": XLSX_MIME_TYPE,
+}
+
+
+def register_extractor(*mime_types: str) -> Callable[[LocalExtractor], LocalExtractor]:
+    def _register(fn: LocalExtractor) -> LocalExtractor:
+        for mime_type in mime_types:
+            EXTRACTORS[mime_type] = fn
+        return fn
+    return _register
+
+
+def detect_mime_type(file_obj: Dict[str, Any]) -> str:
+    """
+    MIME type from the file's magic bytes, falling back to the filename
+    extension and then the client-declared content type. Browsers often
+    send application/octet-stream (or nothing) for Markdown, CSV, etc.
+    """
+    with open_upload(file_obj) as fh:
+        head = fh.read(4096)
+
+    for magic, mime_type in _MAGIC:
+        if head.startswith(magic):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"PK\x03\x04":
+        mime_type = _ooxml_type(file_obj)
+        if mime_type:
+            return mime_type
+
+    filename = (file_obj.get("filename") or "").lower()
+    ext = os.path.splitext(filename)[1]
+    if ext in _EXTRA_EXTENSIONS:
+        return _EXTRA_EXTENSIONS[ext]
+    guessed = mimetypes.guess_type(filename)[0]
+    if guessed:
+        return guessed
+
+    declared = (file_obj.get("content_type") or "").split(";")[0].strip().lower()
+    if declared and declared != "application/octet-stream":
+        return declared
+    if _looks_like_text(head):
+        return "text/plain"
+    return "application/octet-stream"
+
+
+def open_upload(file_obj: Dict[str, Any]) -> BinaryIO:
+    """The upload as a binary file: its in-memory `data`, or the spooled file at `path`."""
+    if "data" in file_obj:
+        return io.BytesIO(file_obj["data"])
+    return open(file_obj["path"], "rb")
+
+
+def upload_size(file_obj: Dict[str, Any]) -> int:
+    if "data" in file_obj:
+        return len(file_obj["data"])
+    size = file_obj.get("size")
+    return size if size is not None else os.path.getsize(file_obj["path"])
+
+
+def extract_locally(file_obj: Dict[str, Any], mime_type: str) -> Optional[str]:
+    """Text of a text-native file, or None when it needs OCR / transcription / Gemini."""
+    if not LOCAL_EXTRACTION_ENABLED:
+        return None
+    extractor = EXTRACTORS.get(mime_type)
+    if extractor is None and mime_type.startswith("text/"):
+        extractor = EXTRACTORS["text/plain"]
+    if extractor is None:
+        return None
+    try:
+        with open_upload(file_obj) as fh:
+            return extractor(fh)
+    except Exception:
+        logger.warning("Local extraction failed for %s (%s)", file_obj.get("filename"), mime_type, exc_info=True)
+        return None
+
+
+class DocumentExtractor:
+    """
+    Upload -> plain text. Text-native formats are parsed locally; images and
+    audio go to AIML OCR / speech-to-text when configured; everything else,
+    and anything the cheaper paths could not read, goes to Gemini.
+
+    Scanned PDFs, audio and video are first split into page ranges and time
+    segments (see media_splitter); the pieces are extracted concurrently and
+    joined back in order.
+
+    Uploads are read from their spooled `path` one at a time; only formats
+    that need it (and small media sent inline) are loaded into memory.
+    """
+
+    def __init__(self, gemini_client: Any, aiml_client: Any = None):
+        self.gemini_client = gemini_client
+        self.aiml_client = aiml_client
+
+    def memory_cost(self, file_obj: Dict[str, Any]) -> int:
+        """Rough peak bytes held while extracting this file, for the ingestion memory budget."""
+        size = upload_size(file_obj)
+        mime_type = detect_mime_type(file_obj)
+        if LOCAL_EXTRACTION_ENABLED and mime_type in EXTRACTORS:
+            # Parsed document plus the extracted text
+            return 2 * size
+        if is_splittable(mime_type):
+            # Segments in flight, each sent inline at most
+            return min(3 * size, MEDIA_EXTRACTION_CONCURRENCY * 3 * GEMINI_INLINE_MAX_BYTES)
+        if "data" not in file_obj and size > GEMINI_INLINE_MAX_BYTES:
+            # Uploaded from disk through the Files API; only the text comes back
+            return _STREAMED_COST
+        # Raw bytes plus their base64 encoding in the request
+        return 3 * size
+
+    def extract(self, file_obj: Dict[str, Any]) -> str:
+        mime_type = detect_mime_type(file_obj)
+        text = extract_locally(file_obj, mime_type)
+        if text is not None:
+            return text
+
+        file_obj = {**file_obj, "content_type": mime_type}
+        if is_splittable(mime_type):
+            with tempfile.TemporaryDirectory(prefix="autorag-segments-") as workdir:
+                segments = split_upload(file_obj, workdir)
+                if segments:
+                    with ThreadPoolExecutor(max_workers=max(1, MEDIA_EXTRACTION_CONCURRENCY)) as pool:
+                        texts = list(pool.map(self._extract_remote, segments))
+                    return "".join(segment_text(s, t) for s, t in zip(segments, texts)).strip()
+        return self._extract_remote(file_obj)
+
+    async def extract_async(self, file_obj: Dict[str, Any]) -> str:
+        parts = [text async for text in self.stream_async(file_obj)]
+        return "".join(parts).strip()
+
+    async def stream_async(self, file_obj: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yields the file's text as it becomes available (Gemini output is streamed)."""
+        mime_type = await asyncio.to_thread(detect_mime_type, file_obj)
+        # Parsing is CPU bound, keep it off the event loop
+        text = await asyncio.to_thread(extract_locally, file_obj, mime_type)
+        if text is not None:
+            yield text
+            return
+
+        file_obj = {**file_obj, "content_type": mime_type}
+        if is_splittable(mime_type):
+            with tempfile.TemporaryDirectory(prefix="autorag-segments-") as workdir:
+                segments = await asyncio.to_thread(split_upload, file_obj, workdir)
+                if segments:
+                    async for text in self._stream_segments(segments):
+                        yield text
+                    return
+
+        if self.aiml_client is not None and mime_type.startswith("image/"):
+            text = await self.aiml_client.ocr_image_to_text_async(await asyncio.to_thread(_read, file_obj))
+        elif self.aiml_client is not None and mime_type.startswith("audio/"):
+            text = await self.aiml_client.audio_to_text_async(await asyncio.to_thread(_read, file_obj))
+        if text:
+            yield text.strip()
+            return
+
+        async for text in self.gemini_client.stream_text_from_file_async(file_obj):
+            yield text
+
+    async def _stream_segments(self, segments: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Extracts MEDIA_EXTRACTION_CONCURRENCY segments at a time, yielding their text in order."""
+        semaphore = asyncio.Semaphore(max(1, MEDIA_EXTRACTION_CONCURRENCY))
+
+        async def _extract(segment: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self._extract_remote_async(segment)
+
+        tasks = [asyncio.ensure_future(_extract(segment)) for segment in segments]
+        try:
+            for segment, task in zip(segments, tasks):
+                yield segment_text(segment, await task)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _extract_remote(self, file_obj: Dict[str, Any]) -> str:
+        mime_type = file_obj["content_type"]
+        text = None
+        if self.aiml_client is not None and mime_type.startswith("image/"):
+            text = self.aiml_client.ocr_image_to_text(_read(file_obj))
+        elif self.aiml_client is not None and mime_type.startswith("audio/"):
+            text = self.aiml_client.audio_to_text(_read(file_obj))
+        if text:
+            return text.strip()
+        return self.gemini_client.extract_text_from_file(file_obj)
+
+    async def _extract_remote_async(self, file_obj: Dict[str, Any]) -> str:
+        mime_type = file_obj["content_type"]
+        text = None
+        if self.aiml_client is not None and mime_type.startswith("image/"):
+            text = await self.aiml_client.ocr_image_to_text_async(await asyncio.to_thread(_read, file_obj))
+        elif self.aiml_client is not None and mime_type.startswith("audio/"):
+            text = await self.aiml_client.audio_to_text_async(await asyncio.to_thread(_read, file_obj))
+        if text:
+            return text.strip()
+        return await self.gemini_client.extract_text_from_file_async(file_obj)
+
+
+@register_extractor("text/plain", "text/markdown", "text/csv", "text/tab-separated-values")
+def _extract_plain_text(fh: BinaryIO) -> str:
+    return _decode(fh.read()).strip()
+
+
+@register_extractor("application/json")
+def _extract_json(fh: BinaryIO) -> str:
+    text = _decode(fh.read())
+    try:
+        # Re-dump without escapes so non-ASCII text is searchable as-is.
+        return json.dumps(json.loads(text), ensure_ascii=False, indent=1)
+    except json.JSONDecodeError:
+        return text.strip()
+
+
+@register_extractor("text/html", "application/xhtml+xml")
+def _extract_html(fh: BinaryIO) -> str:
+    parser = _HTMLText()
+    parser.feed(_decode(fh.read()))
+    parser.close()
+    return _squeeze_blank_lines("".join(parser.parts))
+
+
+@register_extractor(DOCX_MIME_TYPE)
+def _extract_docx(fh: BinaryIO) -> str:
+    with zipfile.ZipFile(fh) as zf:
+        root = ElementTree.fromstring(zf.read("word/document.xml"))
+    paragraphs: List[str] = []
+    for paragraph in root.iter(_w("p")):
+        runs = []
+        for node in paragraph.iter():
+            if node.tag == _w("t") and node.text:
+                runs.append(node.text)
+            elif node.tag == _w("tab"):
+                runs.append("\t")
+            elif node.tag in (_w("br"), _w("cr")):
+                runs.append("\n")
+        text = "".join(runs)
+        # Heading styles become markdown headings so the chunker can track sections.
+        style = paragraph.find(f"{_w('pPr')}/{_w('pStyle')}")
+        heading = _DOCX_HEADING_RE.fullmatch(style.get(_w("val"), "")) if style is not None else None
+        if heading and text.strip():
+            text = "#" * int(heading.group(1) or 1) + " " + " ".join(text.split())
+        paragraphs.append(text)
+    return _squeeze_blank_lines("\n".join(paragraphs))
+
+
+@register_extractor(PPTX_MIME_TYPE)
+def _extract_pptx(fh: BinaryIO) -> str:
+    if Presentation is not None:
+        prs = Presentation(fh)
+        slides = []
+        for slide in prs.slides:
+            slides.append("\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text")))
+        return PAGE_BREAK.join(slides).strip()
+
+    fh.seek(0)
+    with zipfile.ZipFile(fh) as zf:
+        slides = sorted(
+            (name for name in zf.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", name)),
+            key=lambda name: int(re.search(r"\d+", name.rsplit("/", 1)[1]).group()),
+        )
+        text = []
+        for name in slides:
+            root = ElementTree.fromstring(zf.read(name))
+            text.append("\n".join(node.text for node in root.iter(_a("t")) if node.text))
+    return PAGE_BREAK.join(text).strip()
+
+
+@register_extractor(XLSX_MIME_TYPE)
+def _extract_xlsx(fh: BinaryIO) -> str:
+    with zipfile.ZipFile(fh) as zf:
+        names = zf.namelist()
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in names:
+            root = ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))
+            for item in root.iter(_s("si")):
+                shared.append("".join(node.text or "" for node in item.iter(_s("t"))))
+
+        sheets = sorted(
+            (name for name in names if re.fullmatch(r"xl/worksheets/sheet\d+\.xml", name)),
+            key=lambda name: int(re.search(r"\d+", name.rsplit("/", 1)[1]).group()),
+        )
+        out = io.StringIO()
+        writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+        for i, name in enumerate(sheets):
+            if i:
+                out.write(PAGE_BREAK)
+            root = ElementTree.fromstring(zf.read(name))
+            for row in root.iter(_s("row")):
+                values: List[str] = []
+                for cell in row.iter(_s("c")):
+                    # Empty cells are omitted, so place each value by its reference (e.g. "D7").
+                    column = _xlsx_column(cell.get("r"), len(values))
+                    values.extend([""] * (column - len(values)))
+                    values.append(_xlsx_cell_value(cell, shared))
+                if any(values):
+                    writer.writerow(values)
+    return out.getvalue().strip()
+
+
+@register_extractor("application/pdf")
+def _extract_pdf(fh: BinaryIO) -> Optional[str]:
+    """Text layer of a PDF, or None for scans (and when pypdf is not installed)."""
+    if PdfReader is None:
+        return None
+    reader = PdfReader(fh)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    if not pages or sum(len(p.strip()) for p in pages) < PDF_MIN_CHARS_PER_PAGE * len(pages):
+        return None
+    return PAGE_BREAK.join(p.strip() for p in pages)
+
+
+def _ooxml_type(file_obj: Dict[str, Any]) -> Optional[str]:
+    try:
+        with open_upload(file_obj) as fh, zipfile.ZipFile(fh) as zf:
+            names = set(zf.namelist())
+    except zipfile.BadZipFile:
+        return None
+    for part, mime_type in _OOXML_PARTS.items():
+        if part in names:
+            return mime_type
+    return None
+
+
+def _read(file_obj: Dict[str, Any]) -> bytes:
+    with open_upload(file_obj) as fh:
+        return fh.read()
+
+
+def _looks_like_text(sample: bytes) -> bool:
+    if b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character cut off at the end of the sample is fine.
+        return exc.start >= len(sample) - 3
+    return True
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def _squeeze_blank_lines(text: str) -> str:
+    lines = [line.rstrip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _xlsx_column(ref: Optional[str], default: int) -> int:
+    """Zero-based column index of a cell reference like "AB12"; `default` when it has none."""
+    letters = re.match(r"[A-Z]+", ref or "")
+    if letters is None:
+        return default
+    index = 0
+    for letter in letters.group():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return max(index - 1, default)
+
+
+def _xlsx_cell_value(cell: ElementTree.Element, shared: List[str]) -> str:
+    if cell.get("t") == "inlineStr":
+        return "".join(node.text or "" for node in cell.iter(_s("t")))
+    value = cell.find(_s("v"))
+    if value is None or value.text is None:
+        return ""
+    if cell.get("t") == "s":
+        return shared[int(value.text)]
+    return value.text
+
+
+def _w(tag: str) -> str:
+    return "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}" + tag
+
+
+def _a(tag: str) -> str:
+    return "{http://schemas.openxmlformats.org/drawingml/2006/main}" + tag
+
+
+def _s(tag: str) -> str:
+    return "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}" + tag
+
+
+class _HTMLText(HTMLParser):
+    _SKIP = {"script", "style", "noscript", "template", "svg"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self.skip_depth += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
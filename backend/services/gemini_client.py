@@ -1,9 +1,19 @@
 
+import asyncio
+import io
 import json
+import logging
 import os
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 
 from google import genai
+
+from backend.services.chunking import chunk_paragraphs
+from backend.services.context_builder import render_context
+from backend.services.embedding_cache import EmbeddingCache, default_embedding_cache, text_key
+from backend.services.metrics import EMBEDDED_TEXTS, record_token_usage, span
+from backend.services.resilience import ProviderUnavailableError, get_policy, is_retryable
 # Add pptx support
 try:
     from pptx import Presentation
@@ -11,15 +21,45 @@ except ImportError:
     Presentation = None
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# embed_content accepts up to 100 texts per request
+EMBED_BATCH_SIZE = int(os.getenv("GEMINI_EMBED_BATCH_SIZE", "100"))
+# embed_content requests in flight at once for the async API
+EMBED_CONCURRENCY = int(os.getenv("GEMINI_EMBED_CONCURRENCY", "4"))
+
+# "single": one schema-constrained call returns the answer and, when needed, a follow-up question.
+# "two_call": the follow-up question comes from a second generate_content call.
+ANSWER_MODE = os.getenv("ANSWER_MODE", "single").lower()
+
+# Larger files are uploaded through the Files API (inline requests are capped at 20MB)
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(16 * 1024 * 1024)))
+GEMINI_FILE_POLL_SECONDS = float(os.getenv("GEMINI_FILE_POLL_SECONDS", "2"))
+
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+EXTRACTION_PROMPT = (
+    "You are a document text extractor. "
+    "Read the content of the attached file and return ONLY the plain text content, "
+    "with no formatting, explanations, or extra commentary."
+    "you can recive files can be image, pdf, docx, txt, video etc."
+)
+
+logger = logging.getLogger(__name__)
 
 
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, embedding_cache: Optional[EmbeddingCache] = None, answer_mode: str = ANSWER_MODE):
         self.client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
         print("GEMINI_API_KEY:", GEMINI_API_KEY)
         # You can change model names if needed
         self.text_model_name = "gemini-2.5-flash"
         self.embed_model_name = "text-embedding-004"
+        # Configured by EMBED_CACHE; entries are keyed by embed_model_name
+        self.embedding_cache = embedding_cache if embedding_cache is not None else default_embedding_cache()
+        self.answer_mode = answer_mode
+        # Rate limits, retries and circuit breakers per model
+        self.generate_policy = get_policy(f"gemini/{self.text_model_name}")
+        self.embed_policy = get_policy(f"gemini/{self.embed_model_name}")
+        self.files_policy = get_policy("gemini/files")
 
     def _ensure_client(self) -> bool:
         return self.client is not None
@@ -28,35 +68,127 @@ class GeminiClient:
         """
         Use Gemini to turn an uploaded file (PDF, doc, image, etc.)
         into plain text for RAG. If file is .pptx, extract text using python-pptx first, then send to Gemini.
+        `file_obj` carries the bytes in `data` or a spooled file `path`; files over
+        GEMINI_INLINE_MAX_BYTES go through the Files API instead of inline_data.
         """
         if not self._ensure_client():
             return ""
 
         mime_type = file_obj.get("content_type") or "application/octet-stream"
-        data = file_obj["data"]
+        if mime_type == PPTX_MIME_TYPE and Presentation is None:
+            return "Error: python-pptx is not installed. Cannot process .pptx files."
+
+        if not _uses_files_api(file_obj, mime_type):
+            response = self._generate(
+                model=self.text_model_name,
+                contents=self._extraction_contents(file_obj),
+            )
+            return (getattr(response, "text", "") or "").strip()
+
+        uploaded = self._upload_file(file_obj, mime_type)
+        try:
+            response = self._generate(
+                model=self.text_model_name,
+                contents=_file_extraction_contents(uploaded),
+            )
+        finally:
+            self._delete_uploaded_file(uploaded)
+        return (getattr(response, "text", "") or "").strip()
+
+    async def extract_text_from_file_async(self, file_obj: Dict[str, Any]) -> str:
+        parts = [text async for text in self.stream_text_from_file_async(file_obj)]
+        return "".join(parts).strip()
+
+    async def stream_text_from_file_async(self, file_obj: Dict[str, Any]) -> AsyncIterator[str]:
+        """Like extract_text_from_file, but yields the text as Gemini generates it."""
+        if not self._ensure_client():
+            return
+
+        mime_type = file_obj.get("content_type") or "application/octet-stream"
+        if mime_type == PPTX_MIME_TYPE and Presentation is None:
+            yield "Error: python-pptx is not installed. Cannot process .pptx files."
+            return
+
+        uploaded = None
+        if _uses_files_api(file_obj, mime_type):
+            uploaded = await self._upload_file_async(file_obj, mime_type)
+            contents = _file_extraction_contents(uploaded)
+        else:
+            # File reads and python-pptx parsing are blocking, keep them off the event loop
+            contents = await asyncio.to_thread(self._extraction_contents, file_obj)
+
+        try:
+            stream = self.generate_policy.stream_async(
+                lambda: self.client.aio.models.generate_content_stream(model=self.text_model_name, contents=contents)
+            )
+            usage = None
+            async for chunk in stream:
+                # Streamed usage metadata is cumulative; the last chunk carries the totals.
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, "text", "") or ""
+                if text:
+                    yield text
+            record_token_usage(self.text_model_name, usage)
+        finally:
+            if uploaded is not None:
+                await self._delete_uploaded_file_async(uploaded)
+
+    def _upload_file(self, file_obj: Dict[str, Any], mime_type: str) -> Any:
+        uploaded = self.files_policy.call(
+            self.client.files.upload, file=file_obj["path"], config=_upload_config(file_obj, mime_type),
+        )
+        # Video (and some audio) is processed asynchronously before it can be referenced.
+        while _file_state(uploaded) == "PROCESSING":
+            time.sleep(GEMINI_FILE_POLL_SECONDS)
+            uploaded = self.files_policy.call(self.client.files.get, name=uploaded.name)
+        if _file_state(uploaded) == "FAILED":
+            raise RuntimeError(f"Gemini could not process {file_obj.get('filename')}")
+        return uploaded
+
+    async def _upload_file_async(self, file_obj: Dict[str, Any], mime_type: str) -> Any:
+        uploaded = await self.files_policy.call_async(
+            self.client.aio.files.upload, file=file_obj["path"], config=_upload_config(file_obj, mime_type),
+        )
+        while _file_state(uploaded) == "PROCESSING":
+            await asyncio.sleep(GEMINI_FILE_POLL_SECONDS)
+            uploaded = await self.files_policy.call_async(self.client.aio.files.get, name=uploaded.name)
+        if _file_state(uploaded) == "FAILED":
+            raise RuntimeError(f"Gemini could not process {file_obj.get('filename')}")
+        return uploaded
+
+    def _delete_uploaded_file(self, uploaded: Any) -> None:
+        try:
+            self.client.files.delete(name=uploaded.name)
+        except Exception:
+            # Uploaded files expire on their own after 48 hours.
+            logger.warning("Failed to delete Gemini file %s", uploaded.name, exc_info=True)
+
+    async def _delete_uploaded_file_async(self, uploaded: Any) -> None:
+        try:
+            await self.client.aio.files.delete(name=uploaded.name)
+        except Exception:
+            logger.warning("Failed to delete Gemini file %s", uploaded.name, exc_info=True)
+
+    def _extraction_contents(self, file_obj: Dict[str, Any]) -> List[Dict[str, Any]]:
+        mime_type = file_obj.get("content_type") or "application/octet-stream"
+        data = _file_bytes(file_obj)
 
         # If PowerPoint, extract text using python-pptx, then send to Gemini
-        if mime_type == "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-            if Presentation is None:
-                return "Error: python-pptx is not installed. Cannot process .pptx files."
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".pptx", delete=True) as tmp:
-                tmp.write(data)
-                tmp.flush()
-                prs = Presentation(tmp.name)
-                text = []
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            text.append(shape.text)
-                extracted_text = "\n".join(text)
+        if mime_type == PPTX_MIME_TYPE:
+            prs = Presentation(io.BytesIO(data))
+            text = []
+            for slide in prs.slides:
+                for shape in slide.shapes:
+                    if hasattr(shape, "text"):
+                        text.append(shape.text)
+            extracted_text = "\n".join(text)
             # Now send extracted text to Gemini
             prompt = (
                 "You are a document text extractor. "
                 "Read the following extracted text from a PowerPoint file and return ONLY the plain text content, "
                 "with no formatting, explanations, or extra commentary."
             )
-            contents = [
+            return [
                 {
                     "role": "user",
                     "parts": [
@@ -65,21 +197,8 @@ class GeminiClient:
                     ],
                 }
             ]
-            response = self.client.models.generate_content(
-                model=self.text_model_name,
-                contents=contents,
-            )
-            return (getattr(response, "text", "") or "").strip()
 
-        # Otherwise, use Gemini for supported types
-        prompt = (
-            "You are a document text extractor. "
-            "Read the content of the attached file and return ONLY the plain text content, "
-            "with no formatting, explanations, or extra commentary."
-            "you can recive files can be image, pdf, docx, txt, video etc."
-        )
-
-        contents = [
+        return [
             {
                 "role": "user",
                 "parts": [
@@ -89,54 +208,114 @@ class GeminiClient:
                             "data": data,
                         }
                     },
-                    {"text": prompt},
+                    {"text": EXTRACTION_PROMPT},
                 ],
             }
         ]
 
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=contents,
-        )
-
-        return (getattr(response, "text", "") or "").strip()
-
     def chunk_text_for_rag(self, text: str, max_chars: int = 800) -> List[Dict[str, str]]:
-        chunks: List[Dict[str, str]] = []
-        current: List[str] = []
-        current_len = 0
-
-        for paragraph in text.split("\n"):
-            p = paragraph.strip()
-            if not p:
-                continue
-            if current_len + len(p) + 1 > max_chars and current:
-                chunks.append({"text": "\n".join(current)})
-                current = [p]
-                current_len = len(p)
-            else:
-                current.append(p)
-                current_len += len(p) + 1
-
-        if current:
-            chunks.append({"text": "\n".join(current)})
-
-        return chunks
+        return chunk_paragraphs(text, max_chars)
 
     def embed_text(self, text: str) -> List[float]:
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+        """
+        Embed many texts with one embed_content call per batch.
+        Results are in input order; texts that could not be embedded come back as [].
+        Raises once retries are exhausted on rate limits or outages (or the
+        circuit is open), so callers fail instead of storing chunks without vectors.
+        """
         if not self._ensure_client():
-            return []
+            return [[] for _ in texts]
+
+        cached, todo = self._cached_embeddings(texts)
+        batch_size = max(1, batch_size)
+        computed: List[List[float]] = []
+        for start in range(0, len(todo), batch_size):
+            computed.extend(self._embed_batch(todo[start:start + batch_size]))
+        return self._merge_embeddings(texts, cached, todo, computed)
+
+    def _cached_embeddings(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """Cached vectors per text (None on miss) and the distinct texts still to embed."""
+        if self.embedding_cache is None:
+            cached: List[Optional[List[float]]] = [None] * len(texts)
+        else:
+            cached = self.embedding_cache.get_many(self.embed_model_name, [text_key(t) for t in texts])
+        todo = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        return cached, todo
+
+    def _merge_embeddings(
+        self,
+        texts: List[str],
+        cached: List[Optional[List[float]]],
+        todo: List[str],
+        computed: List[List[float]],
+    ) -> List[List[float]]:
+        fresh = dict(zip(todo, computed))
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many(
+                self.embed_model_name, [(text_key(t), v) for t, v in fresh.items() if v],
+            )
+        return [v if v is not None else fresh.get(t, []) for t, v in zip(texts, cached)]
 
-        resp = self.client.models.embed_content(
-            model=self.embed_model_name,
-            contents=[text],
-        )
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        try:
+            resp = self.embed_policy.call(
+                self.client.models.embed_content,
+                model=self.embed_model_name,
+                contents=list(texts),
+            )
+            EMBEDDED_TEXTS.inc(len(texts), model=self.embed_model_name)
+            return _vectors_from_response(resp, len(texts))
+        except Exception as exc:
+            if _provider_down(exc):
+                raise
+            if len(texts) == 1:
+                logger.warning("Failed to embed text", exc_info=True)
+                return [[]]
+            # Split the batch so only the offending items end up without a vector.
+            mid = len(texts) // 2
+            return self._embed_batch(texts[:mid]) + self._embed_batch(texts[mid:])
+
+    async def embed_text_async(self, text: str) -> List[float]:
+        return (await self.embed_texts_async([text]))[0]
+
+    async def embed_texts_async(self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+        if not self._ensure_client():
+            return [[] for _ in texts]
+
+        cached, todo = self._cached_embeddings(texts)
+        batch_size = max(1, batch_size)
+        semaphore = asyncio.Semaphore(max(1, EMBED_CONCURRENCY))
+
+        async def _run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch_async(batch)
 
-        # Adapt to common response shape: embeddings[0].values
+        batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+        results = await asyncio.gather(*(_run(b) for b in batches))
+        computed = [vector for batch_vectors in results for vector in batch_vectors]
+        return self._merge_embeddings(texts, cached, todo, computed)
+
+    async def _embed_batch_async(self, texts: List[str]) -> List[List[float]]:
         try:
-            return list(resp.embeddings[0].values)
-        except Exception:
-            return []
+            resp = await self.embed_policy.call_async(
+                self.client.aio.models.embed_content,
+                model=self.embed_model_name,
+                contents=list(texts),
+                hedge=True,
+            )
+            EMBEDDED_TEXTS.inc(len(texts), model=self.embed_model_name)
+            return _vectors_from_response(resp, len(texts))
+        except Exception as exc:
+            if _provider_down(exc):
+                raise
+            if len(texts) == 1:
+                logger.warning("Failed to embed text", exc_info=True)
+                return [[]]
+            mid = len(texts) // 2
+            return await self._embed_batch_async(texts[:mid]) + await self._embed_batch_async(texts[mid:])
 
     def answer_with_context(
         self,
@@ -148,6 +327,153 @@ class GeminiClient:
         Use Gemini to answer a question using ONLY the provided context chunks.
         Returns: { answer, confidence, citations, needs_human_review }
         """
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            return early
+
+        # Rendered once so the follow-up call repeats the exact same prompt prefix.
+        context_text = render_context(context_chunks)
+        response = self._generate(**self._answer_request(question, context_text))
+        result = self._parse_answer_response(response, review_threshold)
+
+        # If human review is needed and the answer call did not already write one,
+        # generate a context-aware follow-up question using LLM
+        if result["needs_human_review"] and "followup_question" not in result:
+            followup_question = self.generate_followup_question(
+                question, context_chunks, result["answer"], context_text=context_text,
+            )
+            result["followup_question"] = followup_question
+
+        return result
+
+    async def answer_with_context_async(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        review_threshold: float = 0.6,
+    ) -> Dict[str, Any]:
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            return early
+
+        context_text = render_context(context_chunks)
+        response = await self._generate_async(**self._answer_request(question, context_text))
+        result = self._parse_answer_response(response, review_threshold)
+
+        if result["needs_human_review"] and "followup_question" not in result:
+            result["followup_question"] = await self.generate_followup_question_async(
+                question, context_chunks, result["answer"], context_text=context_text,
+            )
+
+        return result
+
+    def stream_answer_with_context(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        review_threshold: float = 0.6,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of answer_with_context.
+        Yields { type: "token", text } as Gemini produces the answer, then one
+        { type: "result", rag_result } with the same shape answer_with_context returns.
+        """
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            yield {"type": "result", "rag_result": early}
+            return
+
+        context_text = render_context(context_chunks)
+        stream = _StreamedAnswer()
+        contents = _answer_prompt(question, context_text, self._stream_system_prompt())
+        usage = None
+        for chunk in self.generate_policy.stream(
+            lambda: self.client.models.generate_content_stream(model=self.text_model_name, contents=contents)
+        ):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = stream.feed(getattr(chunk, "text", "") or "")
+            if text:
+                yield {"type": "token", "text": text}
+        record_token_usage(self.text_model_name, usage)
+        text = stream.flush()
+        if text:
+            yield {"type": "token", "text": text}
+
+        result = stream.result(review_threshold)
+        if result["needs_human_review"] and "followup_question" not in result:
+            result["followup_question"] = self.generate_followup_question(
+                question, context_chunks, result["answer"], context_text=context_text,
+            )
+        yield {"type": "result", "rag_result": result}
+
+    async def stream_answer_with_context_async(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        review_threshold: float = 0.6,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            yield {"type": "result", "rag_result": early}
+            return
+
+        context_text = render_context(context_chunks)
+        stream = _StreamedAnswer()
+        contents = _answer_prompt(question, context_text, self._stream_system_prompt())
+        usage = None
+        async for chunk in self.generate_policy.stream_async(
+            lambda: self.client.aio.models.generate_content_stream(model=self.text_model_name, contents=contents)
+        ):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = stream.feed(getattr(chunk, "text", "") or "")
+            if text:
+                yield {"type": "token", "text": text}
+        record_token_usage(self.text_model_name, usage)
+        text = stream.flush()
+        if text:
+            yield {"type": "token", "text": text}
+
+        result = stream.result(review_threshold)
+        if result["needs_human_review"] and "followup_question" not in result:
+            result["followup_question"] = await self.generate_followup_question_async(
+                question, context_chunks, result["answer"], context_text=context_text,
+            )
+        yield {"type": "result", "rag_result": result}
+
+    def _generate(self, **request: Any) -> Any:
+        response = self.generate_policy.call(self.client.models.generate_content, **request)
+        record_token_usage(self.text_model_name, getattr(response, "usage_metadata", None))
+        return response
+
+    async def _generate_async(self, **request: Any) -> Any:
+        response = await self.generate_policy.call_async(self.client.aio.models.generate_content, **request)
+        record_token_usage(self.text_model_name, getattr(response, "usage_metadata", None))
+        return response
+
+    def _answer_request(self, question: str, context_text: str) -> Dict[str, Any]:
+        """generate_content arguments for the configured answer mode."""
+        if self.answer_mode == "single":
+            return {
+                "model": self.text_model_name,
+                "contents": _answer_prompt(question, context_text, STRUCTURED_ANSWER_SYSTEM_PROMPT),
+                "config": {
+                    "response_mime_type": "application/json",
+                    "response_schema": ANSWER_RESPONSE_SCHEMA,
+                },
+            }
+        return {"model": self.text_model_name, "contents": _answer_prompt(question, context_text)}
+
+    def _parse_answer_response(self, response: Any, review_threshold: float) -> Dict[str, Any]:
+        if self.answer_mode == "single":
+            return _parse_structured_answer(response, review_threshold)
+        return _parse_answer(getattr(response, "text", "") or "", review_threshold)
+
+    def _stream_system_prompt(self) -> str:
+        if self.answer_mode == "single":
+            return STREAM_STRUCTURED_ANSWER_SYSTEM_PROMPT
+        return STREAM_ANSWER_SYSTEM_PROMPT
+
+    def _answer_precheck(self, context_chunks: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not self._ensure_client():
             return {
                 "answer": "",
@@ -165,145 +491,334 @@ class GeminiClient:
                 "needs_human_review": True,
             }
 
-        context_lines: List[str] = []
-        for i, ch in enumerate(context_chunks):
-            # ContextChunk may be a Pydantic model; normalize to dict-like access.
-            if hasattr(ch, "dict"):
-                ch_data = ch.dict()
-            elif isinstance(ch, dict):
-                ch_data = ch
-            else:
-                ch_data = {
-                    "source": getattr(ch, "source", ""),
-                    "chunk_index": getattr(ch, "chunk_index", -1),
-                    "text": getattr(ch, "text", ""),
-                }
+        return None
+
+    def generate_followup_question(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        answer: str = "",
+        context_text: Optional[str] = None,
+    ) -> str:
+        """
+        Use Gemini LLM to generate a context-aware follow-up question for the user if human review is needed.
+        Pass the answer call's `context_text` to reuse its rendered context (and cached prompt prefix).
+        """
+        if not self._ensure_client():
+            return "Can you clarify or provide more details?"
+
+        with span("followup"):
+            response = self._generate(
+                model=self.text_model_name,
+                contents=_followup_contents(question, context_text or render_context(context_chunks), answer),
+            )
+        return (getattr(response, "text", "") or "Can you clarify your question?").strip()
+
+    async def generate_followup_question_async(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        answer: str = "",
+        context_text: Optional[str] = None,
+    ) -> str:
+        if not self._ensure_client():
+            return "Can you clarify or provide more details?"
 
-            context_lines.append(
-                f"[{i}] source={ch_data.get('source','')}, chunk_index={ch_data.get('chunk_index', -1)}\n{ch_data.get('text','')}\n"
+        with span("followup"):
+            response = await self._generate_async(
+                model=self.text_model_name,
+                contents=_followup_contents(question, context_text or render_context(context_chunks), answer),
             )
-        context_text = "\n\n".join(context_lines)
+        return (getattr(response, "text", "") or "Can you clarify your question?").strip()
+
 
-        system_prompt = """
-You are an answer-generation agent for a Retrieval-Augmented Generation (RAG) system.
+# Both answer and follow-up prompts start with CONTEXT_PREFIX + the rendered
+# context, so Gemini's implicit prompt caching can reuse that prefix.
+CONTEXT_PREFIX = "Context chunks extracted from the user's private documents:\n\n"
 
-You are given:
-- a user's question
-- a set of context chunks extracted from the user's private documents
+_ANSWER_RULES = """
+You are the answer-generation agent of a Retrieval-Augmented Generation (RAG) system.
 
 Rules:
-1. Use ONLY the provided context to answer. Do NOT use outside knowledge.
-2. If the answer is not clearly supported by the context, say:
-   "I cannot answer this based on the provided context."
+1. Use ONLY the context chunks above. Do NOT use outside knowledge.
+2. If the context does not clearly support an answer, say: "I cannot answer this based on the provided context."
 3. Be concise and factual.
-4. Provide a confidence score between 0.0 and 1.0 that reflects how well the context supports your answer, so if you are not sure with you answer or the question than just give me actual confidence score.
-5. Provide citations: a list of objects { "source": string, "chunk_index": number } corresponding to the chunks you used.
-6. if the confidence score is below 0.6, needs_human_review must be true.
+4. confidence (0.0-1.0) is how well the context supports your answer; report it honestly, even if low.
+5. citations lists { "source", "chunk_index" } for each chunk you used.
+"""
+
+_FOLLOWUP_RULE = (
+    "6. followup_question: if confidence is below 0.6, one natural-sounding question for the user that would "
+    "clarify their original question so the next answer can be more accurate; otherwise an empty string.\n"
+)
+
+ANSWER_SYSTEM_PROMPT = _ANSWER_RULES + """6. If confidence is below 0.6, needs_human_review must be true.
 
 Return ONLY valid JSON in this exact format:
+{"answer": "<string>", "confidence": <float 0-1>, "citations": [{"source": "<string>", "chunk_index": <number>}], "needs_human_review": <boolean>}
+"""
 
-{
-  "answer": "<string>",
-  "confidence": <float between 0 and 1>,
-  "citations": [
-    { "source": "<string>", "chunk_index": <number> }
-  ],
-  "needs_human_review": <boolean>
+# ANSWER_MODE=single: the JSON shape is enforced by ANSWER_RESPONSE_SCHEMA instead of the prompt.
+STRUCTURED_ANSWER_SYSTEM_PROMPT = _ANSWER_RULES + _FOLLOWUP_RULE
+
+ANSWER_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "answer": {"type": "STRING"},
+        "confidence": {"type": "NUMBER"},
+        "citations": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"source": {"type": "STRING"}, "chunk_index": {"type": "INTEGER"}},
+                "required": ["source", "chunk_index"],
+            },
+        },
+        "followup_question": {"type": "STRING"},
+    },
+    "required": ["answer", "confidence", "citations", "followup_question"],
+    "property_ordering": ["answer", "confidence", "citations", "followup_question"],
 }
+
+# Streaming cannot emit JSON token by token, so the model writes the answer as
+# plain text first and the metadata as JSON after this marker.
+ANSWER_METADATA_MARKER = "<<<METADATA>>>"
+
+STREAM_ANSWER_SYSTEM_PROMPT = _ANSWER_RULES + """
+Output format: first the answer as plain text (no JSON, no code fences), then on its own line
+""" + ANSWER_METADATA_MARKER + """ followed by ONLY valid JSON in this exact format:
+{"confidence": <float 0-1>, "citations": [{"source": "<string>", "chunk_index": <number>}]}
 """
 
-        prompt_text = (
-            system_prompt
-            + "\n\nQuestion:\n"
-            + question
-            + "\n\nContext Chunks:\n"
-            + context_text
-        )
+STREAM_STRUCTURED_ANSWER_SYSTEM_PROMPT = _ANSWER_RULES + _FOLLOWUP_RULE + """
+Output format: first the answer as plain text (no JSON, no code fences), then on its own line
+""" + ANSWER_METADATA_MARKER + """ followed by ONLY valid JSON in this exact format:
+{"confidence": <float 0-1>, "citations": [{"source": "<string>", "chunk_index": <number>}], "followup_question": "<string>"}
+"""
 
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=prompt_text,
-        )
 
-        raw = (getattr(response, "text", "") or "").strip()
+class _StreamedAnswer:
+    """Splits a streamed response into answer text and the trailing metadata JSON."""
 
-        # Strip code block wrapper if present (```json ... ```)
-        if raw.startswith("```"):
-            lines = raw.split("\n")
-            # Remove first line (```json or similar) and last line (```)
-            if len(lines) > 2:
-                raw = "\n".join(lines[1:-1])
-            elif lines[0].startswith("```"):
-                raw = lines[0][3:]  # Remove leading ```
-            if raw.startswith("json"):
-                raw = raw[4:].strip()
+    def __init__(self):
+        self.answer_parts: List[str] = []
+        self.metadata_parts: List[str] = []
+        self.pending = ""
+        self.in_metadata = False
+
+    def feed(self, delta: str) -> str:
+        """Returns the part of `delta` that is safe to show as answer text."""
+        if self.in_metadata:
+            self.metadata_parts.append(delta)
+            return ""
+
+        buf = self.pending + delta
+        idx = buf.find(ANSWER_METADATA_MARKER)
+        if idx >= 0:
+            out = buf[:idx]
+            self.metadata_parts.append(buf[idx + len(ANSWER_METADATA_MARKER):])
+            self.in_metadata = True
+            self.pending = ""
+        else:
+            # Hold back a tail that could be the start of a marker split across chunks.
+            keep = 0
+            for n in range(min(len(buf), len(ANSWER_METADATA_MARKER) - 1), 0, -1):
+                if ANSWER_METADATA_MARKER.startswith(buf[-n:]):
+                    keep = n
+                    break
+            out = buf[:len(buf) - keep]
+            self.pending = buf[len(buf) - keep:]
+
+        self.answer_parts.append(out)
+        return out
+
+    def flush(self) -> str:
+        out, self.pending = self.pending, ""
+        self.answer_parts.append(out)
+        return out
+
+    def result(self, review_threshold: float) -> Dict[str, Any]:
+        answer = "".join(self.answer_parts).strip()
+        metadata = _strip_code_fence("".join(self.metadata_parts).strip())
 
         try:
-            parsed = json.loads(raw)
-            answer = parsed.get("answer", "")
+            parsed = json.loads(metadata) if metadata else {}
             try:
-                confidence = float(parsed.get("confidence", 0.0) or 0.0)
+                confidence = float(parsed.get("confidence", 0.5) or 0.0)
             except Exception:
                 confidence = 0.0
             citations = parsed.get("citations", [])
-        except json.JSONDecodeError:
-            # Fallback: assign confidence=0.5
-            answer = raw
+            followup_question = str(parsed.get("followup_question") or "").strip()
+        except (json.JSONDecodeError, AttributeError):
+            # Same fallback as the non-streaming parser
             confidence = 0.5
             citations = []
+            followup_question = ""
 
-        # Always check if review is needed based on threshold
-        needs_human_review = confidence < review_threshold
+        return _with_followup(
+            {
+                "answer": answer,
+                "confidence": confidence,
+                "citations": citations,
+                "needs_human_review": confidence < review_threshold,
+            },
+            followup_question,
+        )
 
-        result = {
-            "answer": answer,
-            "confidence": confidence,
-            "citations": citations,
-            "needs_human_review": needs_human_review,
+
+def _uses_files_api(file_obj: Dict[str, Any], mime_type: str) -> bool:
+    if "data" in file_obj or mime_type == PPTX_MIME_TYPE:
+        return False
+    size = file_obj.get("size")
+    if size is None:
+        size = os.path.getsize(file_obj["path"])
+    return size > GEMINI_INLINE_MAX_BYTES
+
+
+def _file_bytes(file_obj: Dict[str, Any]) -> bytes:
+    if "data" in file_obj:
+        return file_obj["data"]
+    with open(file_obj["path"], "rb") as fh:
+        return fh.read()
+
+
+def _upload_config(file_obj: Dict[str, Any], mime_type: str) -> Dict[str, Any]:
+    config = {"mime_type": mime_type}
+    if file_obj.get("filename"):
+        config["display_name"] = file_obj["filename"]
+    return config
+
+
+def _file_state(uploaded: Any) -> str:
+    state = getattr(uploaded, "state", None)
+    return str(getattr(state, "name", state) or "")
+
+
+def _file_extraction_contents(uploaded: Any) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "user",
+            "parts": [
+                {"file_data": {"file_uri": uploaded.uri, "mime_type": uploaded.mime_type}},
+                {"text": EXTRACTION_PROMPT},
+            ],
         }
+    ]
 
-        # If human review is needed, generate a context-aware follow-up question using LLM
-        if needs_human_review:
-            followup_question = self.generate_followup_question(question, context_chunks, answer)
-            result["followup_question"] = followup_question
 
-        return result
+def _provider_down(exc: Exception) -> bool:
+    """Rate limits and outages that survived retries: splitting the batch would not help."""
+    return isinstance(exc, ProviderUnavailableError) or is_retryable(exc)
 
-    def generate_followup_question(self, question: str, context_chunks: List[Dict[str, Any]], answer: str = "") -> str:
-        """
-        Use Gemini LLM to generate a context-aware follow-up question for the user if human review is needed.
-        """
-        if not self._ensure_client():
-            return "Can you clarify or provide more details?"
 
-        # Build context for LLM
-        context_lines = []
-        for i, ch in enumerate(context_chunks):
-            context_lines.append(
-                f"[{i}] source={ch.get('source','')}, chunk_index={ch.get('chunk_index', -1)}\n{ch.get('text','')}\n"
-            )
-        context_text = "\n\n".join(context_lines)
-
-        prompt = (
-            "You are an assistant helping a user with document Q&A. "
-            "The previous answer is the model's best guess but may be incomplete or unreliable. "
-            "Your job is to ask one natural-sounding follow-up question that helps clarify the user's original question so the next answer can be more accurate. "
-            "Base the follow-up on the mismatch between the user's question and the previous answer, and use the context chunks only as needed for grounding. "
-            "Ask exactly one question in plain language.\n"
-            f"Original question: {question}\n"
-            f"Previous answer: {answer}\n"
-            f"Context chunks:\n{context_text}"
-        )
-        contents = [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                ],
-            }
-        ]
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=contents,
-        )
-        return (getattr(response, "text", "") or "Can you clarify your question?").strip()
+def _vectors_from_response(resp: Any, expected: int) -> List[List[float]]:
+    vectors = [list(e.values) for e in resp.embeddings]
+    if len(vectors) != expected:
+        raise ValueError(f"expected {expected} embeddings, got {len(vectors)}")
+    return vectors
+
+
+def _answer_prompt(
+    question: str,
+    context_text: str,
+    system_prompt: str = ANSWER_SYSTEM_PROMPT,
+) -> str:
+    return CONTEXT_PREFIX + context_text + "\n" + system_prompt + "\nQuestion:\n" + question
+
+
+def _strip_code_fence(raw: str) -> str:
+    # Strip code block wrapper if present (```json ... ```)
+    if raw.startswith("```"):
+        lines = raw.split("\n")
+        # Remove first line (```json or similar) and last line (```)
+        if len(lines) > 2:
+            raw = "\n".join(lines[1:-1])
+        elif lines[0].startswith("```"):
+            raw = lines[0][3:]  # Remove leading ```
+        if raw.startswith("json"):
+            raw = raw[4:].strip()
+    return raw
+
+
+def _parse_answer(raw: str, review_threshold: float) -> Dict[str, Any]:
+    raw = _strip_code_fence(raw.strip())
+
+    try:
+        parsed = json.loads(raw)
+        answer = parsed.get("answer", "")
+        try:
+            confidence = float(parsed.get("confidence", 0.0) or 0.0)
+        except Exception:
+            confidence = 0.0
+        citations = parsed.get("citations", [])
+    except json.JSONDecodeError:
+        # Fallback: assign confidence=0.5
+        answer = raw
+        confidence = 0.5
+        citations = []
+
+    # Always check if review is needed based on threshold
+    needs_human_review = confidence < review_threshold
+
+    return {
+        "answer": answer,
+        "confidence": confidence,
+        "citations": citations,
+        "needs_human_review": needs_human_review,
+    }
+
+
+def _parse_structured_answer(response: Any, review_threshold: float) -> Dict[str, Any]:
+    """Result of a schema-constrained (ANSWER_MODE=single) call."""
+    parsed = getattr(response, "parsed", None)
+    raw = getattr(response, "text", "") or ""
+    if not isinstance(parsed, dict):
+        try:
+            parsed = json.loads(raw)
+        except json.JSONDecodeError:
+            # Truncated output (e.g. max tokens) is the only way to get here.
+            return _parse_answer(raw, review_threshold)
+
+    try:
+        confidence = float(parsed.get("confidence", 0.0) or 0.0)
+    except (TypeError, ValueError):
+        confidence = 0.0
+
+    return _with_followup(
+        {
+            "answer": parsed.get("answer", ""),
+            "confidence": confidence,
+            "citations": parsed.get("citations", []),
+            "needs_human_review": confidence < review_threshold,
+        },
+        str(parsed.get("followup_question") or "").strip(),
+    )
+
+
+def _with_followup(result: Dict[str, Any], followup_question: str) -> Dict[str, Any]:
+    """Attach a model-written follow-up question when the answer needs review."""
+    if result["needs_human_review"] and followup_question:
+        result["followup_question"] = followup_question
+    return result
+
+
+def _followup_contents(question: str, context_text: str, answer: str) -> List[Dict[str, Any]]:
+    prompt = (
+        CONTEXT_PREFIX
+        + context_text
+        + "\nYou are an assistant helping a user with document Q&A. "
+        "The previous answer is the model's best guess but may be incomplete or unreliable. "
+        "Ask one natural-sounding follow-up question that clarifies the user's original question so the next answer can be more accurate. "
+        "Base it on the mismatch between the question and the previous answer, using the context chunks only as needed for grounding. "
+        "Ask exactly one question in plain language.\n"
+        f"Original question: {question}\n"
+        f"Previous answer: {answer}"
+    )
+    return [
+        {
+            "role": "user",
+            "parts": [
+                {"text": prompt},
+            ],
+        }
+    ]
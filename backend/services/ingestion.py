@@ -0,0 +1,493 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from backend.services.chunking import chunker_factory
+from backend.services.metrics import CallbackMetric, span
+from backend.services.gemini_client import EMBED_BATCH_SIZE
+from backend.services.manifest import WorkspaceManifest, chunk_point_id, hash_file, hash_text
+
+INGEST_EXTRACT_CONCURRENCY = int(os.getenv("INGEST_EXTRACT_CONCURRENCY", "4"))
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+INGEST_WRITE_CONCURRENCY = int(os.getenv("INGEST_WRITE_CONCURRENCY", "2"))
+# Chunk batches buffered between stages before producers wait
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+# Estimated bytes of file data and extracted text held at once per upload
+INGEST_MEMORY_LIMIT_MB = int(os.getenv("INGEST_MEMORY_LIMIT_MB", "512"))
+
+# Chunker-provided fields copied into each point's payload
+CHUNK_METADATA_KEYS = ("section", "page", "char_start", "char_end")
+
+logger = logging.getLogger(__name__)
+
+# Returns the whole text, or an async iterator of text pieces as they are extracted
+ExtractFn = Callable[[Dict[str, Any]], Awaitable[Union[str, AsyncIterator[str]]]]
+ChunkFn = Callable[[str], List[Dict[str, Any]]]
+MemoryCostFn = Callable[[Dict[str, Any]], int]
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+WriteFn = Callable[[str, List[List[float]], List[Dict[str, Any]], List[str]], Awaitable[int]]
+DeleteFn = Callable[[str, List[str]], Awaitable[None]]
+ReindexFn = Callable[[str, Dict[str, int]], Awaitable[None]]
+
+# Embed/write queues of the runs in progress, read when metrics are scraped
+_active_queues: List[Tuple[str, asyncio.Queue]] = []
+
+
+def _queue_depths() -> Dict[Tuple[str, ...], float]:
+    depths = {("embed",): 0.0, ("write",): 0.0}
+    for name, queue in _active_queues:
+        depths[(name,)] += queue.qsize()
+    return depths
+
+
+CallbackMetric(
+    "autorag_ingest_queue_depth", "Chunk batches waiting in ingestion queues.", ("queue",), _queue_depths,
+)
+
+
+class IngestionProgress:
+    """
+    Hooks the scheduler calls as files move through the pipeline.
+    The defaults do nothing; subclasses persist or publish progress.
+    """
+
+    def cached_text(self, file_index: int) -> Optional[str]:
+        """Previously extracted text for a file, to skip extraction on resume."""
+        return None
+
+    def done_chunks(self, file_index: int) -> Set[int]:
+        """Chunk indexes of a file that are already indexed."""
+        return set()
+
+    def file_stage(self, file_index: int, stage: str) -> None:
+        pass
+
+    def file_extracted(self, file_index: int, text: str, chunks_total: int) -> None:
+        pass
+
+    def chunks_embedded(self, file_index: int, count: int) -> None:
+        pass
+
+    def chunks_indexed(self, file_index: int, chunk_indexes: List[int]) -> None:
+        pass
+
+    def file_failed(self, file_index: int, error: str) -> None:
+        pass
+
+
+class MemoryBudget:
+    """Byte-counting semaphore: reservations wait until they fit under the limit."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, amount: int):
+        # Anything larger than the whole budget runs alone instead of never.
+        amount = min(max(0, amount), self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used + amount <= self.limit)
+            self.used += amount
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.used -= amount
+                self._condition.notify_all()
+
+
+class IngestionScheduler:
+    """
+    Three-stage ingestion pipeline: extract -> embed -> write.
+
+    Files are extracted concurrently, their chunks flow through bounded queues
+    to the embedding and write stages, and every stage has its own worker limit.
+    Each payload keeps its file_index/filename/chunk_index, so ordering can be
+    reconstructed no matter which order batches finish in.
+
+    Points get deterministic ids from the chunk's content hash. With a
+    `manifest`, unchanged files are skipped before extraction, only new chunks
+    of an edited file are embedded, and its stale points are deleted once the
+    new ones are written.
+
+    A failing file is reported through `IngestionProgress.file_failed` and
+    does not stop the other files.
+
+    Extraction of each file first reserves `memory_cost(file_obj)` bytes of a
+    per-run `memory_limit`. When `extract` returns an async iterator, its text
+    is chunked with `stream_chunker` as it arrives and batches are embedded
+    before extraction finishes; `stream_chunker` must split text exactly like
+    `chunk`, which is used for text cached by a resumed job.
+    """
+
+    def __init__(
+        self,
+        extract: ExtractFn,
+        chunk: ChunkFn,
+        embed: EmbedFn,
+        write: WriteFn,
+        delete: Optional[DeleteFn] = None,
+        reindex: Optional[ReindexFn] = None,
+        manifest: Optional[WorkspaceManifest] = None,
+        extract_concurrency: int = INGEST_EXTRACT_CONCURRENCY,
+        embed_concurrency: int = INGEST_EMBED_CONCURRENCY,
+        write_concurrency: int = INGEST_WRITE_CONCURRENCY,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        batch_size: int = EMBED_BATCH_SIZE,
+        memory_cost: Optional[MemoryCostFn] = None,
+        memory_limit: int = INGEST_MEMORY_LIMIT_MB * 1024 * 1024,
+        stream_chunker: Optional[Callable[[], Any]] = None,
+    ):
+        self.extract = extract
+        self.chunk = chunk
+        self.embed = embed
+        self.write = write
+        self.delete = delete
+        self.reindex = reindex
+        self.manifest = manifest
+        self.extract_concurrency = max(1, extract_concurrency)
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.write_concurrency = max(1, write_concurrency)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.memory_cost = memory_cost or _file_size
+        self.memory_limit = memory_limit
+        self.stream_chunker = stream_chunker or chunker_factory()
+
+    async def run(
+        self,
+        workspace_id: str,
+        file_objs: List[Dict[str, Any]],
+        progress: Optional[IngestionProgress] = None,
+    ) -> Dict[str, Any]:
+        """
+        Index `file_objs` into `workspace_id`.
+        Returns: { chunks_indexed, chunks_deleted, files_unchanged,
+                   files: [{ filename, chunks, chunks_indexed, chunks_deleted, unchanged, error }] }
+        """
+        progress = progress or IngestionProgress()
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        queues = [("embed", embed_queue), ("write", write_queue)]
+        _active_queues.extend(queues)
+        extract_semaphore = asyncio.Semaphore(self.extract_concurrency)
+        memory = MemoryBudget(self.memory_limit)
+
+        files = [
+            {
+                "filename": f.get("filename"),
+                "chunks": 0,
+                "chunks_indexed": 0,
+                "chunks_deleted": 0,
+                "unchanged": False,
+                "error": None,
+                # batches still in the embed/write stages, plus one while extracting
+                "_outstanding": 1,
+                "_file_hash": None,
+                "_chunks": [],
+                "_stale": [],
+                "_moved": {},
+                "_missing": set(),
+            }
+            for f in file_objs
+        ]
+
+        def _fail(file_index: int, exc: BaseException) -> None:
+            if files[file_index]["error"] is None:
+                logger.warning("Ingestion failed for %s", files[file_index]["filename"], exc_info=exc)
+                files[file_index]["error"] = str(exc) or exc.__class__.__name__
+                progress.file_failed(file_index, files[file_index]["error"])
+
+        async def _batch_done(file_index: int) -> None:
+            state = files[file_index]
+            state["_outstanding"] -= 1
+            if state["_outstanding"] > 0 or state["error"] is not None:
+                return
+            if state["unchanged"]:
+                progress.file_stage(file_index, "unchanged")
+                return
+
+            try:
+                await self._finish_file(workspace_id, state)
+            except Exception as exc:
+                _fail(file_index, exc)
+                return
+            progress.file_stage(file_index, "indexed")
+
+        async def _extract(file_index: int, file_obj: Dict[str, Any]) -> None:
+            state = files[file_index]
+            filename = file_obj.get("filename") or ""
+            try:
+                if self.manifest is not None:
+                    state["_file_hash"] = await asyncio.to_thread(hash_file, file_obj)
+                    known_hash = self.manifest.file_hash(workspace_id, filename)
+                    state["unchanged"] = known_hash == state["_file_hash"]
+                if not state["unchanged"]:
+                    await _extract_and_chunk(file_index, file_obj, filename)
+            except Exception as exc:
+                _fail(file_index, exc)
+            await _batch_done(file_index)
+
+        async def _extract_and_chunk(file_index: int, file_obj: Dict[str, Any], filename: str) -> None:
+            state = files[file_index]
+            chunking = {
+                "next_index": 0,
+                "seen": set(),
+                "pending": [],
+                "done": progress.done_chunks(file_index),
+                "previous": self.manifest.chunks(workspace_id, filename) if self.manifest is not None else {},
+            }
+
+            cost = await asyncio.to_thread(self.memory_cost, file_obj)
+            async with memory.reserve(cost):
+                text = progress.cached_text(file_index)
+                streamed = False
+                if text is None:
+                    async with extract_semaphore:
+                        progress.file_stage(file_index, "extracting")
+                        # For streamed text this includes chunking, which overlaps extraction.
+                        with span("extract", pipeline="ingest"):
+                            extracted = await self.extract(file_obj)
+                            if isinstance(extracted, str):
+                                text = extracted
+                            else:
+                                text = await _consume_stream(file_index, filename, extracted, chunking)
+                                streamed = True
+
+                if not streamed and text:
+                    with span("chunk", pipeline="ingest"):
+                        chunks = await asyncio.to_thread(self.chunk, text)
+                    for chunk in chunks:
+                        await _accept_chunk(file_index, filename, chunk, chunking)
+
+                previous, seen = chunking["previous"], chunking["seen"]
+                state["_stale"] = [point_id for h, (point_id, _) in previous.items() if h not in seen]
+                state["chunks"] = len(state["_chunks"])
+                progress.file_extracted(file_index, text or "", state["chunks"])
+                await _enqueue(file_index, filename, chunking, final=True)
+
+        async def _consume_stream(
+            file_index: int, filename: str, pieces: AsyncIterator[str], chunking: Dict[str, Any],
+        ) -> str:
+            """Chunk streamed text as it arrives; returns the full text for the resume cache."""
+            chunker = self.stream_chunker()
+            parts: List[str] = []
+            async for piece in pieces:
+                parts.append(piece)
+                # Off the event loop: a semantic chunker makes blocking embedding calls.
+                with span("chunk", pipeline="ingest"):
+                    chunks = await asyncio.to_thread(chunker.feed, piece)
+                for chunk in chunks:
+                    await _accept_chunk(file_index, filename, chunk, chunking)
+            with span("chunk", pipeline="ingest"):
+                chunks = await asyncio.to_thread(chunker.flush)
+            for chunk in chunks:
+                await _accept_chunk(file_index, filename, chunk, chunking)
+            return "".join(parts)
+
+        async def _accept_chunk(
+            file_index: int, filename: str, chunk: Dict[str, Any], chunking: Dict[str, Any],
+        ) -> None:
+            state = files[file_index]
+            idx = chunking["next_index"]
+            chunking["next_index"] += 1
+
+            chunk_text = (chunk.get("text") or "").strip()
+            if not chunk_text:
+                return
+            chunk_hash = hash_text(chunk_text)
+            if chunk_hash in chunking["seen"]:
+                # identical chunk earlier in the same file
+                return
+            chunking["seen"].add(chunk_hash)
+
+            point_id = chunk_point_id(workspace_id, filename, chunk_hash)
+            state["_chunks"].append((idx, chunk_hash, point_id))
+            previous = chunking["previous"]
+            if chunk_hash in previous:
+                if previous[chunk_hash][1] != idx:
+                    state["_moved"][point_id] = idx
+                state["chunks_indexed"] += 1
+            elif idx in chunking["done"]:
+                state["chunks_indexed"] += 1
+            else:
+                metadata = {k: v for k, v in chunk.items() if k in CHUNK_METADATA_KEYS}
+                chunking["pending"].append((idx, chunk_text, chunk_hash, point_id, metadata))
+                await _enqueue(file_index, filename, chunking)
+
+        async def _enqueue(file_index: int, filename: str, chunking: Dict[str, Any], final: bool = False) -> None:
+            """Send full batches of pending chunks to the embed stage (and the remainder when `final`)."""
+            pending = chunking["pending"]
+            while len(pending) >= self.batch_size or (final and pending):
+                batch, chunking["pending"] = pending[:self.batch_size], pending[self.batch_size:]
+                pending = chunking["pending"]
+                if not chunking.get("embedding"):
+                    chunking["embedding"] = True
+                    progress.file_stage(file_index, "embedding")
+                files[file_index]["_outstanding"] += 1
+                await embed_queue.put(
+                    {
+                        "file_index": file_index,
+                        "filename": filename,
+                        "chunk_indexes": [c[0] for c in batch],
+                        "texts": [c[1] for c in batch],
+                        "chunk_hashes": [c[2] for c in batch],
+                        "point_ids": [c[3] for c in batch],
+                        "metadata": [c[4] for c in batch],
+                    }
+                )
+
+        async def _embed_worker() -> None:
+            while True:
+                batch = await embed_queue.get()
+                if batch is None:
+                    return
+                file_index = batch["file_index"]
+                if files[file_index]["error"] is not None:
+                    await _batch_done(file_index)
+                    continue
+                try:
+                    with span("embed", pipeline="ingest"):
+                        batch["vectors"] = await self.embed(batch["texts"])
+                except Exception as exc:
+                    _fail(file_index, exc)
+                    await _batch_done(file_index)
+                    continue
+                progress.chunks_embedded(file_index, sum(1 for v in batch["vectors"] if v))
+                await write_queue.put(batch)
+
+        async def _write_worker() -> None:
+            while True:
+                batch = await write_queue.get()
+                if batch is None:
+                    return
+                file_index = batch["file_index"]
+                if files[file_index]["error"] is not None:
+                    await _batch_done(file_index)
+                    continue
+
+                vectors: List[List[float]] = []
+                payloads: List[Dict[str, Any]] = []
+                point_ids: List[str] = []
+                written_indexes: List[int] = []
+                for idx, chunk_text, chunk_hash, point_id, metadata, vector in zip(
+                    batch["chunk_indexes"],
+                    batch["texts"],
+                    batch["chunk_hashes"],
+                    batch["point_ids"],
+                    batch["metadata"],
+                    batch["vectors"],
+                ):
+                    if not vector:
+                        files[file_index]["_missing"].add(point_id)
+                        continue
+                    vectors.append(vector)
+                    point_ids.append(point_id)
+                    written_indexes.append(idx)
+                    payloads.append(
+                        {
+                            "workspace_id": workspace_id,
+                            "filename": batch["filename"],
+                            "file_index": file_index,
+                            "chunk_index": idx,
+                            "chunk_hash": chunk_hash,
+                            "text": chunk_text,
+                            **metadata,
+                        }
+                    )
+
+                try:
+                    with span("upsert", pipeline="ingest"):
+                        written = await self.write(workspace_id, vectors, payloads, point_ids)
+                except Exception as exc:
+                    _fail(file_index, exc)
+                else:
+                    files[file_index]["chunks_indexed"] += written
+                    progress.chunks_indexed(file_index, written_indexes)
+                    if self.manifest is not None and written:
+                        self.manifest.bump_version(workspace_id)
+                await _batch_done(file_index)
+
+        embed_workers = [asyncio.create_task(_embed_worker()) for _ in range(self.embed_concurrency)]
+        write_workers = [asyncio.create_task(_write_worker()) for _ in range(self.write_concurrency)]
+        extractors = [asyncio.create_task(_extract(i, f)) for i, f in enumerate(file_objs)]
+
+        try:
+            await _drain(extractors, embed_workers + write_workers)
+            for _ in embed_workers:
+                await embed_queue.put(None)
+            await _drain(embed_workers, write_workers)
+            for _ in write_workers:
+                await write_queue.put(None)
+            await _drain(write_workers)
+        except BaseException:
+            for task in extractors + embed_workers + write_workers:
+                task.cancel()
+            await asyncio.gather(*extractors, *embed_workers, *write_workers, return_exceptions=True)
+            raise
+        finally:
+            for entry in queues:
+                _active_queues.remove(entry)
+
+        for state in files:
+            for key in [k for k in state if k.startswith("_")]:
+                del state[key]
+
+        return {
+            "chunks_indexed": sum(f["chunks_indexed"] for f in files),
+            "chunks_deleted": sum(f["chunks_deleted"] for f in files),
+            "files_unchanged": sum(1 for f in files if f["unchanged"]),
+            "files": files,
+        }
+
+    async def _finish_file(self, workspace_id: str, state: Dict[str, Any]) -> None:
+        """Once all of a file's new chunks are written, fix up retained chunks and drop stale ones."""
+        if self.manifest is None:
+            return
+
+        if state["_moved"] and self.reindex is not None:
+            await self.reindex(workspace_id, state["_moved"])
+        if state["_stale"] and self.delete is not None:
+            await self.delete(workspace_id, state["_stale"])
+            state["chunks_deleted"] = len(state["_stale"])
+        if state["_moved"] or state["_stale"]:
+            self.manifest.bump_version(workspace_id)
+
+        # Chunks that could not be embedded are left out, and the file hash is
+        # not recorded, so the next upload of this file retries them.
+        await asyncio.to_thread(
+            self.manifest.replace_file,
+            workspace_id,
+            state["filename"],
+            "" if state["_missing"] else state["_file_hash"],
+            [c for c in state["_chunks"] if c[2] not in state["_missing"]],
+        )
+
+
+def _file_size(file_obj: Dict[str, Any]) -> int:
+    if "data" in file_obj:
+        return len(file_obj["data"])
+    return file_obj.get("size") or 0
+
+
+async def _drain(tasks: List[asyncio.Task], watched: Optional[List[asyncio.Task]] = None) -> None:
+    """
+    Wait for `tasks` to finish, failing fast if any of them or any downstream
+    `watched` worker raises (otherwise producers could block on a full queue forever).
+    """
+    pending = set(tasks)
+    watched = set(watched or [])
+    while pending:
+        done, _ = await asyncio.wait(pending | watched, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+            if task in watched:
+                # A downstream worker only returns early after a sentinel, which
+                # cannot have been sent yet; treat it as a failure.
+                raise RuntimeError("ingestion worker exited unexpectedly")
+        pending -= done
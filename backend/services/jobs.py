@@ -0,0 +1,404 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from uuid import uuid4
+
+from backend.services.ingestion import IngestionProgress, IngestionScheduler
+from backend.services.metrics import detach_request_timings
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "data/jobs.db")
+JOBS_DIR = os.getenv("JOBS_DIR", "data/jobs")
+# Upload jobs processed at the same time by this worker
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+# Finished jobs are deleted from the store this long after they end (0 keeps them forever)
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", "604800"))
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Files whose extracted text is no longer needed to resume them
+_FILE_DONE_STAGES = ("indexed", "unchanged", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    workspace_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    file_index INTEGER NOT NULL,
+    filename TEXT,
+    content_type TEXT,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    stage TEXT NOT NULL DEFAULT 'queued',
+    chunks_total INTEGER NOT NULL DEFAULT 0,
+    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+    chunks_indexed INTEGER NOT NULL DEFAULT 0,
+    extracted_text TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, file_index)
+);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    file_index INTEGER NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    PRIMARY KEY (job_id, file_index, chunk_index)
+);
+"""
+
+
+class JobStore:
+    """SQLite-backed job state, so progress and resume points survive restarts."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def create_job(self, job_id: str, workspace_id: str, files: List[Dict[str, Any]]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, workspace_id, status, created_at) VALUES (?, ?, 'queued', ?)",
+                (job_id, workspace_id, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, file_index, filename, content_type, path, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, i, f.get("filename"), f.get("content_type"), f["path"], f.get("size", 0))
+                    for i, f in enumerate(files)
+                ],
+            )
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            if status == "running":
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (status, now, job_id),
+                )
+            elif status in ACTIVE_STATUSES:
+                self._conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (status, job_id))
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (status, error, now, job_id),
+                )
+                # Extracted text only serves resuming; a finished job will not resume.
+                self._conn.execute("UPDATE job_files SET extracted_text = NULL WHERE job_id = ?", (job_id,))
+
+    def update_file(self, job_id: str, file_index: int, **fields: Any) -> None:
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE job_files SET {columns} WHERE job_id = ? AND file_index = ?",
+                (*fields.values(), job_id, file_index),
+            )
+
+    def add_embedded(self, job_id: str, file_index: int, count: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET chunks_embedded = chunks_embedded + ? WHERE job_id = ? AND file_index = ?",
+                (count, job_id, file_index),
+            )
+
+    def add_indexed(self, job_id: str, file_index: int, chunk_indexes: List[int]) -> None:
+        with self._lock, self._conn:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO job_chunks (job_id, file_index, chunk_index) VALUES (?, ?, ?)",
+                [(job_id, file_index, idx) for idx in chunk_indexes],
+            )
+            self._conn.execute(
+                "UPDATE job_files SET chunks_indexed = chunks_indexed + ? WHERE job_id = ? AND file_index = ?",
+                (cur.rowcount, job_id, file_index),
+            )
+
+    def indexed_chunks(self, job_id: str, file_index: int) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_index FROM job_chunks WHERE job_id = ? AND file_index = ?",
+                (job_id, file_index),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def extracted_text(self, job_id: str, file_index: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT extracted_text FROM job_files WHERE job_id = ? AND file_index = ?",
+                (job_id, file_index),
+            ).fetchone()
+        return row[0] if row else None
+
+    def files(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_index, filename, content_type, path, size, stage, chunks_total, "
+                "chunks_embedded, chunks_indexed, error FROM job_files WHERE job_id = ? ORDER BY file_index",
+                (job_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+    def delete_finished(self, finished_before: float) -> List[str]:
+        """Delete jobs that finished before the given time, with their files and chunks; returns their ids."""
+        with self._lock, self._conn:
+            job_ids = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,),
+                )
+            ]
+            for table, column in (("job_chunks", "job_id"), ("job_files", "job_id"), ("jobs", "id")):
+                self._conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(job_id,) for job_id in job_ids])
+        return job_ids
+
+    def active_job_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES,
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class _JobProgress(IngestionProgress):
+    def __init__(self, manager: "JobManager", job_id: str):
+        self.manager = manager
+        self.store = manager.store
+        self.job_id = job_id
+
+    def cached_text(self, file_index: int) -> Optional[str]:
+        return self.store.extracted_text(self.job_id, file_index)
+
+    def done_chunks(self, file_index: int) -> Set[int]:
+        return self.store.indexed_chunks(self.job_id, file_index)
+
+    def file_stage(self, file_index: int, stage: str) -> None:
+        if stage in _FILE_DONE_STAGES:
+            self.store.update_file(self.job_id, file_index, stage=stage, extracted_text=None)
+        else:
+            self.store.update_file(self.job_id, file_index, stage=stage)
+        self.manager.notify(self.job_id)
+
+    def file_extracted(self, file_index: int, text: str, chunks_total: int) -> None:
+        self.store.update_file(self.job_id, file_index, extracted_text=text, chunks_total=chunks_total)
+        self.manager.notify(self.job_id)
+
+    def chunks_embedded(self, file_index: int, count: int) -> None:
+        self.store.add_embedded(self.job_id, file_index, count)
+        self.manager.notify(self.job_id)
+
+    def chunks_indexed(self, file_index: int, chunk_indexes: List[int]) -> None:
+        self.store.add_indexed(self.job_id, file_index, chunk_indexes)
+        self.manager.notify(self.job_id)
+
+    def file_failed(self, file_index: int, error: str) -> None:
+        self.store.update_file(self.job_id, file_index, stage="failed", error=error, extracted_text=None)
+        self.manager.notify(self.job_id)
+
+
+class JobManager:
+    """
+    Runs upload jobs in the background of this process.
+
+    Uploaded files are spooled to JOBS_DIR and job/file/chunk progress is kept
+    in the JobStore; on startup unfinished jobs are resumed, skipping files and
+    chunks that were already indexed.
+    """
+
+    def __init__(
+        self,
+        scheduler: IngestionScheduler,
+        store: Optional[JobStore] = None,
+        jobs_dir: str = JOBS_DIR,
+        concurrency: int = JOB_CONCURRENCY,
+        retention: float = JOBS_RETENTION_SECONDS,
+    ):
+        self.scheduler = scheduler
+        self.store = store or JobStore()
+        self.jobs_dir = jobs_dir
+        self.retention = retention
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # One event per watcher, so each /events stream is woken independently
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def new_job_id(self) -> str:
+        return uuid4().hex
+
+    def create(self, job_id: str, workspace_id: str, files: List[Dict[str, Any]]) -> None:
+        """Register a job whose files were spooled to `job_dir(job_id)` and start it."""
+        self.store.create_job(job_id, workspace_id, files)
+        self.submit(job_id)
+
+    def submit(self, job_id: str) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+
+    def active_count(self) -> int:
+        """Jobs running or waiting for a slot."""
+        return len(self._tasks)
+
+    def prune(self) -> List[str]:
+        """Delete jobs finished more than `retention` seconds ago, and any spool directories they left."""
+        if self.retention <= 0:
+            return []
+        job_ids = self.store.delete_finished(time.time() - self.retention)
+        for job_id in job_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if job_ids:
+            logger.info("Deleted %d finished ingestion jobs", len(job_ids))
+        return job_ids
+
+    def resume_pending(self) -> List[str]:
+        self.prune()
+        job_ids = self.store.active_job_ids()
+        for job_id in job_ids:
+            logger.info("Resuming ingestion job %s", job_id)
+            self.submit(job_id)
+        return job_ids
+
+    async def shutdown(self) -> None:
+        # Jobs stay "running" in the store and are resumed on next startup.
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self, job_id: str) -> None:
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get_job(job_id)
+        if job is None:
+            return None
+
+        files = self.store.files(job_id)
+        chunks_indexed = sum(f["chunks_indexed"] for f in files)
+        started_at = job.get("started_at")
+        elapsed = ((job.get("finished_at") or time.time()) - started_at) if started_at else 0.0
+
+        return {
+            "job_id": job["id"],
+            "workspace_id": job["workspace_id"],
+            "status": job["status"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": started_at,
+            "finished_at": job["finished_at"],
+            "chunks_total": sum(f["chunks_total"] for f in files),
+            "chunks_embedded": sum(f["chunks_embedded"] for f in files),
+            "chunks_indexed": chunks_indexed,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(chunks_indexed / elapsed, 3) if elapsed > 0 else 0.0,
+            "files": [
+                {
+                    "filename": f["filename"],
+                    "size": f["size"],
+                    "stage": f["stage"],
+                    "chunks_total": f["chunks_total"],
+                    "chunks_embedded": f["chunks_embedded"],
+                    "chunks_indexed": f["chunks_indexed"],
+                    "error": f["error"],
+                }
+                for f in files
+            ],
+        }
+
+    async def watch(self, job_id: str, poll_interval: float = 2.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a snapshot whenever the job changes, ending after a terminal status.
+        Polls too, so jobs running in another worker process are still followed.
+        """
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        last = None
+        try:
+            while True:
+                event.clear()
+                snapshot = self.snapshot(job_id)
+                if snapshot is None:
+                    return
+                encoded = json.dumps(snapshot, sort_keys=True, default=str)
+                if encoded != last:
+                    last = encoded
+                    yield snapshot
+                if snapshot["status"] not in ACTIVE_STATUSES:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(event)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def _run(self, job_id: str) -> None:
+        detach_request_timings()
+        job = self.store.get_job(job_id)
+        if job is None:
+            return
+
+        async with self._semaphore:
+            self.store.set_status(job_id, "running")
+            self.notify(job_id)
+
+            # Files and chunks finished by an earlier run are skipped via _JobProgress.
+            file_objs = [
+                {"filename": f["filename"], "content_type": f["content_type"], "path": f["path"]}
+                for f in self.store.files(job_id)
+            ]
+
+            try:
+                result = await self.scheduler.run(
+                    job["workspace_id"], file_objs, progress=_JobProgress(self, job_id),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Ingestion job %s failed", job_id)
+                self.store.set_status(job_id, "failed", error=str(exc))
+            else:
+                errors = [f for f in result["files"] if f["error"]]
+                if errors and len(errors) == len(result["files"]):
+                    self.store.set_status(job_id, "failed", error="All files failed to ingest")
+                else:
+                    self.store.set_status(job_id, "completed")
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            self.notify(job_id)
+            self.prune()
@@ -0,0 +1,224 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+KEYWORD_DB_PATH = os.getenv("KEYWORD_DB_PATH", "data/keywords.db")
+# Query terms found in more than this fraction of a workspace's chunks are ignored
+KEYWORD_MAX_DF = float(os.getenv("KEYWORD_MAX_DF", "0.25"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Rebuild postings once tombstoned chunks outnumber live ones (and there are at least this many)
+_COMPACT_MIN_DEAD = 10000
+# Keep SQLite IN (...) lists under the host-parameter limit
+_SQL_BATCH = 500
+
+# Words, plus identifiers joined by - _ . / : such as "ERR-404" or "policy_2023.1"
+_TOKEN_RE = re.compile(r"\w+(?:[-./:]\w+)*")
+_SPLIT_RE = re.compile(r"[-_./:]")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this "
+    "to was were will with what which who how when where why do does did can".split()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_docs (
+    workspace_id TEXT NOT NULL,
+    point_id TEXT NOT NULL,
+    terms TEXT NOT NULL,
+    PRIMARY KEY (workspace_id, point_id)
+);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms without stopwords. Compound identifiers are kept whole
+    and also split into their parts, so "ERR-404" matches "err 404" too.
+    """
+    terms: List[str] = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if token.isalnum():
+            continue
+        parts = [p for p in _SPLIT_RE.split(token) if p and p not in _STOPWORDS]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class KeywordIndex:
+    """
+    Per-workspace BM25 inverted index over chunk text, keyed by vector point id.
+
+    Documents are stored in SQLite and loaded into memory on a workspace's
+    first use. Postings are compact int arrays scored with NumPy, so a query
+    costs time proportional to the postings of its (non-stopword) terms.
+    """
+
+    def __init__(self, path: str = KEYWORD_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._workspaces: Dict[str, _Postings] = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def add(self, workspace_id: str, point_ids: List[str], texts: List[str]) -> None:
+        """Index (or re-index) chunk texts under their point ids."""
+        docs = [(point_id, Counter(tokenize(text))) for point_id, text in zip(point_ids, texts)]
+        with self._lock:
+            postings = self._load(workspace_id)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO keyword_docs (workspace_id, point_id, terms) VALUES (?, ?, ?)",
+                    [(workspace_id, point_id, json.dumps(terms)) for point_id, terms in docs],
+                )
+            for point_id, terms in docs:
+                postings.add(point_id, terms)
+
+    def remove(self, workspace_id: str, point_ids: List[str]) -> None:
+        with self._lock:
+            postings = self._load(workspace_id)
+            with self._conn:
+                for start in range(0, len(point_ids), _SQL_BATCH):
+                    batch = list(point_ids[start:start + _SQL_BATCH])
+                    marks = ",".join("?" * len(batch))
+                    self._conn.execute(
+                        f"DELETE FROM keyword_docs WHERE workspace_id = ? AND point_id IN ({marks})",
+                        [workspace_id, *batch],
+                    )
+            for point_id in point_ids:
+                postings.remove(point_id)
+
+    def search(self, workspace_id: str, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Top `(point_id, bm25_score)` pairs for the query, best first."""
+        terms = tokenize(query)
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            return self._load(workspace_id).search(terms, limit)
+
+    def _load(self, workspace_id: str) -> "_Postings":
+        postings = self._workspaces.get(workspace_id)
+        if postings is None:
+            postings = _Postings()
+            rows = self._conn.execute(
+                "SELECT point_id, terms FROM keyword_docs WHERE workspace_id = ?", (workspace_id,),
+            )
+            for point_id, terms in rows:
+                postings.add(point_id, json.loads(terms))
+            self._workspaces[workspace_id] = postings
+        return postings
+
+
+class _Postings:
+    """In-memory postings for one workspace. Removed documents are tombstoned until compaction."""
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.slot_ids: List[Optional[str]] = []
+        self.lengths = array("i")
+        self.terms: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+
+    def add(self, point_id: str, terms: Dict[str, int]) -> None:
+        if point_id in self.slots:
+            self.remove(point_id)
+        slot = len(self.slot_ids)
+        self.slots[point_id] = slot
+        self.slot_ids.append(point_id)
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, tf in terms.items():
+            entry = self.terms.get(term)
+            if entry is None:
+                entry = self.terms[term] = (array("i"), array("i"))
+            entry[0].append(slot)
+            entry[1].append(tf)
+
+    def remove(self, point_id: str) -> None:
+        slot = self.slots.pop(point_id, None)
+        if slot is None:
+            return
+        self.slot_ids[slot] = None
+        self.total_length -= self.lengths[slot]
+        self.lengths[slot] = -1
+        dead = len(self.slot_ids) - len(self.slots)
+        if dead >= _COMPACT_MIN_DEAD and dead > len(self.slots):
+            self._compact()
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[str, float]]:
+        n_docs = len(self.slots)
+        if not n_docs:
+            return []
+        lengths = np.frombuffer(self.lengths, dtype=np.int32) if len(self.lengths) else np.zeros(0, np.int32)
+        alive = lengths >= 0
+        avg_length = max(self.total_length / n_docs, 1.0)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        dead = len(self.slot_ids) - n_docs
+        max_df = KEYWORD_MAX_DF * n_docs if n_docs >= 20 else n_docs
+
+        for term, query_tf in Counter(terms).items():
+            entry = self.terms.get(term)
+            # Even if every tombstone were in this list it would be too common to matter.
+            if entry is None or len(entry[0]) - dead > max_df:
+                continue
+            slots = np.frombuffer(entry[0], dtype=np.int32)
+            tfs = np.frombuffer(entry[1], dtype=np.int32)
+            live = alive[slots]
+            slots, tfs = slots[live], tfs[live].astype(np.float32)
+            df = len(slots)
+            if not df or df > max_df:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[slots] / avg_length)
+            scores[slots] += query_tf * idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(limit, len(matched))
+        # Keep every chunk tied with the k-th score, then break ties by slot (indexing order)
+        # so equal-scoring chunks come back in the same order on every query.
+        kth = -np.partition(-scores[matched], k - 1)[k - 1]
+        top = matched[scores[matched] >= kth]
+        top = top[np.lexsort((top, -scores[top]))][:k]
+        return [(self.slot_ids[slot], float(scores[slot])) for slot in top]
+
+    def _compact(self) -> None:
+        remap = np.full(len(self.slot_ids), -1, dtype=np.int32)
+        live_slots = [slot for slot, point_id in enumerate(self.slot_ids) if point_id is not None]
+        remap[live_slots] = np.arange(len(live_slots), dtype=np.int32)
+
+        for term in list(self.terms):
+            slots_arr, tfs_arr = self.terms[term]
+            slots = np.frombuffer(slots_arr, dtype=np.int32)
+            new_slots = remap[slots]
+            keep = new_slots >= 0
+            if not keep.any():
+                del self.terms[term]
+                continue
+            self.terms[term] = (
+                array("i", new_slots[keep].tobytes()),
+                array("i", np.frombuffer(tfs_arr, dtype=np.int32)[keep].tobytes()),
+            )
+
+        self.slot_ids = [self.slot_ids[slot] for slot in live_slots]
+        self.slots = {point_id: slot for slot, point_id in enumerate(self.slot_ids)}
+        self.lengths = array("i", [self.lengths[slot] for slot in live_slots])
@@ -0,0 +1,414 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.vector_codec import (
+    VECTOR_DIMENSIONS,
+    VECTOR_QUANTIZATION,
+    VECTOR_RESCORE,
+    candidate_count,
+    quantizer,
+    truncate,
+)
+from backend.services.vector_store import VectorStore
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "data/vectors")
+# Workspaces with more live vectors than this are searched through an IVF index
+LOCAL_ANN_THRESHOLD = int(os.getenv("LOCAL_ANN_THRESHOLD", "50000"))
+# Inverted lists probed per IVF query; higher is slower but more accurate
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+
+_INITIAL_CAPACITY = 1024
+_KMEANS_SAMPLE = 20000
+_KMEANS_ITERATIONS = 10
+_ASSIGN_BLOCK = 8192
+# Rewrite the matrix once more than this fraction of rows are deleted
+_COMPACT_RATIO = 0.5
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded vector store: one directory per workspace under LOCAL_VECTOR_DIR
+    holding a memory-mapped float32 matrix of unit vectors and a SQLite table
+    of point ids and payloads.
+
+    Small workspaces are searched exactly with one matrix-vector product;
+    past LOCAL_ANN_THRESHOLD live vectors an IVF index (k-means inverted
+    lists) narrows the scan to the LOCAL_IVF_NPROBE closest lists.
+
+    With VECTOR_QUANTIZATION, the scan reads a second, int8 or binary,
+    memory-mapped code matrix instead, and only the top
+    `limit * VECTOR_OVERSAMPLING` candidates are rescored with the float
+    vectors. New workspaces store VECTOR_DIMENSIONS dimensions.
+    """
+
+    def __init__(self, root: str = LOCAL_VECTOR_DIR):
+        self.root = root
+        self._workspaces: Dict[str, _WorkspaceIndex] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, workspace_id, vectors, payloads, point_ids=None):
+        if len(vectors) != len(payloads):
+            raise ValueError("vectors and payloads must have the same length")
+        if not vectors:
+            return 0
+        if point_ids is None:
+            from uuid import uuid4
+            point_ids = [str(uuid4()) for _ in vectors]
+
+        payloads = [{**payload, "workspace_id": workspace_id} for payload in payloads]
+        return self._workspace(workspace_id).upsert(vectors, payloads, point_ids)
+
+    def delete(self, workspace_id, point_ids):
+        if point_ids:
+            self._workspace(workspace_id).delete(point_ids)
+
+    def set_chunk_indexes(self, workspace_id, chunk_indexes):
+        if chunk_indexes:
+            self._workspace(workspace_id).set_chunk_indexes(chunk_indexes)
+
+    def search(self, workspace_id, query_vector, limit=5):
+        return self._workspace(workspace_id).search(query_vector, limit)
+
+    def search_batch(self, workspace_id, query_vectors, limit=5):
+        return self._workspace(workspace_id).search_batch(query_vectors, limit)
+
+    def get(self, workspace_id, point_ids):
+        if not point_ids:
+            return []
+        return self._workspace(workspace_id).get(point_ids)
+
+    def _workspace(self, workspace_id: str) -> "_WorkspaceIndex":
+        with self._lock:
+            index = self._workspaces.get(workspace_id)
+            if index is None:
+                index = _WorkspaceIndex(os.path.join(self.root, _workspace_dirname(workspace_id)))
+                self._workspaces[workspace_id] = index
+            return index
+
+
+def _workspace_dirname(workspace_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", workspace_id)[:64]
+    return f"{safe}-{hashlib.sha256(workspace_id.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _top(candidates: np.ndarray, scores: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+    k = min(limit, len(candidates))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(candidates[i]), float(scores[i])) for i in top]
+
+
+def _open_memmap(path: str, dtype: np.dtype, shape: Any) -> np.memmap:
+    """Memory-map a (capacity, width) matrix file, growing the file to fit."""
+    size = shape[0] * shape[1] * dtype.itemsize
+    with open(path, "ab") as fh:
+        if fh.tell() < size:
+            fh.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+def _normalize_rows(arr: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+class _WorkspaceIndex:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(os.path.join(path, "points.db"), check_same_thread=False)
+        with self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS points ("
+                "row INTEGER PRIMARY KEY, point_id TEXT UNIQUE NOT NULL, payload TEXT NOT NULL)"
+            )
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+
+        self.rows: Dict[str, int] = {}
+        for point_row, point_id in self.db.execute("SELECT row, point_id FROM points"):
+            self.rows[point_id] = point_row
+        self.count = max(self.rows.values()) + 1 if self.rows else 0
+
+        self.matrix: Optional[np.memmap] = None
+        self.codes: Optional[np.memmap] = None
+        self.quantizer = quantizer(VECTOR_QUANTIZATION, self.dim) if self.dim is not None else None
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_ids: List[Optional[str]] = [None] * self.count
+        for point_id, point_row in self.rows.items():
+            self.row_ids[point_row] = point_id
+        if self.dim is not None:
+            self._open_matrix(max(_INITIAL_CAPACITY, self.count))
+            self.alive[[r for r in self.rows.values()]] = True
+            self._check_codes()
+
+        self.ivf: Optional[_IVFIndex] = None
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def codes_path(self) -> str:
+        return os.path.join(self.path, f"codes.{self.quantizer.kind}")
+
+    def _open_matrix(self, capacity: int) -> None:
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        self.matrix = _open_memmap(self.vectors_path, np.dtype(np.float32), (capacity, self.dim))
+        if self.quantizer is not None:
+            if self.codes is not None:
+                self.codes.flush()
+                self.codes = None
+            self.codes = _open_memmap(self.codes_path, self.quantizer.dtype, (capacity, self.quantizer.code_width))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive[:capacity]
+        self.alive = alive
+
+    def _check_codes(self) -> None:
+        """(Re)build the code matrix when quantization was enabled or changed since it was written."""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'quantization'").fetchone()
+        kind = self.quantizer.kind if self.quantizer is not None else "none"
+        if (row[0] if row else "none") == kind:
+            return
+        if self.quantizer is not None:
+            for start in range(0, self.count, _ASSIGN_BLOCK):
+                end = min(start + _ASSIGN_BLOCK, self.count)
+                self.codes[start:end] = self.quantizer.encode(self.matrix[start:end])
+            self.codes.flush()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('quantization', ?)", (kind,))
+
+    def upsert(self, vectors: List[List[float]], payloads: List[Dict[str, Any]], point_ids: List[str]) -> int:
+        with self.lock:
+            # Workspaces keep the dimension count they were created with.
+            arr = truncate(vectors, self.dim if self.dim is not None else VECTOR_DIMENSIONS)
+            if self.dim is None:
+                self.dim = int(arr.shape[1])
+                self.quantizer = quantizer(VECTOR_QUANTIZATION, self.dim)
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._open_matrix(_INITIAL_CAPACITY)
+                self._check_codes()
+            elif arr.shape[1] != self.dim:
+                raise ValueError(f"expected vectors of size {self.dim}, got {arr.shape[1]}")
+
+            rows: List[int] = []
+            for point_id in point_ids:
+                point_row = self.rows.get(point_id)
+                if point_row is None:
+                    point_row = self.count
+                    self.count += 1
+                    self.rows[point_id] = point_row
+                    self.row_ids.append(point_id)
+                rows.append(point_row)
+
+            if self.count > self.matrix.shape[0]:
+                capacity = self.matrix.shape[0]
+                while capacity < self.count:
+                    capacity *= 2
+                self._open_matrix(capacity)
+
+            self.matrix[rows] = arr
+            self.matrix.flush()
+            if self.quantizer is not None:
+                self.codes[rows] = self.quantizer.encode(arr)
+                self.codes.flush()
+            self.alive[rows] = True
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO points (row, point_id, payload) VALUES (?, ?, ?)",
+                    [(r, pid, json.dumps(p)) for r, pid, p in zip(rows, point_ids, payloads)],
+                )
+            if self.ivf is not None:
+                self.ivf.add(np.asarray(rows), arr)
+        return len(rows)
+
+    def delete(self, point_ids: List[str]) -> None:
+        with self.lock:
+            rows = [self.rows.pop(pid) for pid in point_ids if pid in self.rows]
+            if not rows:
+                return
+            self.alive[rows] = False
+            for r in rows:
+                self.row_ids[r] = None
+            with self.db:
+                self.db.executemany("DELETE FROM points WHERE row = ?", [(r,) for r in rows])
+            if self.count - len(self.rows) > self.count * _COMPACT_RATIO:
+                self._compact()
+
+    def set_chunk_indexes(self, chunk_indexes: Dict[str, int]) -> None:
+        with self.lock, self.db:
+            self.db.executemany(
+                "UPDATE points SET payload = json_set(payload, '$.chunk_index', ?) WHERE point_id = ?",
+                [(idx, pid) for pid, idx in chunk_indexes.items()],
+            )
+
+    def get(self, point_ids: List[str]) -> List[Dict[str, Any]]:
+        marks = ",".join("?" * len(point_ids))
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT point_id, payload FROM points WHERE point_id IN ({marks})", list(point_ids),
+            ).fetchall()
+        return [{**json.loads(payload), "point_id": point_id} for point_id, payload in rows]
+
+    def search(self, query_vector: List[float], limit: int) -> List[Dict[str, Any]]:
+        return self.search_batch([query_vector], limit)[0]
+
+    def search_batch(self, query_vectors: List[List[float]], limit: int) -> List[List[Dict[str, Any]]]:
+        """
+        Queries sharing a candidate set (every exact-scan query) are scored
+        in one matrix product, so the matrix is read once per batch.
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_vectors]
+        if not query_vectors or limit <= 0:
+            return results
+        queries = np.asarray(query_vectors, dtype=np.float32)
+
+        with self.lock:
+            if self.matrix is None or not self.rows:
+                return results
+            if queries.shape[1] < self.dim:
+                raise ValueError(f"expected a query vector of size {self.dim}, got {queries.shape[1]}")
+            queries = truncate(queries, self.dim)
+            live = np.flatnonzero(queries.any(axis=1))
+
+            if len(self.rows) > LOCAL_ANN_THRESHOLD:
+                if self.ivf is None or len(self.rows) > 2 * self.ivf.trained_on:
+                    self._build_ivf()
+                groups = []
+                for i in live:
+                    candidates = self.ivf.candidates(queries[i], LOCAL_IVF_NPROBE)
+                    groups.append((candidates[self.alive[candidates]], [i]))
+            else:
+                groups = [(np.flatnonzero(self.alive[:self.count]), list(live))]
+
+            ranked: Dict[int, List[Tuple[int, float]]] = {}
+            for candidates, members in groups:
+                if len(candidates) and members:
+                    ranked.update(zip(members, self._rank(candidates, queries[members], limit)))
+
+            rows = sorted({r for hits in ranked.values() for r, _ in hits})
+            if not rows:
+                return results
+            marks = ",".join("?" * len(rows))
+            payloads = dict(
+                self.db.execute(f"SELECT row, payload FROM points WHERE row IN ({marks})", rows).fetchall()
+            )
+
+        for i, hits in ranked.items():
+            results[i] = [
+                {**json.loads(payloads[r]), "point_id": self.row_ids[r], "score": score}
+                for r, score in hits
+                if r in payloads
+            ]
+        return results
+
+    def _rank(self, candidates: np.ndarray, queries: np.ndarray, limit: int) -> List[List[Tuple[int, float]]]:
+        """Top `limit` (row, score) pairs among `candidates` for each query."""
+        if self.quantizer is None:
+            scores = queries @ self.matrix[candidates].T
+            return [_top(candidates, row, limit) for row in scores]
+
+        codes = self.codes[candidates]
+        ranked = []
+        for query in queries:
+            shortlist = candidates
+            scores = self.quantizer.scores(codes, query)
+            if VECTOR_RESCORE:
+                n = candidate_count(limit)
+                if n < len(candidates):
+                    # np.sort keeps the float reads in file order.
+                    shortlist = np.sort(candidates[np.argpartition(-scores, n - 1)[:n]])
+                scores = self.matrix[shortlist] @ query
+            ranked.append(_top(shortlist, scores, limit))
+        return ranked
+
+    def _build_ivf(self) -> None:
+        rows = np.flatnonzero(self.alive[:self.count])
+        self.ivf = _IVFIndex(self.matrix, rows)
+
+    def _compact(self) -> None:
+        """Rewrite the matrix and row numbers without deleted rows."""
+        live = sorted(self.rows.items(), key=lambda item: item[1])
+        old_rows = np.asarray([r for _, r in live], dtype=np.int64)
+        kept = np.array(self.matrix[old_rows]) if len(old_rows) else np.zeros((0, self.dim), dtype=np.float32)
+
+        self.matrix.flush()
+        self.matrix = None
+        os.remove(self.vectors_path)
+        if self.codes is not None:
+            self.codes = None
+            os.remove(self.codes_path)
+        self.alive = np.zeros(0, dtype=bool)
+        self._open_matrix(max(_INITIAL_CAPACITY, len(live)))
+        if len(live):
+            self.matrix[:len(live)] = kept
+            self.matrix.flush()
+            if self.quantizer is not None:
+                self.codes[:len(live)] = self.quantizer.encode(kept)
+                self.codes.flush()
+            self.alive[:len(live)] = True
+
+        with self.db:
+            # Shift rows out of the way first so renumbering never hits the primary key.
+            self.db.execute("UPDATE points SET row = -row - 1")
+            self.db.executemany(
+                "UPDATE points SET row = ? WHERE point_id = ?",
+                [(new_row, pid) for new_row, (pid, _) in enumerate(live)],
+            )
+
+        self.rows = {pid: new_row for new_row, (pid, _) in enumerate(live)}
+        self.row_ids = [pid for pid, _ in live]
+        self.count = len(live)
+        self.ivf = None
+
+
+class _IVFIndex:
+    """Inverted-file index: k-means centroids over unit vectors, one row list per centroid."""
+
+    def __init__(self, matrix: np.ndarray, rows: np.ndarray):
+        self.trained_on = len(rows)
+        nlist = max(1, min(4096, int(np.sqrt(len(rows)))))
+
+        rng = np.random.default_rng(0)
+        sample = rows if len(rows) <= _KMEANS_SAMPLE else rng.choice(rows, _KMEANS_SAMPLE, replace=False)
+        data = np.asarray(matrix[np.sort(sample)])
+        centroids = data[rng.choice(len(data), min(nlist, len(data)), replace=False)]
+        for _ in range(_KMEANS_ITERATIONS):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            empty = np.bincount(assign, minlength=len(centroids)) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize_rows(sums)
+        self.centroids = centroids
+
+        self.lists: List[List[int]] = [[] for _ in range(len(centroids))]
+        for start in range(0, len(rows), _ASSIGN_BLOCK):
+            block = rows[start:start + _ASSIGN_BLOCK]
+            self.add(block, np.asarray(matrix[block]))
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for r, c in zip(rows.tolist(), assign.tolist()):
+            self.lists[c].append(r)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(max(1, nprobe), len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        # Re-upserted rows may be listed twice; unique() also sorts for memmap-friendly reads.
+        return np.unique(np.concatenate([np.asarray(self.lists[c], dtype=np.int64) for c in probe]))
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import NAMESPACE_URL, uuid5
+
+MANIFEST_DB_PATH = os.getenv("MANIFEST_DB_PATH", "data/manifest.db")
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Namespace for deterministic Qdrant point ids
+POINT_NAMESPACE = uuid5(NAMESPACE_URL, "autorag-os/chunks")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest_files (
+    workspace_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (workspace_id, filename)
+);
+CREATE TABLE IF NOT EXISTS workspace_versions (
+    workspace_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS manifest_chunks (
+    workspace_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    point_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    PRIMARY KEY (workspace_id, filename, chunk_hash)
+);
+"""
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_obj: Dict[str, Any]) -> str:
+    """sha256 of an uploaded file, read from `data` or streamed from `path`."""
+    if "data" in file_obj:
+        return hashlib.sha256(file_obj["data"]).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(file_obj["path"], "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_point_id(workspace_id: str, filename: str, chunk_hash: str) -> str:
+    """
+    Stable point id for a chunk, so re-indexing overwrites instead of duplicating.
+    The filename is part of the key so deleting one file's stale chunks never
+    removes a point another file still uses.
+    """
+    return str(uuid5(POINT_NAMESPACE, f"{workspace_id}\0{filename}\0{chunk_hash}"))
+
+
+class WorkspaceManifest:
+    """Per-workspace record of indexed files and the chunks (by content hash) each one produced."""
+
+    def __init__(self, path: str = MANIFEST_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def file_hash(self, workspace_id: str, filename: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM manifest_files WHERE workspace_id = ? AND filename = ?",
+                (workspace_id, filename),
+            ).fetchone()
+        return row[0] if row else None
+
+    def version(self, workspace_id: str) -> int:
+        """Counter bumped whenever the workspace's indexed content changes."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM workspace_versions WHERE workspace_id = ?", (workspace_id,),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, workspace_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO workspace_versions (workspace_id, version) VALUES (?, 1) "
+                "ON CONFLICT (workspace_id) DO UPDATE SET version = version + 1",
+                (workspace_id,),
+            )
+
+    def chunks(self, workspace_id: str, filename: str) -> Dict[str, Tuple[str, int]]:
+        """chunk_hash -> (point_id, chunk_index) for the file's currently indexed chunks."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_hash, point_id, chunk_index FROM manifest_chunks "
+                "WHERE workspace_id = ? AND filename = ?",
+                (workspace_id, filename),
+            ).fetchall()
+        return {chunk_hash: (point_id, chunk_index) for chunk_hash, point_id, chunk_index in rows}
+
+    def replace_file(
+        self,
+        workspace_id: str,
+        filename: str,
+        file_hash: str,
+        chunks: List[Tuple[int, str, str]],
+    ) -> None:
+        """Record `file_hash` and its `(chunk_index, chunk_hash, point_id)` list as the indexed state."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest_files (workspace_id, filename, file_hash, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (workspace_id, filename, file_hash, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM manifest_chunks WHERE workspace_id = ? AND filename = ?",
+                (workspace_id, filename),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO manifest_chunks "
+                "(workspace_id, filename, chunk_hash, point_id, chunk_index) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (workspace_id, filename, chunk_hash, point_id, chunk_index)
+                    for chunk_index, chunk_hash, point_id in chunks
+                ],
+            )
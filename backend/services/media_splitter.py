@@ -0,0 +1,145 @@
+import csv
+import logging
+import mimetypes
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, List
+
+from backend.services.chunking import PAGE_BREAK
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
+# Scanned PDFs are extracted in ranges of this many pages, concurrently; 0 sends the whole file
+PDF_SEGMENT_PAGES = int(os.getenv("PDF_SEGMENT_PAGES", "1"))
+# Audio and video are transcribed in segments of about this many seconds, concurrently; 0 sends the whole file
+MEDIA_SEGMENT_SECONDS = int(os.getenv("MEDIA_SEGMENT_SECONDS", "300"))
+# Segments of one file extracted at once
+MEDIA_EXTRACTION_CONCURRENCY = int(os.getenv("MEDIA_EXTRACTION_CONCURRENCY", "8"))
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+def is_splittable(mime_type: str) -> bool:
+    if mime_type == "application/pdf":
+        return PDF_SEGMENT_PAGES > 0 and PdfReader is not None
+    if mime_type.startswith(("audio/", "video/")):
+        return MEDIA_SEGMENT_SECONDS > 0 and shutil.which(FFMPEG_BINARY) is not None
+    return False
+
+
+def split_upload(file_obj: Dict[str, Any], workdir: str) -> List[Dict[str, Any]]:
+    """
+    Page ranges of a PDF or time segments of audio/video, written to files in
+    `workdir`. Each segment is an upload dict (`path`, `filename`,
+    `content_type`) plus its `prefix`, the text that goes before its
+    extracted text when the pieces are joined. Returns [] when the file is
+    not worth splitting or cannot be split, so it is extracted whole.
+    """
+    mime_type = file_obj.get("content_type") or ""
+    if not is_splittable(mime_type):
+        return []
+    try:
+        if mime_type == "application/pdf":
+            return _split_pdf(file_obj, workdir)
+        return _split_media(file_obj, mime_type, workdir)
+    except Exception:
+        logger.warning("Could not split %s (%s); extracting it whole", file_obj.get("filename"), mime_type,
+                       exc_info=True)
+        return []
+
+
+def segment_text(segment: Dict[str, Any], text: str) -> str:
+    """A segment's extracted text with its page breaks or timestamp heading, ready to join in order."""
+    return segment["prefix"] + (text or "").strip()
+
+
+def _split_pdf(file_obj: Dict[str, Any], workdir: str) -> List[Dict[str, Any]]:
+    source = file_obj["path"] if "data" not in file_obj else _spill(file_obj, workdir)
+    reader = PdfReader(source)
+    if reader.is_encrypted:
+        return []
+    total = len(reader.pages)
+    if total <= PDF_SEGMENT_PAGES:
+        return []
+
+    name = file_obj.get("filename") or "document.pdf"
+    segments = []
+    for start in range(0, total, PDF_SEGMENT_PAGES):
+        end = min(start + PDF_SEGMENT_PAGES, total)
+        writer = PdfWriter()
+        for page in reader.pages[start:end]:
+            writer.add_page(page)
+        path = os.path.join(workdir, f"pages{start + 1:05d}.pdf")
+        with open(path, "wb") as fh:
+            writer.write(fh)
+        segments.append({
+            "path": path,
+            "filename": f"{name} (pages {start + 1}-{end})",
+            "content_type": "application/pdf",
+            # Page breaks after the previous range keep chunk `page` numbers true to the PDF.
+            "prefix": PAGE_BREAK * PDF_SEGMENT_PAGES if start else "",
+        })
+    return segments
+
+
+def _split_media(file_obj: Dict[str, Any], mime_type: str, workdir: str) -> List[Dict[str, Any]]:
+    source = file_obj["path"] if "data" not in file_obj else _spill(file_obj, workdir)
+    if mime_type.startswith("audio/"):
+        # 16 kHz mono WAV: what speech-to-text wants, about 10MB per 5 minutes.
+        codec = ["-vn", "-ac", "1", "-ar", "16000"]
+        ext, content_type = ".wav", "audio/wav"
+    else:
+        # Stream copy, so segments are cut at keyframes and nothing is re-encoded.
+        codec = ["-map", "0:v:0", "-map", "0:a?", "-c", "copy"]
+        ext = (os.path.splitext(file_obj.get("filename") or "")[1].lower()
+               or mimetypes.guess_extension(mime_type) or ".mp4")
+        content_type = mime_type
+
+    listing = os.path.join(workdir, "segments.csv")
+    subprocess.run(
+        [
+            FFMPEG_BINARY, "-nostdin", "-v", "error", "-i", source, *codec,
+            "-f", "segment", "-segment_time", str(MEDIA_SEGMENT_SECONDS), "-reset_timestamps", "1",
+            "-segment_list", listing, "-segment_list_type", "csv",
+            os.path.join(workdir, f"segment%05d{ext}"),
+        ],
+        check=True,
+        capture_output=True,
+        timeout=FFMPEG_TIMEOUT_SECONDS,
+    )
+    with open(listing, newline="") as fh:
+        rows = [row for row in csv.reader(fh) if len(row) >= 3]
+    if len(rows) < 2:
+        return []
+
+    name = file_obj.get("filename") or "media"
+    segments = []
+    for i, (filename, start, end) in enumerate(row[:3] for row in rows):
+        start, end = _clock(float(start)), _clock(float(end))
+        segments.append({
+            "path": os.path.join(workdir, filename),
+            "filename": f"{name} ({start}-{end})",
+            "content_type": content_type,
+            # The heading becomes the `section` of the segment's chunks.
+            "prefix": ("\n\n" if i else "") + f"# {start} - {end}\n",
+        })
+    return segments
+
+
+def _spill(file_obj: Dict[str, Any], workdir: str) -> str:
+    """Write an in-memory upload to `workdir` for tools that need a file."""
+    path = os.path.join(workdir, "source" + os.path.splitext(file_obj.get("filename") or "")[1])
+    with open(path, "wb") as fh:
+        fh.write(file_obj["data"])
+    return path
+
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
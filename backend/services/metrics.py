@@ -0,0 +1,223 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Add a Server-Timing header with per-stage durations to API responses
+METRICS_TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [(self.name, key, float(value)) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, with a final +Inf bucket; then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        out: List[Tuple[str, LabelValues, float]] = []
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append((f"{self.name}_bucket", key + (le,), cumulative))
+            out.append((f"{self.name}_sum", key, total))
+            out.append((f"{self.name}_count", key, cumulative))
+        return out
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter read from `collect()` at scrape time, e.g. cache statistics."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+        kind: str = "gauge",
+    ):
+        self.kind = kind
+        self.collect = collect
+        super().__init__(name, help_text, label_names)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        return [(self.name, key, float(value)) for key, value in self.collect().items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            label_names = metric.label_names
+            for sample_name, key, value in metric.samples():
+                names = label_names + ("le",) if sample_name.endswith("_bucket") else label_names
+                labels = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(names, key))
+                lines.append(f"{sample_name}{{{labels}}} {_format(value)}" if labels else f"{sample_name} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "autorag_stage_seconds", "Time spent in a pipeline stage.", ("pipeline", "stage"),
+)
+STAGE_ERRORS = Counter(
+    "autorag_stage_errors_total", "Pipeline stages that raised.", ("pipeline", "stage"),
+)
+PROVIDER_CALLS = Counter(
+    "autorag_provider_calls_total",
+    "Provider call attempts by outcome (ok, retry, error, rejected by an open circuit).",
+    ("provider", "outcome"),
+)
+PROVIDER_CALL_SECONDS = Histogram(
+    "autorag_provider_call_seconds", "Latency of single provider call attempts.", ("provider",),
+)
+PROVIDER_THROTTLED_SECONDS = Counter(
+    "autorag_provider_throttled_seconds_total", "Time calls waited on a provider rate limit.", ("provider",),
+)
+GEMINI_TOKENS = Counter(
+    "autorag_gemini_tokens_total", "Gemini tokens reported in usage metadata.", ("model", "kind"),
+)
+EMBEDDED_TEXTS = Counter(
+    "autorag_embedded_texts_total", "Texts sent to the embedding model (cache misses).", ("model",),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "autorag_http_request_seconds", "API request latency (to response headers).", ("method", "route", "status"),
+)
+
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("autorag_timings", default=None)
+
+
+@contextmanager
+def span(stage: str, pipeline: str = "ask") -> Iterator[None]:
+    """Time a block into autorag_stage_seconds and the current request's timing breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(pipeline=pipeline, stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, pipeline=pipeline, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Collect spans of the current request (and tasks/threads it starts) into the returned list."""
+    timings: List[Tuple[str, float]] = []
+    _timings.set(timings)
+    return timings
+
+
+def detach_request_timings() -> None:
+    """Called by background tasks started from a request, so their spans stay out of its breakdown."""
+    _timings.set(None)
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value; repeated stages are summed."""
+    totals: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
+
+
+def record_token_usage(model: str, usage: Any) -> None:
+    if usage is None:
+        return
+    for kind, attr in (
+        ("prompt", "prompt_token_count"),
+        ("output", "candidates_token_count"),
+        ("cached", "cached_content_token_count"),
+        ("thinking", "thoughts_token_count"),
+    ):
+        value = getattr(usage, attr, None)
+        if value:
+            GEMINI_TOKENS.inc(value, model=model, kind=kind)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
@@ -1,22 +1,79 @@
+import logging
 import os
 from typing import Dict, Any
 
-import requests
+from backend.services.http_pool import get_async_http_client, get_http_session
+from backend.services.resilience import get_policy, raise_for_retryable_status
 
 OPUS_API_KEY = os.getenv("OPUS_API_KEY", "")
 OPUS_WORKFLOW_ID = os.getenv("OPUS_WORKFLOW_ID", "")
 OPUS_RUN_URL = os.getenv("OPUS_RUN_URL", "https://api.opus.ai/workflow/run")
 
+logger = logging.getLogger(__name__)
+
+# Retries, rate limit and circuit breaker shared by every review call
+_policy = get_policy("opus")
+
 
 def run_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
     """
     Minimal use of Opus: send question + base RAG answer for lightweight review.
-    If Opus is not configured or fails, return {} and let backend proceed.
+    If Opus is not configured or fails (including while its circuit is open),
+    return {} and let backend proceed.
     """
     if not (OPUS_API_KEY and OPUS_WORKFLOW_ID):
         return {}
 
-    payload = {
+    def _send():
+        return raise_for_retryable_status(
+            get_http_session().post(
+                OPUS_RUN_URL, json=_review_payload(question, base_result), headers=_headers(), timeout=30,
+            )
+        )
+
+    try:
+        resp = _policy.call(_send)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        # If anything goes wrong with Opus, just skip review.
+        logger.warning("Opus review failed", exc_info=True)
+        return {}
+
+    return _review_result(data, base_result)
+
+
+async def run_review_workflow_async(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
+    if not (OPUS_API_KEY and OPUS_WORKFLOW_ID):
+        return {}
+
+    async def _send():
+        return raise_for_retryable_status(
+            await get_async_http_client().post(
+                OPUS_RUN_URL, json=_review_payload(question, base_result), headers=_headers(), timeout=30,
+            )
+        )
+
+    try:
+        resp = await _policy.call_async(_send)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        logger.warning("Opus review failed", exc_info=True)
+        return {}
+
+    return _review_result(data, base_result)
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPUS_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def _review_payload(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "workflow_id": OPUS_WORKFLOW_ID,
         "input": {
             "question": question,
@@ -26,19 +83,8 @@ def run_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str,
         },
     }
 
-    headers = {
-        "Authorization": f"Bearer {OPUS_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    try:
-        resp = requests.post(OPUS_RUN_URL, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-    except Exception:
-        # If anything goes wrong with Opus, just skip review.
-        return {}
 
+def _review_result(data: Dict[str, Any], base_result: Dict[str, Any]) -> Dict[str, Any]:
     # Match your Output node system names:
     approved_answer = data.get("approved_answer") or base_result.get("answer", "")
     needs_human_review = data.get("needs_human_review", False)
@@ -1,48 +1,286 @@
+import asyncio
+import hashlib
+import logging
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Dict, Any, Optional, Set, Tuple
 from uuid import uuid4
 
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from backend.services.vector_codec import (
+    VECTOR_DIMENSIONS,
+    VECTOR_OVERSAMPLING,
+    VECTOR_QUANTIZATION,
+    VECTOR_RESCORE,
+    truncate,
+)
 
 QDRANT_URL = os.getenv("QDRANT_URL", "")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "rag_chunks")
 
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "1"))
+
+# "payload" (shared collection, per-tenant HNSW on the workspace_id index) or
+# "shard_key" (custom sharding, one shard key per workspace; needs a Qdrant cluster)
+QDRANT_TENANCY = os.getenv("QDRANT_TENANCY", "payload").lower()
+# Workspaces with more points than this move to a collection of their own (0 disables)
+QDRANT_DEDICATED_THRESHOLD = int(os.getenv("QDRANT_DEDICATED_THRESHOLD", "0"))
+# How long a process trusts its view of promoted workspaces and shard keys
+QDRANT_ROUTING_TTL_SECONDS = float(os.getenv("QDRANT_ROUTING_TTL_SECONDS", "60"))
+
 VECTOR_SIZE = 768  # must match text-embedding-004
+# Dimensions stored in new collections (VECTOR_DIMENSIONS truncates embeddings)
+STORED_VECTOR_SIZE = min(VECTOR_SIZE, VECTOR_DIMENSIONS) if VECTOR_DIMENSIONS > 0 else VECTOR_SIZE
 
+# Dedicated collections are reached through an alias named after the workspace.
+_DEDICATED_PREFIX = f"{QDRANT_COLLECTION}_ws_"
+_SCROLL_PAGE = 512
+
+logger = logging.getLogger(__name__)
 
 _client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+_async_client = AsyncQdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+# Collections bootstrapped by this process
+_ready: Set[str] = set()
+_collection_lock = threading.Lock()
+_async_collection_lock = asyncio.Lock()
+# Set from the shared collection's config, which wins over QDRANT_TENANCY once it exists
+_custom_sharding = False
+_shard_keys: Set[str] = set()
+_dedicated: Set[str] = set()
+_routing_loaded_at = float("-inf")
+# Points per workspace in the shared collection, counted exactly then tracked on upsert/delete
+_shared_counts: Dict[str, int] = {}
+
+
+class _WorkspaceGate:
+    """Writes to a workspace run concurrently, except while the workspace is being promoted."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._writers: Dict[str, int] = {}
+        self._exclusive: Set[str] = set()
+
+    def try_enter(self, workspace_id: str) -> bool:
+        with self._cond:
+            if workspace_id in self._exclusive:
+                return False
+            self._writers[workspace_id] = self._writers.get(workspace_id, 0) + 1
+            return True
+
+    def enter(self, workspace_id: str) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: workspace_id not in self._exclusive)
+            self._writers[workspace_id] = self._writers.get(workspace_id, 0) + 1
+
+    def leave(self, workspace_id: str) -> None:
+        with self._cond:
+            self._writers[workspace_id] -= 1
+            if not self._writers[workspace_id]:
+                del self._writers[workspace_id]
+            self._cond.notify_all()
+
+    @contextmanager
+    def write(self, workspace_id: str):
+        self.enter(workspace_id)
+        try:
+            yield
+        finally:
+            self.leave(workspace_id)
+
+    @asynccontextmanager
+    async def write_async(self, workspace_id: str):
+        if not self.try_enter(workspace_id):
+            await asyncio.to_thread(self.enter, workspace_id)
+        try:
+            yield
+        finally:
+            self.leave(workspace_id)
+
+    @contextmanager
+    def exclusive(self, workspace_id: str):
+        with self._cond:
+            self._cond.wait_for(lambda: workspace_id not in self._exclusive)
+            self._exclusive.add(workspace_id)
+            self._cond.wait_for(lambda: not self._writers.get(workspace_id))
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive.discard(workspace_id)
+                self._cond.notify_all()
+
+
+_gate = _WorkspaceGate()
 
 
 def ensure_collection() -> None:
-    try:
-        _client.get_collection(QDRANT_COLLECTION)
-    except Exception:
-        _client.recreate_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=models.VectorParams(
-                size=VECTOR_SIZE,
-                distance=models.Distance.COSINE,
-            ),
-        )
+    """
+    Bootstrap the shared collection: create it if missing and add any missing
+    payload indexes. Existing collections and their points are never dropped.
+    Only the first call per process hits Qdrant.
+    """
+    if QDRANT_COLLECTION in _ready:
+        return
+
+    with _collection_lock:
+        if QDRANT_COLLECTION in _ready:
+            return
+        _bootstrap(QDRANT_COLLECTION, shared=True)
+
+
+async def ensure_collection_async() -> None:
+    if QDRANT_COLLECTION in _ready:
+        return
+
+    async with _async_collection_lock:
+        if QDRANT_COLLECTION in _ready:
+            return
+        await _bootstrap_async(QDRANT_COLLECTION, shared=True)
 
 
 def upsert_chunk(workspace_id: str, vector: List[float], payload: Dict[str, Any]) -> None:
-    ensure_collection()
+    upsert_chunks(workspace_id, [vector], [payload])
 
-    payload = dict(payload)
-    payload["workspace_id"] = workspace_id
 
-    _client.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=[
-            models.PointStruct(
-                id=str(uuid4()),
-                vector=vector,
-                payload=payload,
-            )
-        ],
-    )
+def upsert_chunks(
+    workspace_id: str,
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+    parallel: int = QDRANT_UPSERT_PARALLEL,
+    point_ids: Optional[List[str]] = None,
+) -> int:
+    """
+    Write many chunks in batches of `batch_size` points, with up to `parallel`
+    upsert requests in flight. Returns the number of points written.
+    Points get random ids unless `point_ids` is given. A workspace that grows
+    past QDRANT_DEDICATED_THRESHOLD is promoted to its own collection.
+    """
+    points = _build_points(workspace_id, vectors, payloads, point_ids)
+    if not points:
+        return 0
+
+    with _gate.write(workspace_id):
+        collection, shard_key = _target(workspace_id, write=True)
+        batches = _batches(points, batch_size)
+
+        def _flush(batch: List[models.PointStruct]) -> None:
+            _client.upsert(collection_name=collection, points=batch, shard_key_selector=shard_key)
+
+        if parallel > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(parallel, len(batches))) as pool:
+                # list() re-raises the first failed batch
+                list(pool.map(_flush, batches))
+        else:
+            for batch in batches:
+                _flush(batch)
+
+        promote = False
+        if _tracks_count(collection):
+            if workspace_id in _shared_counts:
+                _shared_counts[workspace_id] += len(points)
+            # The running count overshoots when existing ids are re-upserted, so an
+            # unknown count or one past the threshold is confirmed exactly.
+            if _shared_counts.get(workspace_id, QDRANT_DEDICATED_THRESHOLD + 1) > QDRANT_DEDICATED_THRESHOLD:
+                _shared_counts[workspace_id] = _count_shared(workspace_id, shard_key)
+            promote = _shared_counts[workspace_id] > QDRANT_DEDICATED_THRESHOLD
+
+    if promote:
+        promote_workspace(workspace_id)
+    return len(points)
+
+
+async def upsert_chunks_async(
+    workspace_id: str,
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+    parallel: int = QDRANT_UPSERT_PARALLEL,
+    point_ids: Optional[List[str]] = None,
+) -> int:
+    points = _build_points(workspace_id, vectors, payloads, point_ids)
+    if not points:
+        return 0
+
+    async with _gate.write_async(workspace_id):
+        collection, shard_key = await _target_async(workspace_id, write=True)
+        semaphore = asyncio.Semaphore(max(1, parallel))
+
+        async def _flush(batch: List[models.PointStruct]) -> None:
+            async with semaphore:
+                await _async_client.upsert(collection_name=collection, points=batch, shard_key_selector=shard_key)
+
+        await asyncio.gather(*(_flush(batch) for batch in _batches(points, batch_size)))
+
+        promote = False
+        if _tracks_count(collection):
+            if workspace_id in _shared_counts:
+                _shared_counts[workspace_id] += len(points)
+            if _shared_counts.get(workspace_id, QDRANT_DEDICATED_THRESHOLD + 1) > QDRANT_DEDICATED_THRESHOLD:
+                _shared_counts[workspace_id] = await _count_shared_async(workspace_id, shard_key)
+            promote = _shared_counts[workspace_id] > QDRANT_DEDICATED_THRESHOLD
+
+    if promote:
+        # A one-off bulk copy; run it on the sync client rather than duplicating it.
+        await asyncio.to_thread(promote_workspace, workspace_id)
+    return len(points)
+
+
+def delete_points(workspace_id: str, point_ids: List[str]) -> None:
+    if not point_ids:
+        return
+    with _gate.write(workspace_id):
+        collection, shard_key = _target(workspace_id)
+        _client.delete(
+            collection_name=collection,
+            points_selector=models.PointIdsList(points=list(point_ids)),
+            shard_key_selector=shard_key,
+        )
+        _forget_shared(workspace_id, collection, len(point_ids))
+
+
+async def delete_points_async(workspace_id: str, point_ids: List[str]) -> None:
+    if not point_ids:
+        return
+    async with _gate.write_async(workspace_id):
+        collection, shard_key = await _target_async(workspace_id)
+        await _async_client.delete(
+            collection_name=collection,
+            points_selector=models.PointIdsList(points=list(point_ids)),
+            shard_key_selector=shard_key,
+        )
+        _forget_shared(workspace_id, collection, len(point_ids))
+
+
+def set_chunk_indexes(workspace_id: str, chunk_indexes: Dict[str, int]) -> None:
+    """Update the chunk_index payload of existing points (point_id -> chunk_index) in one request."""
+    if not chunk_indexes:
+        return
+    with _gate.write(workspace_id):
+        collection, shard_key = _target(workspace_id)
+        _client.batch_update_points(
+            collection_name=collection,
+            update_operations=_chunk_index_operations(chunk_indexes, shard_key),
+        )
+
+
+async def set_chunk_indexes_async(workspace_id: str, chunk_indexes: Dict[str, int]) -> None:
+    if not chunk_indexes:
+        return
+    async with _gate.write_async(workspace_id):
+        collection, shard_key = await _target_async(workspace_id)
+        await _async_client.batch_update_points(
+            collection_name=collection,
+            update_operations=_chunk_index_operations(chunk_indexes, shard_key),
+        )
 
 
 def search_chunks(
@@ -50,20 +288,422 @@ def search_chunks(
     query_vector: List[float],
     limit: int = 5,
 ) -> List[Dict[str, Any]]:
-    ensure_collection()
+    collection, shard_key = _target(workspace_id)
 
     results = _client.search(
-        collection_name=QDRANT_COLLECTION,
-        query_vector=query_vector,
-        query_filter=models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="workspace_id",
-                    match=models.MatchValue(value=workspace_id),
+        collection_name=collection,
+        query_vector=_stored_vector(query_vector),
+        query_filter=_workspace_filter(workspace_id),
+        search_params=_search_params(),
+        limit=limit,
+        shard_key_selector=shard_key,
+    )
+
+    return [_hit_to_dict(hit) for hit in results]
+
+
+async def search_chunks_async(
+    workspace_id: str,
+    query_vector: List[float],
+    limit: int = 5,
+) -> List[Dict[str, Any]]:
+    collection, shard_key = await _target_async(workspace_id)
+
+    results = await _async_client.search(
+        collection_name=collection,
+        query_vector=_stored_vector(query_vector),
+        query_filter=_workspace_filter(workspace_id),
+        search_params=_search_params(),
+        limit=limit,
+        shard_key_selector=shard_key,
+    )
+
+    return [_hit_to_dict(hit) for hit in results]
+
+
+def search_chunks_batch(
+    workspace_id: str,
+    query_vectors: List[List[float]],
+    limit: int = 5,
+) -> List[List[Dict[str, Any]]]:
+    """One result list per query vector, all searched in a single request."""
+    if not query_vectors:
+        return []
+    collection, shard_key = _target(workspace_id)
+    results = _client.search_batch(
+        collection_name=collection, requests=_search_requests(workspace_id, query_vectors, limit, shard_key),
+    )
+    return [[_hit_to_dict(hit) for hit in hits] for hits in results]
+
+
+async def search_chunks_batch_async(
+    workspace_id: str,
+    query_vectors: List[List[float]],
+    limit: int = 5,
+) -> List[List[Dict[str, Any]]]:
+    if not query_vectors:
+        return []
+    collection, shard_key = await _target_async(workspace_id)
+    results = await _async_client.search_batch(
+        collection_name=collection, requests=_search_requests(workspace_id, query_vectors, limit, shard_key),
+    )
+    return [[_hit_to_dict(hit) for hit in hits] for hits in results]
+
+
+def _search_requests(
+    workspace_id: str, query_vectors: List[List[float]], limit: int, shard_key: Optional[str],
+) -> List[models.SearchRequest]:
+    workspace_filter = _workspace_filter(workspace_id)
+    params = _search_params()
+    return [
+        models.SearchRequest(
+            vector=_stored_vector(vector),
+            filter=workspace_filter,
+            params=params,
+            limit=limit,
+            with_payload=True,
+            shard_key=shard_key,
+        )
+        for vector in query_vectors
+    ]
+
+
+def retrieve_points(workspace_id: str, point_ids: List[str]) -> List[Dict[str, Any]]:
+    """Payloads (with `point_id`) of the given points, skipping ids that no longer exist."""
+    if not point_ids:
+        return []
+    collection, shard_key = _target(workspace_id)
+    records = _client.retrieve(
+        collection_name=collection, ids=list(point_ids), with_payload=True, shard_key_selector=shard_key,
+    )
+    return [_record_to_dict(record) for record in records]
+
+
+async def retrieve_points_async(workspace_id: str, point_ids: List[str]) -> List[Dict[str, Any]]:
+    if not point_ids:
+        return []
+    collection, shard_key = await _target_async(workspace_id)
+    records = await _async_client.retrieve(
+        collection_name=collection, ids=list(point_ids), with_payload=True, shard_key_selector=shard_key,
+    )
+    return [_record_to_dict(record) for record in records]
+
+
+def promote_workspace(workspace_id: str) -> str:
+    """
+    Move a workspace's points from the shared collection into a collection of
+    its own and return the alias it is reached by. Reads keep using the shared
+    collection until the alias exists; this process's writes to the workspace
+    wait for the move. Other processes see the new routing within
+    QDRANT_ROUTING_TTL_SECONDS, so promote while the workspace is not being
+    written to elsewhere.
+    """
+    global _dedicated
+    alias = _dedicated_name(workspace_id)
+    ensure_collection()
+    with _gate.exclusive(workspace_id):
+        _refresh_routing(force=True)
+        if alias in _dedicated:
+            return alias
+
+        physical = f"{alias}_data"
+        if physical not in _ready:
+            _bootstrap(physical, shared=False)
+        shard_key = _shard_key(workspace_id)
+        moved = 0
+        offset = None
+        while True:
+            records, offset = _client.scroll(
+                collection_name=QDRANT_COLLECTION,
+                scroll_filter=_workspace_filter(workspace_id),
+                limit=_SCROLL_PAGE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+                shard_key_selector=shard_key,
+            )
+            if records:
+                _client.upsert(
+                    collection_name=physical,
+                    points=[models.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records],
+                )
+                moved += len(records)
+            if offset is None:
+                break
+
+        _client.update_collection_aliases(
+            change_aliases_operations=[
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(collection_name=physical, alias_name=alias),
                 )
             ]
-        ),
-        limit=limit,
+        )
+        _dedicated = _dedicated | {alias}
+        _client.delete(
+            collection_name=QDRANT_COLLECTION,
+            points_selector=models.FilterSelector(filter=_workspace_filter(workspace_id)),
+            shard_key_selector=shard_key,
+        )
+        _shared_counts.pop(workspace_id, None)
+
+    logger.info("Promoted workspace %s to collection %s (%d points)", workspace_id, physical, moved)
+    return alias
+
+
+async def close_async_client() -> None:
+    await _async_client.close()
+
+
+def _target(workspace_id: str, write: bool = False) -> Tuple[str, Optional[str]]:
+    """The collection holding a workspace's points, and the shard key to address within it."""
+    ensure_collection()
+    _refresh_routing()
+    alias = _dedicated_name(workspace_id)
+    if alias in _dedicated:
+        return alias, None
+    if write and _custom_sharding and workspace_id not in _shard_keys:
+        try:
+            _client.create_shard_key(QDRANT_COLLECTION, workspace_id)
+        except Exception as exc:
+            if "already exists" not in str(exc).lower():
+                raise
+        _shard_keys.add(workspace_id)
+    return QDRANT_COLLECTION, _shard_key(workspace_id)
+
+
+async def _target_async(workspace_id: str, write: bool = False) -> Tuple[str, Optional[str]]:
+    await ensure_collection_async()
+    await _refresh_routing_async()
+    alias = _dedicated_name(workspace_id)
+    if alias in _dedicated:
+        return alias, None
+    if write and _custom_sharding and workspace_id not in _shard_keys:
+        try:
+            await _async_client.create_shard_key(QDRANT_COLLECTION, workspace_id)
+        except Exception as exc:
+            if "already exists" not in str(exc).lower():
+                raise
+        _shard_keys.add(workspace_id)
+    return QDRANT_COLLECTION, _shard_key(workspace_id)
+
+
+def _shard_key(workspace_id: str) -> Optional[str]:
+    # Workspaces this process has not written to are searched across all shards (the filter still applies).
+    return workspace_id if _custom_sharding and workspace_id in _shard_keys else None
+
+
+def _tracks_count(collection: str) -> bool:
+    return QDRANT_DEDICATED_THRESHOLD > 0 and collection == QDRANT_COLLECTION
+
+
+def _count_shared(workspace_id: str, shard_key: Optional[str]) -> int:
+    return _client.count(
+        collection_name=QDRANT_COLLECTION, count_filter=_workspace_filter(workspace_id),
+        exact=True, shard_key_selector=shard_key,
+    ).count
+
+
+async def _count_shared_async(workspace_id: str, shard_key: Optional[str]) -> int:
+    return (await _async_client.count(
+        collection_name=QDRANT_COLLECTION, count_filter=_workspace_filter(workspace_id),
+        exact=True, shard_key_selector=shard_key,
+    )).count
+
+
+def _forget_shared(workspace_id: str, collection: str, deleted: int) -> None:
+    if _tracks_count(collection) and workspace_id in _shared_counts:
+        _shared_counts[workspace_id] = max(0, _shared_counts[workspace_id] - deleted)
+
+
+def _dedicated_name(workspace_id: str) -> str:
+    return _DEDICATED_PREFIX + hashlib.sha1(workspace_id.encode("utf-8")).hexdigest()[:16]
+
+
+def _refresh_routing(force: bool = False) -> None:
+    global _dedicated, _routing_loaded_at
+    if not force and time.monotonic() - _routing_loaded_at < QDRANT_ROUTING_TTL_SECONDS:
+        return
+    aliases = _client.get_aliases().aliases
+    _dedicated = {a.alias_name for a in aliases if a.alias_name.startswith(_DEDICATED_PREFIX)}
+    _routing_loaded_at = time.monotonic()
+
+
+async def _refresh_routing_async() -> None:
+    global _dedicated, _routing_loaded_at
+    if time.monotonic() - _routing_loaded_at < QDRANT_ROUTING_TTL_SECONDS:
+        return
+    aliases = (await _async_client.get_aliases()).aliases
+    _dedicated = {a.alias_name for a in aliases if a.alias_name.startswith(_DEDICATED_PREFIX)}
+    _routing_loaded_at = time.monotonic()
+
+
+def _bootstrap(name: str, shared: bool) -> None:
+    if not _client.collection_exists(name):
+        try:
+            _client.create_collection(collection_name=name, **_collection_config(shared))
+        except Exception:
+            # Another process may have created it first.
+            if not _client.collection_exists(name):
+                raise
+    info = _client.get_collection(name)
+    for field, schema in _missing_indexes(name, info, shared).items():
+        _client.create_payload_index(collection_name=name, field_name=field, field_schema=schema, wait=True)
+    quantization = _quantization_config()
+    if quantization is not None and info.config.quantization_config is None:
+        # Qdrant builds the quantized copy in the background; stored vectors are untouched.
+        _client.update_collection(collection_name=name, quantization_config=quantization)
+    _ready.add(name)
+
+
+async def _bootstrap_async(name: str, shared: bool) -> None:
+    if not await _async_client.collection_exists(name):
+        try:
+            await _async_client.create_collection(collection_name=name, **_collection_config(shared))
+        except Exception:
+            if not await _async_client.collection_exists(name):
+                raise
+    info = await _async_client.get_collection(name)
+    for field, schema in _missing_indexes(name, info, shared).items():
+        await _async_client.create_payload_index(
+            collection_name=name, field_name=field, field_schema=schema, wait=True,
+        )
+    quantization = _quantization_config()
+    if quantization is not None and info.config.quantization_config is None:
+        await _async_client.update_collection(collection_name=name, quantization_config=quantization)
+    _ready.add(name)
+
+
+def _collection_config(shared: bool) -> Dict[str, Any]:
+    config: Dict[str, Any] = {"vectors_config": _vectors_config()}
+    quantization = _quantization_config()
+    if quantization is not None:
+        config["quantization_config"] = quantization
+    if shared:
+        # Every search is filtered by workspace, so build per-tenant HNSW graphs
+        # (on the is_tenant workspace_id index) instead of one global graph.
+        config["hnsw_config"] = models.HnswConfigDiff(m=0, payload_m=16)
+        if QDRANT_TENANCY == "shard_key":
+            config["sharding_method"] = models.ShardingMethod.CUSTOM
+    return config
+
+
+def _missing_indexes(name: str, info: Any, shared: bool) -> Dict[str, Any]:
+    """Validate an existing collection and return the payload indexes it lacks."""
+    global _custom_sharding
+    vectors = info.config.params.vectors
+    size = getattr(vectors, "size", None)
+    if size is not None and size != STORED_VECTOR_SIZE:
+        raise RuntimeError(
+            f"Qdrant collection {name} has {size}-dimensional vectors, expected {STORED_VECTOR_SIZE}; "
+            "use another QDRANT_COLLECTION or migrate it."
+        )
+    if shared:
+        _custom_sharding = info.config.params.sharding_method == models.ShardingMethod.CUSTOM
+        if QDRANT_TENANCY == "shard_key" and not _custom_sharding:
+            logger.warning(
+                "QDRANT_TENANCY=shard_key but collection %s already exists without custom sharding; "
+                "using payload filtering", name,
+            )
+
+    indexes = {
+        "workspace_id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=shared),
+        "filename": models.PayloadSchemaType.KEYWORD,
+        "chunk_index": models.PayloadSchemaType.INTEGER,
+    }
+    existing = info.payload_schema or {}
+    return {field: schema for field, schema in indexes.items() if field not in existing}
+
+
+def _vectors_config() -> models.VectorParams:
+    return models.VectorParams(
+        size=STORED_VECTOR_SIZE,
+        distance=models.Distance.COSINE,
+        # With quantization, only the quantized copy stays in RAM; originals are read for rescoring.
+        on_disk=True if VECTOR_QUANTIZATION != "none" else None,
+    )
+
+
+def _quantization_config() -> Optional[Any]:
+    if VECTOR_QUANTIZATION == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True),
+        )
+    if VECTOR_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if VECTOR_QUANTIZATION != "none":
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION: {VECTOR_QUANTIZATION}")
+    return None
+
+
+def _search_params() -> Optional[models.SearchParams]:
+    if VECTOR_QUANTIZATION == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=VECTOR_RESCORE, oversampling=VECTOR_OVERSAMPLING),
+    )
+
+
+def _stored_vector(vector: List[float]) -> List[float]:
+    if len(vector) <= STORED_VECTOR_SIZE:
+        return vector
+    return truncate(vector, STORED_VECTOR_SIZE).tolist()
+
+
+def _workspace_filter(workspace_id: str) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="workspace_id",
+                match=models.MatchValue(value=workspace_id),
+            )
+        ]
     )
 
-    return [hit.payload for hit in results]
+
+def _hit_to_dict(hit: Any) -> Dict[str, Any]:
+    return {**(hit.payload or {}), "point_id": str(hit.id), "score": hit.score}
+
+
+def _record_to_dict(record: Any) -> Dict[str, Any]:
+    return {**(record.payload or {}), "point_id": str(record.id)}
+
+
+def _chunk_index_operations(
+    chunk_indexes: Dict[str, int], shard_key: Optional[str] = None,
+) -> List[models.SetPayloadOperation]:
+    return [
+        models.SetPayloadOperation(
+            set_payload=models.SetPayload(payload={"chunk_index": idx}, points=[point_id], shard_key=shard_key),
+        )
+        for point_id, idx in chunk_indexes.items()
+    ]
+
+
+def _build_points(
+    workspace_id: str,
+    vectors: List[List[float]],
+    payloads: List[Dict[str, Any]],
+    point_ids: Optional[List[str]] = None,
+) -> List[models.PointStruct]:
+    if len(vectors) != len(payloads):
+        raise ValueError("vectors and payloads must have the same length")
+    if point_ids is not None and len(point_ids) != len(vectors):
+        raise ValueError("point_ids and vectors must have the same length")
+
+    points: List[models.PointStruct] = []
+    for i, (vector, payload) in enumerate(zip(vectors, payloads)):
+        payload = dict(payload)
+        payload["workspace_id"] = workspace_id
+        points.append(
+            models.PointStruct(
+                id=point_ids[i] if point_ids is not None else str(uuid4()),
+                vector=_stored_vector(vector),
+                payload=payload,
+            )
+        )
+    return points
+
+
+def _batches(points: List[models.PointStruct], batch_size: int) -> List[List[models.PointStruct]]:
+    batch_size = max(1, batch_size)
+    return [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.services.keyword_index import tokenize
+
+try:
+    from fastembed.rerank.cross_encoder import TextCrossEncoder
+except ImportError:
+    TextCrossEncoder = None
+
+# "features" (vectorized lexical + dense-score scorer), "cross_encoder" (local ONNX model via fastembed) or "none"
+RERANKER = os.getenv("RERANKER", "features").lower()
+# Candidates retrieved per question for the reranker to choose RETRIEVAL_LIMIT from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "Xenova/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Cross-encoder time per question; candidates not scored in time keep the feature ranking
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "50"))
+# Leading characters of each chunk given to the cross-encoder
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "1200"))
+
+# Feature weights: dense similarity, IDF-weighted query-term coverage, query bigrams found, retrieval rank
+_WEIGHTS = np.asarray([0.45, 0.35, 0.10, 0.10], dtype=np.float32)
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureReranker:
+    """
+    Model-free reranker. Each candidate is scored from four features computed
+    together with NumPy:
+
+    - its dense similarity (`dense_score`, min-max scaled over the candidates),
+    - the share of query terms it contains, weighted by their rarity among
+      the candidates (so terms every candidate has count for little),
+    - the share of query bigrams it contains (phrases, identifiers),
+    - a prior from the retrieval rank.
+
+    50 chunk-sized candidates take a few milliseconds, mostly tokenization.
+    """
+
+    def scores(self, question: str, hits: List[Dict[str, Any]]) -> np.ndarray:
+        n = len(hits)
+        query_terms = list(dict.fromkeys(tokenize(question)))
+        features = np.zeros((n, len(_WEIGHTS)), dtype=np.float32)
+
+        dense = np.asarray([hit.get("dense_score") if hit.get("dense_score") is not None else np.nan
+                            for hit in hits], dtype=np.float32)
+        if np.isfinite(dense).any():
+            low, high = np.nanmin(dense), np.nanmax(dense)
+            # Keyword-only hits have no dense score; treat them like the weakest dense hit.
+            dense = np.where(np.isfinite(dense), dense, low)
+            features[:, 0] = (dense - low) / (high - low) if high > low else 1.0
+
+        if query_terms:
+            docs = [tokenize(hit.get("text") or "") for hit in hits]
+            present = np.asarray(
+                [[term in terms for term in query_terms] for terms in (set(d) for d in docs)], dtype=np.float32,
+            ).reshape(n, len(query_terms))
+            df = present.sum(axis=0)
+            idf = np.log1p(n / (1.0 + df)).astype(np.float32)
+            if idf.sum() > 0:
+                features[:, 1] = present @ idf / idf.sum()
+
+            query_bigrams = {f" {a} {b} " for a, b in zip(query_terms, query_terms[1:])}
+            if query_bigrams:
+                joined = [f" {' '.join(terms)} " for terms in docs]
+                features[:, 2] = [sum(bigram in doc for bigram in query_bigrams) / len(query_bigrams) for doc in joined]
+
+        features[:, 3] = 1.0 / (1.0 + np.arange(n, dtype=np.float32))
+        return features @ _WEIGHTS
+
+    def rerank(self, question: str, hits: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        if not hits:
+            return []
+        scores = self.scores(question, hits)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [{**hits[i], "rerank_score": float(scores[i])} for i in order]
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder reranking on CPU (fastembed ONNX model, loaded on first use).
+    Candidates are scored in batches in feature-ranking order until
+    RERANK_BUDGET_MS is spent, so the most promising ones are always scored;
+    any left over follow the scored ones in feature order.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget_ms: float = RERANK_BUDGET_MS,
+    ):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget = budget_ms / 1000
+        self.features = FeatureReranker()
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Any:
+        with self._lock:
+            if self._model is None:
+                self._model = TextCrossEncoder(model_name=self.model_name)
+            return self._model
+
+    def rerank(self, question: str, hits: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        if not hits:
+            return []
+        ordered = self.features.rerank(question, hits, len(hits))
+        model = self._load()
+
+        deadline = time.perf_counter() + self.budget
+        scored: List[Dict[str, Any]] = []
+        for start in range(0, len(ordered), self.batch_size):
+            if scored and time.perf_counter() >= deadline:
+                break
+            batch = ordered[start:start + self.batch_size]
+            docs = [(hit.get("text") or "")[:RERANK_MAX_CHARS] for hit in batch]
+            for hit, score in zip(batch, model.rerank(question, docs, batch_size=self.batch_size)):
+                scored.append({**hit, "rerank_score": float(score)})
+
+        scored.sort(key=lambda hit: hit["rerank_score"], reverse=True)
+        return (scored + ordered[len(scored):])[:limit]
+
+
+def get_reranker(name: str = RERANKER) -> Optional[Any]:
+    if name == "none":
+        return None
+    if name == "features":
+        return FeatureReranker()
+    if name == "cross_encoder":
+        if TextCrossEncoder is None:
+            logger.warning("RERANKER=cross_encoder needs the fastembed package; using the feature reranker")
+            return FeatureReranker()
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown RERANKER: {name}")
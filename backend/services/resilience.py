@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+import requests
+
+from backend.services.metrics import PROVIDER_CALL_SECONDS, PROVIDER_CALLS, PROVIDER_THROTTLED_SECONDS
+
+# Retries after the first attempt for rate-limited, overloaded or unreachable providers
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "4"))
+PROVIDER_BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", "0.5"))
+PROVIDER_BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", "20"))
+# Requests per second (optionally ":burst") per provider/model, e.g. "gemini/text-embedding-004=25:50"
+PROVIDER_RATE_LIMITS = os.getenv(
+    "PROVIDER_RATE_LIMITS", "gemini/text-embedding-004=25:50,gemini/gemini-2.5-flash=15:30",
+)
+# Send a duplicate of a hedgeable call still running after this many seconds (0 disables hedging)
+PROVIDER_HEDGE_AFTER_SECONDS = float(os.getenv("PROVIDER_HEDGE_AFTER_SECONDS", "0"))
+# Consecutive failed calls (after their retries, 429s excluded) that open a provider's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailableError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is unavailable, retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class ProviderHTTPError(RuntimeError):
+    """A retryable HTTP status from a provider called through requests/httpx."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"provider returned HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def raise_for_retryable_status(response: Any) -> Any:
+    """Turn 429/5xx responses into ProviderHTTPError so the policy retries them; others pass through."""
+    if response.status_code in RETRYABLE_STATUS:
+        raise ProviderHTTPError(response.status_code, _retry_after_header(response))
+    return response
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, ProviderUnavailableError):
+        return False
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(
+        exc,
+        (requests.ConnectionError, requests.Timeout, httpx.TransportError, ConnectionError, TimeoutError),
+    )
+
+
+class TokenBucket:
+    """Admits `rate` calls per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, name: str = ""):
+        self.name = name
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token (possibly going into debt) and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate)
+        if delay:
+            PROVIDER_THROTTLED_SECONDS.inc(delay, provider=self.name)
+        return delay
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `reset_seconds`; then lets one probe call through, closing again if it succeeds.
+    """
+
+    def __init__(self, name: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """Raise if the circuit rejects the call; returns True if the call is the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_seconds or self._probing:
+                raise ProviderUnavailableError(self.name, max(1.0, self.reset_seconds - waited))
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                logger.warning("Circuit for %s opened after %d failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self) -> None:
+        """Free the half-open probe slot of a call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+
+
+class ProviderPolicy:
+    """
+    Rate limiting, retries with jittered exponential backoff and circuit
+    breaking around calls to one provider/model. Only errors `is_retryable`
+    accepts (429, 5xx, timeouts, connection failures) are retried; a call
+    whose retries run out on anything but a 429 counts once towards opening
+    the circuit. Other errors are raised immediately.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_retries: int = PROVIDER_MAX_RETRIES,
+        hedge_after: float = PROVIDER_HEDGE_AFTER_SECONDS,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, name) if rate else None
+        self.breaker = CircuitBreaker(name)
+        self.max_retries = max(0, max_retries)
+        self.hedge_after = hedge_after
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        for attempt in range(self.max_retries + 1):
+            probe = self._admit()
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                time.sleep(self._after_failure(exc, attempt, started, probe))
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self._record_success(started)
+            return result
+
+    async def call_async(self, fn: Callable[..., Awaitable[Any]], *args: Any, hedge: bool = False, **kwargs: Any) -> Any:
+        """
+        Async variant of `call`. With `hedge=True` (idempotent calls only) an
+        attempt still running after `hedge_after` seconds is raced by a duplicate.
+        """
+        for attempt in range(self.max_retries + 1):
+            probe = await self._admit_async()
+            started = time.perf_counter()
+            try:
+                if hedge and self.hedge_after > 0:
+                    result = await self._hedged(fn, args, kwargs)
+                else:
+                    result = await fn(*args, **kwargs)
+            except Exception as exc:
+                await asyncio.sleep(self._after_failure(exc, attempt, started, probe))
+                continue
+            except BaseException:
+                # Cancelled (e.g. a lost hedge or a disconnected client): no verdict on the provider.
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self._record_success(started)
+            return result
+
+    def stream(self, open_stream: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """Iterate a streamed response, retrying only until its first item arrives."""
+        for attempt in range(self.max_retries + 1):
+            probe = self._admit()
+            started = time.perf_counter()
+            try:
+                iterator = iter(open_stream())
+                first = next(iterator)
+            except StopIteration:
+                self._record_success(started)
+                return
+            except Exception as exc:
+                time.sleep(self._after_failure(exc, attempt, started, probe))
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            # Streams are timed to their first item.
+            self._record_success(started)
+            break
+        yield first
+        yield from iterator
+
+    async def stream_async(self, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        for attempt in range(self.max_retries + 1):
+            probe = await self._admit_async()
+            started = time.perf_counter()
+            try:
+                iterator = (await open_stream()).__aiter__()
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                self._record_success(started)
+                return
+            except Exception as exc:
+                await asyncio.sleep(self._after_failure(exc, attempt, started, probe))
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self._record_success(started)
+            break
+        yield first
+        async for item in iterator:
+            yield item
+
+    def _admit(self) -> bool:
+        probe = self._check_circuit()
+        if self.bucket is not None:
+            self.bucket.acquire()
+        return probe
+
+    async def _admit_async(self) -> bool:
+        probe = self._check_circuit()
+        if self.bucket is not None:
+            try:
+                await self.bucket.acquire_async()
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+        return probe
+
+    def _check_circuit(self) -> bool:
+        try:
+            return self.breaker.before_call()
+        except ProviderUnavailableError:
+            PROVIDER_CALLS.inc(provider=self.name, outcome="rejected")
+            raise
+
+    def _record_success(self, started: float) -> None:
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - started, provider=self.name)
+        PROVIDER_CALLS.inc(provider=self.name, outcome="ok")
+        self.breaker.record_success()
+
+    def _after_failure(self, exc: Exception, attempt: int, started: float, probe: bool) -> float:
+        """
+        Re-raise `exc` unless another attempt should follow; returns the backoff delay.
+        A call counts once towards opening the circuit, when its retries run out;
+        a failed half-open probe reopens it at once. Rate limiting (429) never counts.
+        """
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - started, provider=self.name)
+        if not is_retryable(exc):
+            PROVIDER_CALLS.inc(provider=self.name, outcome="error")
+            # The provider answered (e.g. 400): it is reachable, so the circuit stays closed.
+            self.breaker.record_success()
+            raise exc
+        if _status_code(exc) == 429:
+            # Throttled, but reachable: leave the breaker alone and let the next attempt probe again.
+            if probe:
+                self.breaker.release_probe()
+        elif probe or attempt >= self.max_retries:
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            PROVIDER_CALLS.inc(provider=self.name, outcome="error")
+            raise exc
+        PROVIDER_CALLS.inc(provider=self.name, outcome="retry")
+        # Full jitter keeps concurrent callers from retrying in lockstep.
+        delay = random.uniform(0, min(PROVIDER_BACKOFF_MAX, PROVIDER_BACKOFF_BASE * 2 ** attempt))
+        retry_after = getattr(exc, "retry_after", None) or _retry_after_header(getattr(exc, "response", None))
+        if retry_after:
+            delay = max(delay, min(retry_after, PROVIDER_BACKOFF_MAX))
+        logger.info("%s call failed (%s), retry %d in %.2fs", self.name, exc, attempt + 1, delay)
+        return delay
+
+    async def _hedged(self, fn: Callable[..., Awaitable[Any]], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        tasks = [asyncio.ensure_future(fn(*args, **kwargs))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                if self.bucket is not None:
+                    await self.bucket.acquire_async()
+                tasks.append(asyncio.ensure_future(fn(*args, **kwargs)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+_policies: Dict[str, ProviderPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name: str) -> ProviderPolicy:
+    """Process-wide policy for a provider (e.g. "opus") or provider/model (e.g. "gemini/gemini-2.5-flash")."""
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            rate, burst = _rate_limits().get(name, (None, None))
+            policy = _policies[name] = ProviderPolicy(name, rate, burst)
+        return policy
+
+
+def circuit_states() -> Dict[str, str]:
+    with _policies_lock:
+        return {name: policy.breaker.state for name, policy in _policies.items()}
+
+
+def _rate_limits() -> Dict[str, Tuple[float, Optional[float]]]:
+    limits: Dict[str, Tuple[float, Optional[float]]] = {}
+    for entry in PROVIDER_RATE_LIMITS.split(","):
+        if "=" not in entry:
+            continue
+        name, _, value = entry.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst) if burst else None)
+    return limits
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # requests/httpx errors carry `response`; google-genai APIError carries `code`.
+    for value in (
+        getattr(exc, "status_code", None),
+        getattr(exc, "code", None),
+        getattr(getattr(exc, "response", None), "status_code", None),
+    ):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _retry_after_header(response: Any) -> Optional[float]:
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or 0) or None
+    except (TypeError, ValueError):
+        return None
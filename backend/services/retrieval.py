@@ -0,0 +1,28 @@
+import os
+from typing import Dict, List, Tuple
+
+# Chunks handed to the answer model per question
+RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "5"))
+
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+# Candidates taken from each of the dense and keyword searches before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]],
+    weights: List[float],
+    k: int = HYBRID_RRF_K,
+) -> List[Tuple[str, float]]:
+    """
+    Merge ranked id lists: each id scores sum(weight / (k + rank)) over the
+    lists it appears in (rank starting at 1). Returns (id, score) best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
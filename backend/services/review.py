@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.services.opus_client import OPUS_API_KEY, OPUS_WORKFLOW_ID
+
+# Review answers in the background with Opus (on by default when Opus is configured)
+REVIEW_ENABLED = os.getenv("REVIEW_ENABLED", "true").lower() in ("1", "true", "yes") and bool(
+    OPUS_API_KEY and OPUS_WORKFLOW_ID
+)
+# Only answers with confidence at or below this are reviewed (1.0 reviews every answer)
+REVIEW_CONFIDENCE_THRESHOLD = float(os.getenv("REVIEW_CONFIDENCE_THRESHOLD", "1.0"))
+# Reviews collected into one dispatch, and how long the first one waits for company
+REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", "8"))
+REVIEW_BATCH_WINDOW_MS = float(os.getenv("REVIEW_BATCH_WINDOW_MS", "50"))
+REVIEW_CONCURRENCY = int(os.getenv("REVIEW_CONCURRENCY", "4"))
+# Finished reviews kept for polling and reuse, LRU evicted
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "1000"))
+REVIEW_CACHE_TTL_SECONDS = float(os.getenv("REVIEW_CACHE_TTL_SECONDS", "86400"))
+# How long /ask/stream stays open after `done` to deliver the review
+REVIEW_STREAM_WAIT_SECONDS = float(os.getenv("REVIEW_STREAM_WAIT_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+ReviewFn = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def review_key(question: str, answer: str) -> str:
+    return hashlib.sha256(json.dumps([question, answer]).encode("utf-8")).hexdigest()
+
+
+class ReviewManager:
+    """
+    Runs answer reviews off the request path.
+
+    `submit` returns immediately with a review id (the hash of question and
+    answer, so repeated answers share one review); a background dispatcher
+    collects queued reviews into batches of up to `batch_size` and runs them
+    `concurrency` at a time. Results are polled with `get` or awaited with `wait`.
+    """
+
+    def __init__(
+        self,
+        review: ReviewFn,
+        confidence_threshold: float = REVIEW_CONFIDENCE_THRESHOLD,
+        batch_size: int = REVIEW_BATCH_SIZE,
+        batch_window: float = REVIEW_BATCH_WINDOW_MS / 1000,
+        concurrency: int = REVIEW_CONCURRENCY,
+        max_entries: int = REVIEW_CACHE_MAX_ENTRIES,
+        ttl: float = REVIEW_CACHE_TTL_SECONDS,
+    ):
+        self.review = review
+        self.confidence_threshold = confidence_threshold
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.concurrency = max(1, concurrency)
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._events: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def submit(self, question: str, rag_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue a review of the answer (or reuse one); None when the answer is not reviewed."""
+        answer = rag_result.get("answer", "")
+        if not answer or "error" in rag_result:
+            return None
+        if rag_result.get("confidence", 0.0) > self.confidence_threshold:
+            return None
+
+        review_id = review_key(question, answer)
+        record = self._records.get(review_id)
+        if record is not None and record["status"] == "failed":
+            record = None
+        if record is not None and record["status"] == "done" and time.time() - record["finished_at"] > self.ttl:
+            record = None
+        if record is None:
+            record = {
+                "review_id": review_id,
+                "status": "pending",
+                "question": question,
+                "rag_result": rag_result,
+                "finished_at": None,
+                "review": None,
+            }
+            self._records[review_id] = record
+            self._events[review_id] = asyncio.Event()
+            self._ensure_dispatcher()
+            self._queue.put_nowait(review_id)
+        self._records.move_to_end(review_id)
+        self._evict()
+        return self.get(review_id)
+
+    def get(self, review_id: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(review_id)
+        if record is None:
+            return None
+        return {"review_id": review_id, "status": record["status"], "review": record["review"]}
+
+    def pending_count(self) -> int:
+        return sum(1 for record in self._records.values() if record["status"] == "pending")
+
+    async def wait(self, review_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The review once finished, or its pending state after `timeout` seconds."""
+        event = self._events.get(review_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(review_id)
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.Queue()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._run_batch(batch, semaphore))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def _run_batch(self, review_ids: List[str], semaphore: asyncio.Semaphore) -> None:
+        async def _one(review_id: str) -> None:
+            record = self._records.get(review_id)
+            if record is None:
+                return
+            async with semaphore:
+                try:
+                    review = await self.review(record["question"], record["rag_result"])
+                except Exception:
+                    logger.warning("Answer review failed", exc_info=True)
+                    review = {}
+            # The Opus client returns {} when the review could not be run.
+            record["status"] = "done" if review else "failed"
+            record["review"] = review or None
+            record["finished_at"] = time.time()
+            record["rag_result"] = None
+            event = self._events.pop(review_id, None)
+            if event is not None:
+                event.set()
+
+        await asyncio.gather(*(_one(review_id) for review_id in review_ids))
+
+    def _evict(self) -> None:
+        if len(self._records) <= self.max_entries:
+            return
+        for review_id in list(self._records):
+            if len(self._records) <= self.max_entries:
+                break
+            if self._records[review_id]["status"] != "pending":
+                del self._records[review_id]
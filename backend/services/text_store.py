@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, List
+
+# "payload" keeps chunk text in the vector store payload; "local" moves it to a compressed SQLite store
+TEXT_STORE = os.getenv("TEXT_STORE", "payload").lower()
+TEXT_STORE_DB_PATH = os.getenv("TEXT_STORE_DB_PATH", "data/texts.db")
+TEXT_STORE_COMPRESSION_LEVEL = int(os.getenv("TEXT_STORE_COMPRESSION_LEVEL", "6"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_texts (
+    workspace_id TEXT NOT NULL,
+    point_id TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (workspace_id, point_id)
+) WITHOUT ROWID;
+"""
+
+
+class TextStore:
+    """Chunk texts keyed by (workspace, point id), zlib-compressed in SQLite."""
+
+    def __init__(self, path: str = TEXT_STORE_DB_PATH, level: int = TEXT_STORE_COMPRESSION_LEVEL):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.level = level
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def put(self, workspace_id: str, texts: Dict[str, str]) -> None:
+        rows = [
+            (workspace_id, point_id, zlib.compress(text.encode("utf-8"), self.level))
+            for point_id, text in texts.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_texts (workspace_id, point_id, body) VALUES (?, ?, ?)", rows,
+            )
+
+    def get(self, workspace_id: str, point_ids: List[str]) -> Dict[str, str]:
+        if not point_ids:
+            return {}
+        marks = ",".join("?" * len(point_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT point_id, body FROM chunk_texts WHERE workspace_id = ? AND point_id IN ({marks})",
+                [workspace_id, *point_ids],
+            ).fetchall()
+        return {point_id: zlib.decompress(body).decode("utf-8") for point_id, body in rows}
+
+    def delete(self, workspace_id: str, point_ids: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunk_texts WHERE workspace_id = ? AND point_id = ?",
+                [(workspace_id, point_id) for point_id in point_ids],
+            )
@@ -0,0 +1,84 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+# In-memory search codes: "none" (float32), "int8" (scalar, 4x smaller) or "binary" (1 bit per dimension, 32x smaller)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+# Keep only the first N embedding dimensions (Matryoshka truncation, renormalized); 768 keeps them all
+VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "768"))
+# Quantized search fetches limit * oversampling candidates, then rescores them with the float vectors
+VECTOR_OVERSAMPLING = float(os.getenv("VECTOR_OVERSAMPLING", "3.0"))
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "true").lower() in ("1", "true", "yes")
+
+QUANTIZATIONS = ("none", "int8", "binary")
+# int8 codes cover +-_INT8_SIGMAS standard deviations of a unit vector's components (1/sqrt(dim))
+_INT8_SIGMAS = 6.0
+_SCORE_BLOCK = 65536
+
+
+def truncate(vectors: np.ndarray, dim: int = VECTOR_DIMENSIONS) -> np.ndarray:
+    """First `dim` dimensions of each row, renormalized to unit length."""
+    arr = np.asarray(vectors, dtype=np.float32)
+    if arr.ndim == 1:
+        return truncate(arr[None, :], dim)[0]
+    if 0 < dim < arr.shape[1]:
+        arr = arr[:, :dim]
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def candidate_count(limit: int, oversampling: float = VECTOR_OVERSAMPLING) -> int:
+    return max(limit, int(np.ceil(limit * max(1.0, oversampling))))
+
+
+class Quantizer:
+    """
+    Compact codes for unit vectors and approximate inner products against a
+    float query. int8 uses one fixed symmetric scale per dimension count, so
+    codes never need re-encoding as a workspace grows; binary keeps the sign
+    of each dimension and scores by Hamming distance.
+    """
+
+    def __init__(self, kind: str, dim: int):
+        if kind not in ("int8", "binary"):
+            raise ValueError(f"Unknown VECTOR_QUANTIZATION: {kind}")
+        self.kind = kind
+        self.dim = dim
+        self.scale = 127.0 / (_INT8_SIGMAS / np.sqrt(dim))
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.int8 if self.kind == "int8" else np.uint8)
+
+    @property
+    def code_width(self) -> int:
+        return self.dim if self.kind == "int8" else (self.dim + 7) // 8
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        arr = np.asarray(vectors, dtype=np.float32)
+        if self.kind == "int8":
+            return np.clip(np.rint(arr * self.scale), -127, 127).astype(np.int8)
+        return np.packbits(arr > 0, axis=1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of each code row to the (unit) query."""
+        out = np.empty(len(codes), dtype=np.float32)
+        if self.kind == "int8":
+            q = query.astype(np.float32) / self.scale
+            for start in range(0, len(codes), _SCORE_BLOCK):
+                out[start:start + _SCORE_BLOCK] = codes[start:start + _SCORE_BLOCK].astype(np.float32) @ q
+            return out
+        q_bits = np.packbits(query > 0)
+        for start in range(0, len(codes), _SCORE_BLOCK):
+            block = np.asarray(codes[start:start + _SCORE_BLOCK])
+            hamming = np.bitwise_count(block ^ q_bits).sum(axis=1)
+            out[start:start + _SCORE_BLOCK] = 1.0 - 2.0 * hamming / self.dim
+        return out
+
+
+def quantizer(kind: str = VECTOR_QUANTIZATION, dim: int = VECTOR_DIMENSIONS) -> Optional[Quantizer]:
+    if kind not in QUANTIZATIONS:
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION: {kind}")
+    return None if kind == "none" else Quantizer(kind, dim)
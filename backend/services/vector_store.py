@@ -0,0 +1,219 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from backend.services import qdrant_client
+from backend.services.text_store import TEXT_STORE, TextStore
+
+# "qdrant" (remote, QDRANT_URL) or "local" (embedded memory-mapped index)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant").lower()
+
+
+class VectorStore(ABC):
+    """
+    Storage for chunk vectors and payloads, isolated per workspace.
+
+    Search hits are payload dicts with `point_id` and `score` added. The
+    async methods default to running the sync ones in a worker thread;
+    backends with native async clients override them.
+    """
+
+    @abstractmethod
+    def upsert(
+        self,
+        workspace_id: str,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        point_ids: Optional[List[str]] = None,
+    ) -> int:
+        ...
+
+    @abstractmethod
+    def delete(self, workspace_id: str, point_ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def set_chunk_indexes(self, workspace_id: str, chunk_indexes: Dict[str, int]) -> None:
+        ...
+
+    @abstractmethod
+    def search(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        ...
+
+    def search_batch(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5,
+    ) -> List[List[Dict[str, Any]]]:
+        """One hit list per query vector; backends that can answer them in one pass override this."""
+        return [self.search(workspace_id, query_vector, limit) for query_vector in query_vectors]
+
+    @abstractmethod
+    def get(self, workspace_id: str, point_ids: List[str]) -> List[Dict[str, Any]]:
+        """Payloads (with `point_id`) of the given points; missing ids are skipped."""
+
+    async def upsert_async(
+        self,
+        workspace_id: str,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        point_ids: Optional[List[str]] = None,
+    ) -> int:
+        return await asyncio.to_thread(self.upsert, workspace_id, vectors, payloads, point_ids)
+
+    async def delete_async(self, workspace_id: str, point_ids: List[str]) -> None:
+        await asyncio.to_thread(self.delete, workspace_id, point_ids)
+
+    async def set_chunk_indexes_async(self, workspace_id: str, chunk_indexes: Dict[str, int]) -> None:
+        await asyncio.to_thread(self.set_chunk_indexes, workspace_id, chunk_indexes)
+
+    async def search_async(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.search, workspace_id, query_vector, limit)
+
+    async def search_batch_async(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5,
+    ) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.search_batch, workspace_id, query_vectors, limit)
+
+    async def get_async(self, workspace_id: str, point_ids: List[str]) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, workspace_id, point_ids)
+
+    async def close(self) -> None:
+        pass
+
+
+class QdrantVectorStore(VectorStore):
+    """Remote Qdrant: a shared collection partitioned by workspace_id, with large workspaces in their own collections."""
+
+    def upsert(self, workspace_id, vectors, payloads, point_ids=None):
+        return qdrant_client.upsert_chunks(workspace_id, vectors, payloads, point_ids=point_ids)
+
+    def delete(self, workspace_id, point_ids):
+        qdrant_client.delete_points(workspace_id, point_ids)
+
+    def set_chunk_indexes(self, workspace_id, chunk_indexes):
+        qdrant_client.set_chunk_indexes(workspace_id, chunk_indexes)
+
+    def search(self, workspace_id, query_vector, limit=5):
+        return qdrant_client.search_chunks(workspace_id, query_vector, limit=limit)
+
+    def search_batch(self, workspace_id, query_vectors, limit=5):
+        return qdrant_client.search_chunks_batch(workspace_id, query_vectors, limit=limit)
+
+    def get(self, workspace_id, point_ids):
+        return qdrant_client.retrieve_points(workspace_id, point_ids)
+
+    async def upsert_async(self, workspace_id, vectors, payloads, point_ids=None):
+        return await qdrant_client.upsert_chunks_async(workspace_id, vectors, payloads, point_ids=point_ids)
+
+    async def delete_async(self, workspace_id, point_ids):
+        await qdrant_client.delete_points_async(workspace_id, point_ids)
+
+    async def set_chunk_indexes_async(self, workspace_id, chunk_indexes):
+        await qdrant_client.set_chunk_indexes_async(workspace_id, chunk_indexes)
+
+    async def search_async(self, workspace_id, query_vector, limit=5):
+        return await qdrant_client.search_chunks_async(workspace_id, query_vector, limit=limit)
+
+    async def search_batch_async(self, workspace_id, query_vectors, limit=5):
+        return await qdrant_client.search_chunks_batch_async(workspace_id, query_vectors, limit=limit)
+
+    async def get_async(self, workspace_id, point_ids):
+        return await qdrant_client.retrieve_points_async(workspace_id, point_ids)
+
+    async def close(self) -> None:
+        await qdrant_client.close_async_client()
+
+
+class TextOffloadingStore(VectorStore):
+    """
+    Wraps a vector store so chunk `text` is kept in a compressed TextStore
+    instead of the payload; hits and `get` results have it filled back in.
+    Points written before offloading keep their payload text.
+    """
+
+    def __init__(self, inner: VectorStore, texts: TextStore):
+        self.inner = inner
+        self.texts = texts
+
+    def _split(self, payloads, point_ids):
+        point_ids = list(point_ids) if point_ids is not None else [str(uuid4()) for _ in payloads]
+        texts = {pid: p["text"] for pid, p in zip(point_ids, payloads) if "text" in p}
+        stripped = [{k: v for k, v in p.items() if k != "text"} for p in payloads]
+        return stripped, point_ids, texts
+
+    def _fill(self, workspace_id: str, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._fill_batch(workspace_id, [hits])[0]
+
+    def _fill_batch(self, workspace_id: str, results: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """Fill several hit lists with one text lookup."""
+        wanted = {h["point_id"] for hits in results for h in hits if "text" not in h}
+        texts = self.texts.get(workspace_id, list(wanted))
+        return [
+            [{**h, "text": texts[h["point_id"]]} if h["point_id"] in texts else h for h in hits]
+            for hits in results
+        ]
+
+    def upsert(self, workspace_id, vectors, payloads, point_ids=None):
+        payloads, point_ids, texts = self._split(payloads, point_ids)
+        # Texts first, so a point is never searchable without its text.
+        self.texts.put(workspace_id, texts)
+        return self.inner.upsert(workspace_id, vectors, payloads, point_ids)
+
+    def delete(self, workspace_id, point_ids):
+        self.inner.delete(workspace_id, point_ids)
+        self.texts.delete(workspace_id, point_ids)
+
+    def set_chunk_indexes(self, workspace_id, chunk_indexes):
+        self.inner.set_chunk_indexes(workspace_id, chunk_indexes)
+
+    def search(self, workspace_id, query_vector, limit=5):
+        return self._fill(workspace_id, self.inner.search(workspace_id, query_vector, limit))
+
+    def search_batch(self, workspace_id, query_vectors, limit=5):
+        return self._fill_batch(workspace_id, self.inner.search_batch(workspace_id, query_vectors, limit))
+
+    def get(self, workspace_id, point_ids):
+        return self._fill(workspace_id, self.inner.get(workspace_id, point_ids))
+
+    async def upsert_async(self, workspace_id, vectors, payloads, point_ids=None):
+        payloads, point_ids, texts = self._split(payloads, point_ids)
+        await asyncio.to_thread(self.texts.put, workspace_id, texts)
+        return await self.inner.upsert_async(workspace_id, vectors, payloads, point_ids)
+
+    async def delete_async(self, workspace_id, point_ids):
+        await self.inner.delete_async(workspace_id, point_ids)
+        await asyncio.to_thread(self.texts.delete, workspace_id, point_ids)
+
+    async def set_chunk_indexes_async(self, workspace_id, chunk_indexes):
+        await self.inner.set_chunk_indexes_async(workspace_id, chunk_indexes)
+
+    async def search_async(self, workspace_id, query_vector, limit=5):
+        hits = await self.inner.search_async(workspace_id, query_vector, limit)
+        return await asyncio.to_thread(self._fill, workspace_id, hits)
+
+    async def search_batch_async(self, workspace_id, query_vectors, limit=5):
+        results = await self.inner.search_batch_async(workspace_id, query_vectors, limit)
+        return await asyncio.to_thread(self._fill_batch, workspace_id, results)
+
+    async def get_async(self, workspace_id, point_ids):
+        hits = await self.inner.get_async(workspace_id, point_ids)
+        return await asyncio.to_thread(self._fill, workspace_id, hits)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+
+def get_vector_store(backend: str = VECTOR_STORE, text_store: str = TEXT_STORE) -> VectorStore:
+    if backend == "local":
+        from backend.services.local_vector_store import LocalVectorStore
+        store: VectorStore = LocalVectorStore()
+    elif backend == "qdrant":
+        store = QdrantVectorStore()
+    else:
+        raise ValueError(f"Unknown VECTOR_STORE backend: {backend}")
+    if text_store == "local":
+        return TextOffloadingStore(store, TextStore())
+    if text_store != "payload":
+        raise ValueError(f"Unknown TEXT_STORE: {text_store}")
+    return store
@@ -0,0 +1,31 @@
+from backend.services.answer_cache import AnswerCache
+
+
+def _cache(versions):
+    return AnswerCache(version_of=lambda workspace_id: versions[workspace_id], threshold=0.9)
+
+
+def test_hit_for_similar_question_and_miss_after_version_bump():
+    versions = {"ws": 1}
+    cache = _cache(versions)
+    cache.store("ws", "q", [1.0, 0.0], {"answer": "a"}, chunk_ids=["p1"])
+    assert cache.lookup("ws", [0.99, 0.05])["response"] == {"answer": "a"}
+
+    versions["ws"] = 2
+    assert cache.lookup("ws", [1.0, 0.0]) is None
+
+
+def test_answer_generated_across_a_version_bump_is_not_cached():
+    versions = {"ws": 1}
+    cache = _cache(versions)
+    # Read before retrieval, as /ask does.
+    version = cache.version_of("ws")
+    assert cache.lookup("ws", [1.0, 0.0]) is None
+
+    versions["ws"] = 2  # ingestion finished while the answer was generated
+    cache.store("ws", "q", [1.0, 0.0], {"answer": "stale"}, chunk_ids=["p1"], version=version)
+    assert cache.lookup("ws", [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+    cache.store("ws", "q", [1.0, 0.0], {"answer": "fresh"}, chunk_ids=["p2"], version=cache.version_of("ws"))
+    assert cache.lookup("ws", [1.0, 0.0])["response"] == {"answer": "fresh"}
@@ -0,0 +1,89 @@
+from backend.services.chunking import PAGE_BREAK, StructuredChunker, chunk_all
+
+
+def _sentences(n, prefix="s"):
+    # Each line is 40 characters, i.e. 10 estimated tokens.
+    return [f"{prefix}{i:03d} ".ljust(39, "x") + "." for i in range(n)]
+
+
+def test_chunks_respect_token_budget_and_overlap():
+    lines = _sentences(20)
+    chunks = chunk_all(StructuredChunker(max_tokens=50, overlap_tokens=20), "\n".join(lines))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk["text"]) <= 50 * 4 + len(chunk["text"].split("\n"))
+    for prev, nxt in zip(chunks, chunks[1:]):
+        prev_lines, next_lines = prev["text"].split("\n"), nxt["text"].split("\n")
+        # The next chunk opens with the last two lines (20 tokens) of the previous one.
+        assert next_lines[:2] == prev_lines[-2:]
+    covered = [line for chunk in chunks for line in chunk["text"].split("\n")]
+    assert list(dict.fromkeys(covered)) == lines
+
+
+def test_offsets_point_into_the_fed_text():
+    text = "intro line\n\n  indented line\n" + "\n".join(_sentences(12))
+    for chunk in chunk_all(StructuredChunker(max_tokens=40, overlap_tokens=0), text):
+        first, last = chunk["text"].split("\n")[0], chunk["text"].split("\n")[-1]
+        assert text[chunk["char_start"]:].startswith(first)
+        assert text[:chunk["char_end"]].endswith(last)
+
+
+def test_headings_start_chunks_and_set_sections():
+    text = "\n".join([
+        "preamble",
+        "# Guide",
+        "## Install",
+        "run the installer",
+        "## Usage",
+        "call the api",
+        "# Appendix",
+        "notes",
+    ])
+    chunks = chunk_all(StructuredChunker(max_tokens=100, overlap_tokens=10), text)
+    assert [(c["section"], c["text"]) for c in chunks] == [
+        ("", "preamble"),
+        ("Guide > Install", "# Guide\n## Install\nrun the installer"),
+        ("Guide > Usage", "## Usage\ncall the api"),
+        ("Appendix", "# Appendix\nnotes"),
+    ]
+
+
+def test_overlap_does_not_cross_headings_or_pages():
+    body = _sentences(3, "a")
+    text = "\n".join(body) + f"\n{PAGE_BREAK}" + "\n".join(_sentences(3, "b")) + "\n# Next\nc000"
+    chunks = chunk_all(StructuredChunker(max_tokens=100, overlap_tokens=30), text)
+    assert [c["page"] for c in chunks] == [1, 2, 2]
+    assert chunks[0]["text"] == "\n".join(body)
+    assert chunks[1]["text"].startswith("b000")
+    assert chunks[2]["text"] == "# Next\nc000"
+
+
+def test_table_rows_are_whole_and_header_repeats():
+    rows = ["| id | name |"] + [f"| {i} | " + "n" * 30 + " |" for i in range(10)]
+    chunks = chunk_all(StructuredChunker(max_tokens=40, overlap_tokens=0), "\n".join(rows))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        lines = chunk["text"].split("\n")
+        assert lines[0] == rows[0]
+        assert all(line in rows for line in lines)
+
+
+def test_long_lines_split_at_sentences_then_words():
+    sentence = "word " * 30
+    text = "Short one. " + sentence.strip() + "."
+    chunks = chunk_all(StructuredChunker(max_tokens=20, overlap_tokens=0), text)
+    assert chunks[0]["text"].startswith("Short one.")
+    assert all(len(c["text"]) <= 20 * 4 for c in chunks)
+    assert " ".join(c["text"] for c in chunks).split() == text.split()
+
+
+def test_feeding_in_pieces_matches_feeding_at_once():
+    text = "# Title\n" + "\n".join(_sentences(15)) + f"\n{PAGE_BREAK}| a | b |\n| 1 | 2 |\n"
+    whole = chunk_all(StructuredChunker(max_tokens=45, overlap_tokens=15), text)
+
+    chunker = StructuredChunker(max_tokens=45, overlap_tokens=15)
+    pieces = []
+    for start in range(0, len(text), 7):
+        pieces += chunker.feed(text[start:start + 7])
+    assert pieces + chunker.flush() == whole
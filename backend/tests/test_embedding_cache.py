@@ -0,0 +1,31 @@
+from backend.services.embedding_cache import MemoryEmbeddingCache, SqliteEmbeddingCache, TieredEmbeddingCache
+
+
+def test_sqlite_count_tracks_inserts_replacements_and_eviction():
+    cache = SqliteEmbeddingCache(":memory:", max_items=10)
+    cache.put_many("m", [("a", [1.0]), ("b", [2.0])])
+    assert cache.size() == 2
+    cache.put_many("m", [("a", [3.0]), ("c", [4.0]), ("c", [5.0])])
+    assert cache.size() == 3
+    assert cache.get_many("m", ["a", "b", "c"]) == [[3.0], [2.0], [5.0]]
+
+    cache.put_many("m", [(f"k{i}", [float(i)]) for i in range(10)])
+    actual = cache._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert cache.size() == actual == 9
+
+
+def test_sqlite_count_after_model_switch(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = SqliteEmbeddingCache(path)
+    cache.put_many("old", [("a", [1.0]), ("b", [2.0])])
+    cache.put_many("new", [("a", [1.5])])
+    assert cache.size() == 1
+    assert SqliteEmbeddingCache(path).size() == 1
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = TieredEmbeddingCache(MemoryEmbeddingCache(), SqliteEmbeddingCache(str(tmp_path / "e.db")))
+    cache.put_many("m", [("a", [1.0]), ("b", [2.0])])
+    cache.clear()
+    assert cache.size() == 0 and cache.memory.size() == 0
+    assert cache.get_many("m", ["a", "b"]) == [None, None]
@@ -0,0 +1,33 @@
+import io
+import zipfile
+
+from backend.services.extractors import _extract_xlsx
+
+_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def _xlsx(sheet_rows: str) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr(
+            "xl/sharedStrings.xml",
+            f'<sst xmlns="{_NS}"><si><t>name</t></si><si><t>total</t></si></sst>',
+        )
+        zf.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{_NS}"><sheetData>{sheet_rows}</sheetData></worksheet>')
+    buf.seek(0)
+    return buf
+
+
+def test_xlsx_sparse_rows_keep_their_columns():
+    text = _extract_xlsx(_xlsx(
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="D1" t="s"><v>1</v></c></row>'
+        '<row r="2"><c r="B2"><v>7</v></c><c r="AA2" t="inlineStr"><is><t>far</t></is></c></row>'
+    ))
+    first, second = text.split("\n")
+    assert first.split("\t") == ["name", "", "", "total"]
+    assert second.split("\t") == ["", "7"] + [""] * 24 + ["far"]
+
+
+def test_xlsx_cells_without_reference_are_sequential():
+    text = _extract_xlsx(_xlsx('<row><c><v>1</v></c><c><v>2</v></c></row>'))
+    assert text == "1\t2"
@@ -0,0 +1,63 @@
+import asyncio
+
+from backend.services.jobs import JobManager, JobStore, _JobProgress
+
+
+def test_every_watcher_is_woken_after_another_leaves(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.create_job("job", "ws", [{"filename": "a.txt", "path": "a.txt"}])
+    manager = JobManager(scheduler=None, store=store, jobs_dir=str(tmp_path))
+
+    async def scenario():
+        leaving = manager.watch("job", poll_interval=30)
+        staying = manager.watch("job", poll_interval=30)
+        assert (await leaving.__anext__())["status"] == "queued"
+        assert (await staying.__anext__())["status"] == "queued"
+        await leaving.aclose()
+
+        store.set_status("job", "running")
+        pending = asyncio.ensure_future(staying.__anext__())
+        await asyncio.sleep(0)
+        manager.notify("job")
+        snapshot = await asyncio.wait_for(pending, timeout=1)
+        assert snapshot["status"] == "running"
+        await staying.aclose()
+
+    asyncio.run(scenario())
+    assert manager._watchers == {}
+
+
+def test_extracted_text_is_dropped_once_files_are_done(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.create_job("job", "ws", [{"path": "a.txt"}, {"path": "b.txt"}])
+    store.update_file("job", 0, extracted_text="first corpus")
+    store.update_file("job", 1, extracted_text="second corpus")
+    manager = JobManager(scheduler=None, store=store, jobs_dir=str(tmp_path))
+
+    progress = _JobProgress(manager, "job")
+    progress.file_stage(0, "indexed")
+    assert store.extracted_text("job", 0) is None
+    assert store.extracted_text("job", 1) == "second corpus"
+
+    store.set_status("job", "failed", error="boom")
+    assert store.extracted_text("job", 1) is None
+
+
+def test_prune_deletes_jobs_past_retention(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    for job_id in ("old", "recent", "active"):
+        store.create_job(job_id, "ws", [{"path": f"{job_id}.txt"}])
+        store.add_indexed(job_id, 0, [0, 1])
+    store.set_status("old", "completed")
+    store.set_status("recent", "completed")
+    store._conn.execute("UPDATE jobs SET finished_at = finished_at - 7200 WHERE id = 'old'")
+    store._conn.commit()
+    (tmp_path / "old").mkdir()
+
+    manager = JobManager(scheduler=None, store=store, jobs_dir=str(tmp_path), retention=3600)
+    assert manager.prune() == ["old"]
+    assert store.get_job("old") is None and store.files("old") == []
+    assert store.indexed_chunks("old", 0) == set()
+    assert not (tmp_path / "old").exists()
+    assert store.get_job("recent") is not None and store.get_job("active") is not None
+    assert JobManager(scheduler=None, store=store, retention=0).prune() == []
@@ -0,0 +1,91 @@
+import pytest
+
+from backend.services import keyword_index
+from backend.services.keyword_index import KeywordIndex, tokenize
+
+
+def _index(tmp_path, docs):
+    index = KeywordIndex(str(tmp_path / "keywords.db"))
+    index.add("ws", list(docs), list(docs.values()))
+    return index
+
+
+def _filler(n):
+    return {f"f{i}": f"filler document number{i} about topic{i}" for i in range(n)}
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("What is ERR-404 in policy_2023.1?") == [
+        "err-404", "err", "404", "policy_2023.1", "policy", "2023", "1",
+    ]
+
+
+def test_bm25_prefers_term_frequency_and_shorter_documents(tmp_path):
+    index = _index(tmp_path, {
+        "once": "refund window explained here with several other unrelated words",
+        "twice": "refund refund window explained here with several other unrelated words",
+        "short": "refund policy",
+        **_filler(20),
+    })
+    ranked = [point_id for point_id, _ in index.search("ws", "refund")]
+    assert ranked == ["short", "twice", "once"]
+
+
+def test_terms_above_max_df_are_ignored(tmp_path):
+    docs = _filler(30)
+    docs["target"] = "invoice dispute procedure"
+    index = _index(tmp_path, docs)
+    # "filler" appears in 30 of 31 chunks, well past KEYWORD_MAX_DF.
+    assert index.search("ws", "filler") == []
+    assert [point_id for point_id, _ in index.search("ws", "filler invoice")] == ["target"]
+
+
+def test_max_df_is_not_applied_to_small_workspaces(tmp_path):
+    index = _index(tmp_path, _filler(10))
+    assert len(index.search("ws", "filler", limit=20)) == 10
+
+
+def test_max_df_counts_only_live_chunks(tmp_path):
+    docs = {f"common{i}": f"shared term plus unique{i}" for i in range(20)}
+    docs.update(_filler(20))
+    index = _index(tmp_path, docs)
+    assert index.search("ws", "shared") == []
+
+    index.remove("ws", [f"common{i}" for i in range(15)])
+    ranked = [point_id for point_id, _ in index.search("ws", "shared")]
+    assert sorted(ranked) == [f"common{i}" for i in range(15, 20)]
+
+
+def test_ties_are_broken_by_indexing_order(tmp_path):
+    docs = {f"same{i}": "identical tied text" for i in range(6)}
+    docs.update(_filler(20))
+    index = _index(tmp_path, docs)
+    results = index.search("ws", "identical", limit=4)
+    assert [point_id for point_id, _ in results] == ["same0", "same1", "same2", "same3"]
+    assert len({score for _, score in results}) == 1
+
+
+def test_reindex_remove_and_reload(tmp_path):
+    index = _index(tmp_path, {"a": "alpha beta", "b": "gamma delta"})
+    index.add("ws", ["a"], ["epsilon"])
+    index.remove("ws", ["b"])
+    assert index.search("ws", "alpha") == []
+    assert index.search("ws", "gamma") == []
+    assert [point_id for point_id, _ in index.search("ws", "epsilon")] == ["a"]
+
+    reloaded = KeywordIndex(str(tmp_path / "keywords.db"))
+    assert reloaded.search("ws", "epsilon") == index.search("ws", "epsilon")
+    assert reloaded.search("other", "epsilon") == []
+
+
+def test_compaction_preserves_scores(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_index, "_COMPACT_MIN_DEAD", 5)
+    docs = {f"d{i}": f"report section{i % 3} appendix{i}" for i in range(40)}
+    index = _index(tmp_path, docs)
+    index.remove("ws", [f"d{i}" for i in range(0, 30)])
+
+    postings = index._workspaces["ws"]
+    assert len(postings.slot_ids) < 40  # tombstones were compacted away
+    fresh = _index(tmp_path / "fresh", {f"d{i}": docs[f"d{i}"] for i in range(30, 40)})
+    for query in ("section1", "appendix35", "section2 appendix31"):
+        assert index.search("ws", query) == pytest.approx(fresh.search("ws", query))
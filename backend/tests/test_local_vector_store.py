@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from backend.services import local_vector_store
+from backend.services.local_vector_store import LocalVectorStore
+
+
+def _unit(rng, n, dim):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _clustered(rng, n, dim, clusters):
+    centers = _unit(rng, clusters, dim)
+    vectors = centers[rng.integers(0, clusters, n)] + rng.normal(scale=0.15, size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _store(tmp_path, vectors, ids=None):
+    store = LocalVectorStore(str(tmp_path))
+    ids = ids or [f"p{i}" for i in range(len(vectors))]
+    store.upsert("ws", vectors.tolist(), [{"text": pid} for pid in ids], point_ids=ids)
+    return store, ids
+
+
+def test_exact_search_ranks_by_cosine(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = _unit(rng, 200, 16)
+    store, ids = _store(tmp_path, vectors)
+    query = vectors[42] + 0.01
+    hits = store.search("ws", query.tolist(), limit=5)
+
+    expected = np.argsort(-(vectors @ (query / np.linalg.norm(query))))[:5]
+    assert [hit["point_id"] for hit in hits] == [ids[i] for i in expected]
+    assert hits[0]["text"] == "p42" and hits[0]["workspace_id"] == "ws"
+    assert hits[0]["score"] == pytest.approx(float(vectors[42] @ (query / np.linalg.norm(query))), abs=1e-5)
+
+
+def test_upsert_same_id_replaces_vector_and_payload(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = _unit(rng, 10, 8)
+    store, _ = _store(tmp_path, vectors)
+    store.upsert("ws", [vectors[9].tolist()], [{"text": "moved"}], point_ids=["p0"])
+
+    hits = store.search("ws", vectors[9].tolist(), limit=2)
+    assert {hit["point_id"] for hit in hits} == {"p0", "p9"}
+    assert store.get("ws", ["p0"])[0]["text"] == "moved"
+
+
+def test_deleted_points_are_not_returned(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = _unit(rng, 50, 8)
+    store, ids = _store(tmp_path, vectors)
+    store.delete("ws", ["p7", "p8"])
+
+    hits = store.search("ws", vectors[7].tolist(), limit=50)
+    assert len(hits) == 48
+    assert not {"p7", "p8"} & {hit["point_id"] for hit in hits}
+    assert store.get("ws", ["p7", "p9"]) == [{"text": "p9", "workspace_id": "ws", "point_id": "p9"}]
+
+
+def test_compaction_keeps_search_results_and_survives_reopen(tmp_path):
+    rng = np.random.default_rng(4)
+    vectors = _unit(rng, 300, 16)
+    store, ids = _store(tmp_path, vectors)
+    removed = ids[:200]
+    store.delete("ws", removed)
+
+    index = store._workspace("ws")
+    assert index.count == 100  # rows were renumbered without the deleted ones
+
+    query = vectors[250]
+    expected = [ids[200 + i] for i in np.argsort(-(vectors[200:] @ query))[:10]]
+    assert [hit["point_id"] for hit in store.search("ws", query.tolist(), limit=10)] == expected
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert [hit["point_id"] for hit in reopened.search("ws", query.tolist(), limit=10)] == expected
+    assert reopened.get("ws", removed[:3]) == []
+
+
+def test_ivf_recall_after_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_vector_store, "LOCAL_ANN_THRESHOLD", 500)
+    rng = np.random.default_rng(5)
+    vectors = _clustered(rng, 3000, 32, clusters=40)
+    store, ids = _store(tmp_path, vectors)
+    # Delete 60% so the matrix is compacted, then grow past the threshold again.
+    store.delete("ws", ids[:1800])
+    assert store._workspace("ws").count == 1200
+
+    live = vectors[1800:]
+    queries = _clustered(np.random.default_rng(6), 50, 32, clusters=40)
+    k = 10
+    recall = []
+    for query in queries:
+        expected = {ids[1800 + i] for i in np.argsort(-(live @ query))[:k]}
+        hits = store.search("ws", query.tolist(), limit=k)
+        recall.append(len(expected & {hit["point_id"] for hit in hits}) / k)
+
+    assert store._workspace("ws").ivf is not None
+    assert np.mean(recall) >= 0.9
+
+
+def test_int8_quantized_search_is_rescored_with_float_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_vector_store, "VECTOR_QUANTIZATION", "int8")
+    rng = np.random.default_rng(7)
+    vectors = _unit(rng, 500, 64)
+    store, ids = _store(tmp_path, vectors)
+    assert store._workspace("ws").quantizer.kind == "int8"
+
+    for i in range(0, 500, 50):
+        query = vectors[i] + rng.normal(scale=0.02, size=64).astype(np.float32)
+        query /= np.linalg.norm(query)
+        hits = store.search("ws", query.tolist(), limit=3)
+        assert hits[0]["point_id"] == ids[i]
+        # Rescoring reports the exact float similarity, not the int8 estimate.
+        assert hits[0]["score"] == pytest.approx(float(vectors[i] @ query), abs=1e-5)
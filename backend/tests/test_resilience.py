@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services import resilience
+from backend.services.resilience import CircuitBreaker, ProviderHTTPError, ProviderPolicy, ProviderUnavailableError
+
+
+def _open_circuit(policy: ProviderPolicy) -> None:
+    policy.breaker.reset_seconds = 0.05
+    for _ in range(policy.breaker.threshold):
+        policy.breaker.record_failure()
+    assert policy.breaker.state == "open"
+    time.sleep(0.06)
+    assert policy.breaker.state == "half_open"
+
+
+def test_breaker_opens_after_threshold_and_closes_on_probe_success():
+    breaker = CircuitBreaker("test", threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    with pytest.raises(ProviderUnavailableError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    with pytest.raises(ProviderUnavailableError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+
+def test_release_probe_keeps_failure_count():
+    breaker = CircuitBreaker("test", threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+
+
+def test_cancelled_probe_releases_half_open_slot():
+    policy = ProviderPolicy("test", max_retries=0)
+    _open_circuit(policy)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        probe = asyncio.ensure_future(policy.call_async(hang))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await policy.call_async(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert policy.breaker.state == "closed"
+
+
+def test_cancelled_stream_probe_releases_half_open_slot():
+    policy = ProviderPolicy("test", max_retries=0)
+    _open_circuit(policy)
+
+    async def open_hanging_stream():
+        async def items():
+            await asyncio.sleep(10)
+            yield "never"
+        return items()
+
+    async def consume():
+        return [item async for item in policy.stream_async(open_hanging_stream)]
+
+    async def scenario():
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert policy.breaker.before_call() is True
+
+
+def test_cancelled_non_probe_call_leaves_probe_in_place():
+    policy = ProviderPolicy("test", max_retries=0)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        # Started while the circuit was closed, so it does not own the probe slot.
+        call = asyncio.ensure_future(policy.call_async(hang))
+        await asyncio.sleep(0.01)
+        _open_circuit(policy)
+        assert policy.breaker.before_call() is True
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    with pytest.raises(ProviderUnavailableError):
+        policy.breaker.before_call()
+
+
+def _failing(status_code):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ProviderHTTPError(status_code)
+
+    return fn, calls
+
+
+def test_rate_limited_calls_never_open_the_circuit(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_BACKOFF_BASE", 0.0)
+    policy = ProviderPolicy("test", max_retries=4)
+    fn, calls = _failing(429)
+    for _ in range(3):
+        with pytest.raises(ProviderHTTPError):
+            policy.call(fn)
+    assert len(calls) == 15
+    assert policy.breaker.state == "closed"
+
+
+def test_failed_call_counts_once_after_its_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_BACKOFF_BASE", 0.0)
+    policy = ProviderPolicy("test", max_retries=4)
+    policy.breaker.threshold = 2
+    fn, calls = _failing(503)
+    with pytest.raises(ProviderHTTPError):
+        policy.call(fn)
+    assert len(calls) == 5
+    assert policy.breaker.state == "closed"
+    with pytest.raises(ProviderHTTPError):
+        policy.call(fn)
+    assert policy.breaker.state == "open"
+
+
+def test_failed_probe_reopens_without_retrying(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_BACKOFF_BASE", 0.0)
+    policy = ProviderPolicy("test", max_retries=4)
+    _open_circuit(policy)
+    fn, calls = _failing(503)
+    with pytest.raises(ProviderUnavailableError):
+        policy.call(fn)
+    assert len(calls) == 1
+    assert policy.breaker.state == "open"
+
+
+def test_rate_limited_probe_lets_the_retry_probe_again(monkeypatch):
+    monkeypatch.setattr(resilience, "PROVIDER_BACKOFF_BASE", 0.0)
+    policy = ProviderPolicy("test", max_retries=2)
+    _open_circuit(policy)
+    responses = iter([ProviderHTTPError(429), "ok"])
+
+    def fn():
+        item = next(responses)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    assert policy.call(fn) == "ok"
+    assert policy.breaker.state == "closed"
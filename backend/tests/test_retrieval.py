@@ -0,0 +1,20 @@
+import pytest
+
+from backend.services.retrieval import reciprocal_rank_fusion
+
+
+def test_rrf_sums_weighted_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], [1.0, 2.0], k=60))
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["c"] == pytest.approx(1 / 63 + 2 / 61)
+    assert fused["d"] == pytest.approx(2 / 62)
+
+
+def test_rrf_orders_best_first_and_keeps_first_seen_order_on_ties():
+    fused = reciprocal_rank_fusion([["a", "b"], ["x", "b"]], [1.0, 1.0], k=10)
+    assert [item_id for item_id, _ in fused] == ["b", "a", "x"]
+
+
+def test_rrf_zero_weight_list_does_not_reorder():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], [1.0, 0.0])
+    assert [item_id for item_id, _ in fused][:2] == ["a", "b"]
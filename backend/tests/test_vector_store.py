@@ -0,0 +1,12 @@
+import pytest
+
+from backend.services.vector_store import VectorStore
+
+
+def test_backend_missing_a_method_cannot_be_instantiated():
+    class SearchOnly(VectorStore):
+        def search(self, workspace_id, query_vector, limit=5):
+            return []
+
+    with pytest.raises(TypeError, match="upsert"):
+        SearchOnly()
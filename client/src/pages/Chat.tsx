@@ -31,6 +31,7 @@ const Chat = () => {
   ]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
 
   const exampleQuestions = [
     "What are the key points in the uploaded documents?",
@@ -39,7 +40,7 @@ const Chat = () => {
   ];
 
   const handleSend = async () => {
-    if (!input.trim()) return;
+    if (!input.trim() || isLoading || isStreaming) return;
 
     const question = input.trim();
 
@@ -54,7 +55,7 @@ const Chat = () => {
       // Choose workspace_id (same as upload)
       const workspaceId = assistantName.replace(/\s+/g, "_").toLowerCase();
 
-      const response = await fetch(`https://autoragos.onrender.com/api/workspaces/${workspaceId}/ask`, {
+      const response = await fetch(`https://autoragos.onrender.com/api/workspaces/${workspaceId}/ask/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -62,25 +63,56 @@ const Chat = () => {
         body: JSON.stringify({ question }),
       });
 
-      if (!response.ok) {
-        const errorData = await response.json();
+      if (!response.ok || !response.body) {
+        const errorData = await response.json().catch(() => ({}));
         throw new Error(errorData.detail || "Request failed");
       }
 
-      const data = await response.json();
-      const rag = data.rag_result;
+      // Show the answer as it streams in; confidence and citations arrive with the final event.
+      // Sending is disabled while streaming, so the placeholder stays the last message.
+      setMessages(prev => [...prev, { role: "assistant", content: "" }]);
+      setIsLoading(false);
+      setIsStreaming(true);
 
-      // Create assistant message from API result
-      const assistantMessage: Message = {
-        role: "assistant",
-        content: rag.answer,
-        confidence: rag.confidence,
-        citations: rag.citations,
-        needsReview: rag.needs_human_review
-      }
+      const updateAnswer = (update: (message: Message) => Message) =>
+        setMessages(prev => prev.map((m, i) => (i === prev.length - 1 ? update(m) : m)));
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
 
-      // Add assistant message to UI
-      setMessages(prev => [...prev, assistantMessage]);
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf("\n\n");
+
+          const eventName = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1];
+          if (!eventName || !dataLine) continue;
+          const data = JSON.parse(dataLine);
+
+          if (eventName === "token") {
+            updateAnswer(m => ({ ...m, content: m.content + data.text }));
+          } else if (eventName === "done") {
+            const rag = data.rag_result;
+            updateAnswer(m => ({
+              ...m,
+              content: rag.answer,
+              confidence: rag.confidence,
+              citations: rag.citations,
+              needsReview: rag.needs_human_review,
+            }));
+          } else if (eventName === "error") {
+            throw new Error(data.detail || "Request failed");
+          }
+        }
+      }
     } catch (err: any) {
       const errorMessage: Message = {
         role: "assistant",
@@ -93,6 +125,7 @@ const Chat = () => {
       setMessages(prev => [...prev, errorMessage]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
   const handleExampleQuestion = (question: string) => {
@@ -232,7 +265,7 @@ const Chat = () => {
               onKeyDown={(e) => e.key === "Enter" && handleSend()}
               className="flex-1"
             />
-            <Button onClick={handleSend} disabled={!input.trim() || isLoading}>
+            <Button onClick={handleSend} disabled={!input.trim() || isLoading || isStreaming}>
               <Send className="h-4 w-4" />
             </Button>
           </div>
@@ -8,10 +8,30 @@ interface ProcessingStep {
   status: "pending" | "processing" | "complete";
 }
 
+interface JobFile {
+  filename: string;
+  stage: "queued" | "extracting" | "embedding" | "indexed" | "unchanged" | "failed";
+  chunks_total: number;
+  chunks_indexed: number;
+  error: string | null;
+}
+
+interface JobProgress {
+  status: "queued" | "running" | "completed" | "failed";
+  error: string | null;
+  chunks_total: number;
+  chunks_indexed: number;
+  chunks_per_second: number;
+  files: JobFile[];
+}
+
+// Number of leading steps driven by real job progress; the rest are animated afterwards.
+const JOB_STEPS = 3;
+
 const Processing = () => {
   const navigate = useNavigate();
   const location = useLocation();
-  const { assistantName, fileCount } = location.state || { assistantName: "Your Assistant", fileCount: 0 };
+  const { assistantName, fileCount, jobId } = location.state || { assistantName: "Your Assistant", fileCount: 0 };
 
   const [steps, setSteps] = useState<ProcessingStep[]>([
     { label: "Extracting text via Gemini (OCR, STT)", status: "pending" },
@@ -24,9 +44,45 @@ const Processing = () => {
 
   const [qualityScore, setQualityScore] = useState<number | null>(null);
   const [allComplete, setAllComplete] = useState(false);
+  const [job, setJob] = useState<JobProgress | null>(null);
+  const [jobDone, setJobDone] = useState(!jobId);
 
   useEffect(() => {
-    let currentStep = 0;
+    if (!jobId) return;
+
+    const source = new EventSource(`https://autoragos.onrender.com/api/jobs/${jobId}/events`);
+    source.addEventListener("progress", (e) => {
+      const progress: JobProgress = JSON.parse((e as MessageEvent).data);
+      setJob(progress);
+
+      const extracted = progress.files.every((f) => f.stage !== "queued" && f.stage !== "extracting");
+      const currentStep = progress.status === "completed" ? JOB_STEPS : extracted ? 2 : 0;
+      setSteps(prev =>
+        prev.map((step, index) => {
+          if (index >= JOB_STEPS) return step;
+          if (index < currentStep) return { ...step, status: "complete" };
+          if (index === currentStep) return { ...step, status: "processing" };
+          return step;
+        })
+      );
+
+      if (progress.status === "completed") {
+        source.close();
+        setJobDone(true);
+      }
+      if (progress.status === "failed") {
+        source.close();
+      }
+    });
+    source.addEventListener("end", () => source.close());
+
+    return () => source.close();
+  }, [jobId]);
+
+  useEffect(() => {
+    if (!jobDone) return;
+
+    let currentStep = jobId ? JOB_STEPS : 0;
 
     const interval = setInterval(() => {
       if (currentStep < steps.length) {
@@ -48,7 +104,7 @@ const Processing = () => {
     }, 1500);
 
     return () => clearInterval(interval);
-  }, []);
+  }, [jobDone]);
 
   return (
     <div className="min-h-screen bg-background">
@@ -67,6 +123,22 @@ const Processing = () => {
           <p className="text-muted-foreground">
             Processing {fileCount} file{fileCount !== 1 ? 's' : ''}...
           </p>
+          {job && (
+            <p className="text-sm text-muted-foreground mt-2">
+              {job.chunks_indexed} / {job.chunks_total} chunks indexed
+              {job.chunks_per_second > 0 && ` (${job.chunks_per_second.toFixed(1)} chunks/s)`}
+            </p>
+          )}
+          {job?.status === "failed" && (
+            <p className="text-sm text-destructive mt-2">
+              Processing failed: {job.error || "unknown error"}
+            </p>
+          )}
+          {job?.files.filter((f) => f.error).map((f) => (
+            <p key={f.filename} className="text-sm text-destructive mt-1">
+              {f.filename}: {f.error}
+            </p>
+          ))}
         </div>
 
         {/* Progress Steps */}
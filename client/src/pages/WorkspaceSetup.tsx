@@ -119,8 +119,8 @@ const WorkspaceSetup = () => {
       const data = await res.json();
 
       toast({
-        title: "Success",
-        description: `Uploaded and processed ${data.chunks_indexed} chunks.`,
+        title: "Upload received",
+        description: "Your files are being processed in the background.",
       });
 
       navigate("/processing", {
@@ -128,6 +128,7 @@ const WorkspaceSetup = () => {
           assistantName,
           description,
           fileCount: files.length,
+          jobId: data.job_id,
         },
       });
     } catch (err: any) {